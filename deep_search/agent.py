@@ -5,13 +5,18 @@ This module implements the ResearchAgent using langgraph.
 import os
 import json
 import time
+import asyncio
+import threading
 import datetime
-from typing import List, Dict, Any, Callable, Annotated
-from operator import add
+from typing import List, Dict, Any, Callable, Annotated, AsyncIterator, Iterator, Optional
 from pydantic import BaseModel, Field
 
 from langgraph.graph import END, START, StateGraph
-from google.api_core import retry
+from langgraph.types import Send
+from langgraph.config import get_stream_writer
+from langgraph.checkpoint.memory import InMemorySaver
+from langchain_core.runnables import RunnableConfig
+from google.api_core import retry_async
 from google.generativeai.types import RequestOptions
 import google.generativeai as genai
 
@@ -19,10 +24,106 @@ from logger import logger
 from tools import (
     search_duck_duck_go,
     get_page_content,
-    generate_search_queries,
     search_wikipedia,
-    get_wikipedia_page
+    get_wikipedia_page,
+    agenerate_search_queries,
+    asearch_duck_duck_go,
+    aget_page_content,
+    asearch_wikipedia,
+    aget_wikipedia_page,
+    search_cache,
+    search_cache_key,
+    generate_cached,
+    agenerate_cached,
+    get_llm_cache,
+    model_cache_key,
+    run_blocking,
+    run_sync,
+    MAX_LINKS_PER_SEARCH,
+    MAX_WIKIPEDIA_RESULTS,
+    WIKIPEDIA_BACKEND
 )
+from fetcher import FetchEngine, get_parse_pool, plan_fetches, DEFAULT_MAX_CONCURRENCY, DEFAULT_PER_HOST_LIMIT
+from urls import canonicalize_url
+from retrieval import select_passages, CHARS_PER_TOKEN, DEFAULT_TOKEN_BUDGET
+from dedup import deduplicate_contents
+from token_budget import (
+    BudgetPlan,
+    ContextSource,
+    TokenCounter,
+    fit_to_budget,
+    DEFAULT_MAX_PROMPT_TOKENS,
+    DEFAULT_OVERFLOW
+)
+from scheduler import PolitenessScheduler, DUCKDUCKGO, WIKIPEDIA
+from cache import CachedResponse
+from chat_history import (
+    estimate_messages,
+    is_successful_result,
+    repeated_call_response,
+    response_in_history,
+    split_history,
+    summary_messages,
+    summary_prompt,
+    tool_call_key,
+    truncate_tool_payloads,
+    turn_starts,
+    DEFAULT_CHAT_HISTORY_TOKENS,
+    MAX_MEMOIZED_TOOL_RESULTS,
+    SUMMARY_TOKENS
+)
+from context_cache import ResearchContext, create_context_cache, DEFAULT_CONTEXT_CACHE, DEFAULT_CONTEXT_CACHE_TTL
+
+# Report generation modes
+DEFAULT_REPORT_MODE = os.getenv("RESEARCH_REPORT_MODE", "single")
+DEFAULT_MAX_CONCURRENT_SUMMARIES = 8
+DEFAULT_STREAM_REPORT = os.getenv("RESEARCH_STREAM_REPORT", "1").lower() not in ("0", "false", "no")
+# Context size of each map-step prompt, and the output limit of its summary
+MAP_CHUNK_TOKENS = 8000
+MAP_OUTPUT_TOKENS = 2048
+# Rounds of combining map notes before the remaining notes are trimmed to fit the reduce prompt
+MAX_REDUCE_LEVELS = 3
+# Seconds the tool calls of one chat turn may take together
+DEFAULT_TOOL_TIMEOUT = float(os.getenv("RESEARCH_TOOL_TIMEOUT", 60))
+# Chat thread used when the caller doesn't name one
+DEFAULT_CHAT_THREAD = "default"
+
+
+def emit_event(event: str, **data):
+    """
+    Send a progress event to stream_research() consumers. Does nothing when the
+    workflow is not being streamed or is called outside a graph run.
+    
+    Args:
+        event: The event name, e.g. "search_done".
+        **data: The event's fields.
+    """
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return
+    writer({"event": event, **data})
+
+def merge_dicts(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reducer merging the dicts written by parallel branches. Writing the same keys
+    again (as nodes that return the whole state do) leaves the dict unchanged.
+    """
+    return {**left, **right}
+
+class MessageHistory(list):
+    """
+    Messages that replace the conversation instead of being appended to it.
+    """
+
+def update_messages(left: list, right: list) -> list:
+    """
+    Reducer appending new messages to the conversation, or replacing it with a
+    MessageHistory (the compacted conversation).
+    """
+    if isinstance(right, MessageHistory):
+        return list(right)
+    return left + right
 
 # Define the agent state
 class AgentState(BaseModel):
@@ -31,22 +132,41 @@ class AgentState(BaseModel):
     
     Attributes:
         messages: The messages exchanged in the conversation.
+        history_summary: Rolling summary of the conversation before the kept messages.
+        tool_results: Successful tool results of the conversation, by normalized call.
         queries: Generated search queries from the original query.
         search_results: Results from searches performed.
+        fetched_contents: Pages fetched by the per-query branches, by canonical URL.
         extracted_contents: Content extracted from web pages.
+        passages: Passages of the extracted content selected for the report.
+        token_savings: Estimated prompt tokens saved by deduplication, by kind.
+        token_usage: Planned and actual token usage of the report prompt.
         report: The final report generated.
         user_query: The original user query.
     """
-    messages: Annotated[list, add] = Field(default_factory=list)
+    messages: Annotated[list, update_messages] = Field(default_factory=list)
+    history_summary: str = ""
+    tool_results: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
     queries: List[str] = Field(default_factory=list)
-    search_results: Dict[str, List[str]] = Field(default_factory=dict)
+    search_results: Annotated[Dict[str, List[str]], merge_dicts] = Field(default_factory=dict)
+    fetched_contents: Annotated[Dict[str, Dict[str, Any]], merge_dicts] = Field(default_factory=dict)
     extracted_contents: List[Dict[str, Any]] = Field(default_factory=list)
+    passages: List[Dict[str, Any]] = Field(default_factory=list)
+    token_savings: Dict[str, int] = Field(default_factory=dict)
+    token_usage: Dict[str, Any] = Field(default_factory=dict)
     report: str = ""
     user_query: str = ""
     json_path: str = ""
     report_path: str = ""
 
 
+class QueryTask(BaseModel):
+    """
+    Input of the search and extraction branch of one generated query.
+    """
+    query: str = Field(description="The generated search query")
+
+
 class ResearchAgent:
     """
     An agent that performs web research and generates reports based on user queries.
@@ -58,7 +178,22 @@ class ResearchAgent:
         model_name: str = "gemini-2.0-flash",
         report_model_name: str = "gemini-2.0-flash",
         output_dir: str = "research_outputs",
-        system_instruction: str = None
+        system_instruction: str = None,
+        max_concurrent_fetches: int = DEFAULT_MAX_CONCURRENCY,
+        max_fetches_per_host: int = DEFAULT_PER_HOST_LIMIT,
+        politeness_rates: Dict[str, tuple] = None,
+        parse_in_processes: bool = True,
+        context_token_budget: int = DEFAULT_TOKEN_BUDGET,
+        max_prompt_tokens: int = DEFAULT_MAX_PROMPT_TOKENS,
+        context_overflow: str = DEFAULT_OVERFLOW,
+        report_mode: str = DEFAULT_REPORT_MODE,
+        max_concurrent_summaries: int = DEFAULT_MAX_CONCURRENT_SUMMARIES,
+        stream_report: bool = DEFAULT_STREAM_REPORT,
+        context_cache: str = DEFAULT_CONTEXT_CACHE,
+        context_cache_ttl: int = DEFAULT_CONTEXT_CACHE_TTL,
+        chat_checkpointer=None,
+        chat_history_tokens: int = DEFAULT_CHAT_HISTORY_TOKENS,
+        tool_timeout: float = DEFAULT_TOOL_TIMEOUT
     ):
         """
         Initialize the research agent.
@@ -69,6 +204,34 @@ class ResearchAgent:
             report_model_name: The name of the model to use for report generation.
             output_dir: Directory to save outputs.
             system_instruction: Custom system instructions for the model.
+            max_concurrent_fetches: Maximum number of pages fetched at the same time.
+            max_fetches_per_host: Maximum number of simultaneous fetches against one host.
+            politeness_rates: (requests per second, burst) overrides keyed by provider
+                name ("duckduckgo", "wikipedia") or host.
+            parse_in_processes: Whether HTML is parsed in the shared process pool instead of
+                the download threads.
+            context_token_budget: Estimated tokens of passages sent to the report model.
+                0 sends every extracted page in full.
+            max_prompt_tokens: Upper bound for the whole report prompt.
+            context_overflow: How material over a source's share of the budget is cut:
+                "trim" drops its lowest-scoring passages, "summarize" condenses it with the model.
+            report_mode: "single" writes the report in one call over the whole context;
+                "map_reduce" condenses each query's sources concurrently, then writes the
+                report from the notes.
+            max_concurrent_summaries: Maximum number of map-step calls in flight.
+            stream_report: Whether the report is streamed (to the on_report_chunk callback
+                and the report file) as it is generated.
+            context_cache: Where the report and sources of the last run are kept for
+                follow-up chat: "gemini" uploads them once to Gemini's context cache,
+                "local" resends them with every turn, "off" leaves the chat without them.
+            context_cache_ttl: Lifetime in seconds of an uploaded context cache.
+            chat_checkpointer: LangGraph checkpointer that stores the chat threads.
+                Defaults to an in-memory saver; pass e.g. a SqliteSaver to keep them
+                across restarts.
+            chat_history_tokens: Tokens of conversation history sent with a chat turn;
+                older turns are folded into a rolling summary.
+            tool_timeout: Seconds the tool calls of one chat turn may take together;
+                calls still running then are answered with a timeout error.
         """
         # Setup API key
         if api_key:
@@ -121,6 +284,47 @@ class ResearchAgent:
             get_wikipedia_page
         ]
         self.tool_mapping = {tool.__name__: tool for tool in self.tools}
+        self.async_tool_mapping = {
+            "search_duck_duck_go": asearch_duck_duck_go,
+            "get_page_content": aget_page_content,
+            "search_wikipedia": asearch_wikipedia,
+            "get_wikipedia_page": aget_wikipedia_page
+        }
+        
+        # Setup the per-host politeness scheduler shared by searches and fetches
+        self.scheduler = PolitenessScheduler(rates=politeness_rates)
+        
+        # Setup the concurrent fetch engine used for content extraction
+        self.fetch_engine = FetchEngine(
+            max_concurrency=max_concurrent_fetches,
+            per_host_limit=max_fetches_per_host,
+            scheduler=self.scheduler,
+            parse_pool=get_parse_pool() if parse_in_processes else None
+        )
+        if self.fetch_engine.parse_pool:
+            # Start the parse workers in the background so the first run doesn't pay for it
+            self.fetch_engine.parse_pool.warm_up()
+        
+        self.context_token_budget = context_token_budget
+        self.max_prompt_tokens = max_prompt_tokens
+        self.context_overflow = context_overflow
+        self.report_mode = report_mode
+        self.max_concurrent_summaries = max(1, max_concurrent_summaries)
+        self.stream_report = stream_report
+        # Local token estimates, calibrated against the report model's token counts
+        self.token_counter = TokenCounter(self.report_model)
+        
+        # Material of the last research run for follow-up chat, cached on the first turn
+        self.context_cache_backend = context_cache
+        self.context_cache_ttl = context_cache_ttl
+        self.research_context: Optional[ResearchContext] = None
+        self.context_cache = None
+        self._context_cache_lock = threading.Lock()
+        
+        # Chat threads, compacted to a bounded prompt before every model call
+        self.chat_checkpointer = chat_checkpointer if chat_checkpointer is not None else InMemorySaver()
+        self.chat_history_tokens = chat_history_tokens
+        self.tool_timeout = tool_timeout
         
         # Setup output directory
         self.output_dir = output_dir
@@ -132,7 +336,7 @@ class ResearchAgent:
         
         logger.info(f"Research Agent initialized with models: {model_name} and {report_model_name}")
     
-    def generate_queries(self, state: AgentState) -> AgentState:
+    async def agenerate_queries(self, state: AgentState) -> AgentState:
         """
         Generate search queries based on the user query.
         
@@ -145,56 +349,131 @@ class ResearchAgent:
         logger.info(f"Generating search queries for: {state.user_query}")
         
         # Use the model to generate search queries
-        result = generate_search_queries(state.user_query, self.model)
+        result = await agenerate_search_queries(state.user_query, self.model)
         
         # Update the state
         state.queries = result.queries
         logger.info(f"Generated {len(state.queries)} search queries")
+        emit_event("queries_generated", queries=state.queries)
         
         return state
     
-    def perform_searches(self, state: AgentState) -> AgentState:
+    async def _asearch_query(self, query: str) -> List[str]:
         """
-        Perform web searches for each generated query.
+        Search DuckDuckGo and Wikipedia for one query at the same time.
         
         Args:
-            state: The current agent state.
+            query: The search query.
             
         Returns:
-            Updated agent state with search results.
+            The links found, without repeated canonical URLs, in order.
         """
-        logger.info("Performing web searches...")
+        async def duck_duck_go():
+            # Cached results don't need a politeness slot
+            if search_cache_key(DUCKDUCKGO, query, MAX_LINKS_PER_SEARCH) not in search_cache:
+                await self.scheduler.aacquire(DUCKDUCKGO)
+            return await asearch_duck_duck_go(query)
         
-        for query in state.queries:
-            logger.info(f"Searching for: {query}")
-            
-            # Search DuckDuckGo
-            ddg_results = search_duck_duck_go(query)
-            
-            # Search Wikipedia
-            wiki_results = search_wikipedia(query)
-            
-            # Combine results
-            all_links = ddg_results.links + wiki_results.links
-            
-            # Remove duplicates while preserving order
-            unique_links = []
-            for link in all_links:
-                if link not in unique_links:
-                    unique_links.append(link)
+        async def wikipedia():
+            # The local index has no rate limit
+            if WIKIPEDIA_BACKEND != "local" and search_cache_key(WIKIPEDIA, query, MAX_WIKIPEDIA_RESULTS) not in search_cache:
+                await self.scheduler.aacquire(WIKIPEDIA)
+            return await asearch_wikipedia(query)
+        
+        ddg_results, wiki_results = await asyncio.gather(duck_duck_go(), wikipedia())
+        
+        # Combine results
+        all_links = ddg_results.links + wiki_results.links
+        
+        # Remove links with the same canonical URL while preserving order
+        seen = set()
+        unique_links = []
+        for link in all_links:
+            canonical = canonicalize_url(link)
+            if canonical not in seen:
+                seen.add(canonical)
+                unique_links.append(link)
+        return unique_links
+    
+    def generate_queries(self, state: AgentState) -> AgentState:
+        """
+        Synchronous wrapper of agenerate_queries.
+        """
+        return run_sync(self.agenerate_queries(state))
+    
+    @staticmethod
+    def fan_out_queries(state: AgentState) -> list:
+        """
+        Start one search and extraction branch per generated query.
+        
+        Args:
+            state: The current agent state.
             
-            # Update state
-            state.search_results[query] = unique_links
-            logger.info(f"Found {len(unique_links)} links for query: {query}")
+        Returns:
+            A Send per query, or the next node if there are no queries.
+        """
+        if not state.queries:
+            return ["collect_contents"]
+        return [Send("search_and_extract", QueryTask(query=query)) for query in state.queries]
+    
+    async def asearch_and_extract(self, task: QueryTask, config: RunnableConfig = None) -> dict:
+        """
+        Search for one generated query and fetch its results. Every query runs as its own
+        branch, so fetching the pages of one query overlaps the searches of the others.
+        
+        A page already claimed by another branch of the run is not fetched again;
+        collect_contents attributes it to every query that found it.
+        
+        Args:
+            task: The query of this branch.
+            config: Run configuration; configurable["claimed_urls"] is the set of canonical
+                URLs fetched by the branches of the run.
             
-            # Add a small delay between searches
-            time.sleep(2)
+        Returns:
+            The branch's search results and fetched pages, merged into the state.
+        """
+        query = task.query
+        claimed = (config or {}).get("configurable", {}).get("claimed_urls")
+        if claimed is None:
+            claimed = set()
         
-        return state
+        logger.info(f"Searching for: {query}")
+        started = time.perf_counter()
+        links = await self._asearch_query(query)
+        logger.info(f"Found {len(links)} links for query: {query}")
+        emit_event("search_done", query=query, links=len(links), seconds=round(time.perf_counter() - started, 2))
+        
+        # Claim the new pages before awaiting, so no other branch starts fetching them
+        urls = []
+        for link in links:
+            canonical = canonicalize_url(link)
+            if canonical not in claimed:
+                claimed.add(canonical)
+                urls.append(link)
+        emit_event("fetch_started", query=query, pages=len(urls))
+        
+        def report_page(url, content_result):
+            if content_result.success:
+                emit_event("page_fetched", query=query, url=url)
+            else:
+                emit_event("page_failed", query=query, url=url, error=content_result.content)
+        
+        content_results = await self.fetch_engine.afetch_all(urls, report_page)
+        
+        fetched = {}
+        for link, content_result in zip(urls, content_results):
+            if content_result.success:
+                fetched[canonicalize_url(link)] = {"url": link, "content": content_result.content}
+                logger.info(f"Successfully extracted content from {link}")
+            else:
+                logger.warning(f"Failed to extract content from {link}: {content_result.content}")
+        
+        return {"search_results": {query: links}, "fetched_contents": fetched}
     
-    def extract_content(self, state: AgentState) -> AgentState:
+    def collect_contents(self, state: AgentState) -> AgentState:
         """
-        Extract content from each search result.
+        Join the pages fetched by the query branches into the extracted content, in query
+        order and attributed to every query that surfaced them.
         
         Args:
             state: The current agent state.
@@ -202,65 +481,230 @@ class ResearchAgent:
         Returns:
             Updated agent state with extracted content.
         """
-        logger.info("Extracting content from web pages...")
+        # Branches finish in any order; the plan restores the order of the queries
+        fetch_plan = plan_fetches({
+            query: state.search_results[query] for query in state.queries if query in state.search_results
+        })
+        state.extracted_contents = []
+        for item in fetch_plan:
+            page = state.fetched_contents.get(item["canonical_url"])
+            if page:
+                state.extracted_contents.append({
+                    "query": item["queries"][0],
+                    "queries": item["queries"],
+                    "url": page["url"],
+                    "content": page["content"]
+                })
         
-        for query, links in state.search_results.items():
-            for link in links:
-                logger.info(f"Extracting content from: {link}")
-                
-                # Handle Wikipedia links specially
-                if "wikipedia.org/wiki/" in link:
-                    title = link.split("/wiki/")[-1].replace("_", " ")
-                    content_result = get_wikipedia_page(title)
-                else:
-                    content_result = get_page_content(link)
-                
-                if content_result.success:
-                    # Add to extracted contents
-                    state.extracted_contents.append({
-                        "query": query,
-                        "url": link,
-                        "content": content_result.content
-                    })
-                    logger.info(f"Successfully extracted content from {link}")
-                else:
-                    logger.warning(f"Failed to extract content from {link}: {content_result.content}")
-                
-                # Add a small delay between requests
-                time.sleep(3)
+        total_links = sum(len(links) for links in state.search_results.values())
+        logger.info(
+            f"Extracted {len(state.extracted_contents)} of {len(fetch_plan)} unique pages "
+            f"for {total_links} search result links"
+        )
+        self.scheduler.log_stats(logger)
+        cache_stats = search_cache.stats()
+        logger.info(f"Search cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries")
+        return state
+    
+    async def aperform_searches(self, state: AgentState) -> AgentState:
+        """
+        Search for all generated queries concurrently, without fetching their pages.
+        The workflow searches and fetches each query in its own branch instead
+        (asearch_and_extract); this runs the search step on its own.
         
+        Args:
+            state: The current agent state.
+            
+        Returns:
+            Updated agent state with search results.
+        """
+        results = await asyncio.gather(*(self._asearch_query(query) for query in state.queries))
+        state.search_results = {**state.search_results, **dict(zip(state.queries, results))}
         return state
     
-    def generate_report(self, state: AgentState) -> AgentState:
+    async def aextract_content(self, state: AgentState) -> AgentState:
         """
-        Generate a report based on extracted content.
+        Fetch every page of the search results once and join them into the extracted
+        content (see collect_contents). This runs the fetch step on its own.
         
         Args:
             state: The current agent state.
             
         Returns:
-            Updated agent state with the generated report.
+            Updated agent state with extracted content.
         """
-        logger.info("Generating final report...")
+        fetch_plan = plan_fetches(state.search_results)
+        content_results = await self.fetch_engine.afetch_all([item["url"] for item in fetch_plan])
+        fetched = {}
+        for item, content_result in zip(fetch_plan, content_results):
+            if content_result.success:
+                fetched[item["canonical_url"]] = {"url": item["url"], "content": content_result.content}
+            else:
+                logger.warning(f"Failed to extract content from {item['url']}: {content_result.content}")
+        state.fetched_contents = {**state.fetched_contents, **fetched}
+        return self.collect_contents(state)
+    
+    def perform_searches(self, state: AgentState) -> AgentState:
+        """
+        Synchronous wrapper of aperform_searches.
+        """
+        return run_sync(self.aperform_searches(state))
+    
+    def extract_content(self, state: AgentState) -> AgentState:
+        """
+        Synchronous wrapper of aextract_content.
+        """
+        return run_sync(self.aextract_content(state))
+    
+    def deduplicate_content(self, state: AgentState) -> AgentState:
+        """
+        Drop near-duplicate pages and repeated text from the extracted content.
         
-        # Prepare context from extracted content
-        context_parts = []
+        Args:
+            state: The current agent state.
+            
+        Returns:
+            Updated agent state with deduplicated content.
+        """
+        if not state.extracted_contents:
+            return state
         
-        for item in state.extracted_contents:
-            context_parts.append(f"Source: {item['url']}\nGenerated Query: {item['query']}\nContent:\n{item['content']}\n\n---\n")
+        pages = len(state.extracted_contents)
+        state.extracted_contents, removed = deduplicate_contents(state.extracted_contents)
+        for kind, chars in removed.items():
+            state.token_savings[kind] = chars // CHARS_PER_TOKEN
+        logger.info(
+            f"Removed {pages - len(state.extracted_contents)} near-duplicate pages "
+            f"(~{state.token_savings['duplicate_pages']} tokens) and repeated text "
+            f"(~{state.token_savings['repeated_text']} tokens)"
+        )
+        emit_event("deduplicated", pages_removed=pages - len(state.extracted_contents),
+                   tokens_saved=sum(state.token_savings.values()))
+        return state
+    
+    def retrieve_passages(self, state: AgentState) -> AgentState:
+        """
+        Select the passages of the extracted content most relevant to the queries.
         
-        if not context_parts:
-            logger.warning("No content was extracted. Cannot generate report.")
-            state.report = "Error: No content was successfully extracted from web searches to generate a report."
+        Args:
+            state: The current agent state.
+            
+        Returns:
+            Updated agent state with the selected passages.
+        """
+        if not self.context_token_budget or not state.extracted_contents:
             return state
         
-        # Join context parts
-        full_context = "\n".join(context_parts)
+        logger.info("Selecting relevant passages...")
+        selection = select_passages(
+            state.extracted_contents,
+            state.user_query,
+            state.queries,
+            token_budget=self.context_token_budget,
+            count_tokens=self.token_counter.estimate
+        )
+        passages = selection.passages
+        state.passages = [passage.model_dump() for passage in passages]
+        state.token_savings["duplicate_passages"] = selection.duplicate_tokens
+        
+        total_chars = sum(len(item["content"]) for item in state.extracted_contents)
+        selected_chars = sum(len(passage.text) for passage in passages)
+        logger.info(
+            f"Selected {len(passages)} passages from {len(state.extracted_contents)} pages "
+            f"({selected_chars} of {total_chars} characters), "
+            f"dropped {selection.duplicate_passages} of {selection.total_passages} passages as near-duplicates"
+        )
+        emit_event("passages_selected", passages=len(passages), pages=len(state.extracted_contents))
+        return state
+    
+    def _context_sources(self, state: AgentState) -> List[ContextSource]:
+        """
+        Collect the report material per source: the selected passages, or the full
+        extracted content when passage retrieval is off.
+        """
+        if state.passages:
+            sources: Dict[str, ContextSource] = {}
+            for passage in state.passages:
+                if passage["url"] not in sources:
+                    sources[passage["url"]] = ContextSource(url=passage["url"], queries=passage["queries"])
+                sources[passage["url"]].passages.append(passage)
+            return list(sources.values())
         
-        # Generate report using the model
+        return [
+            ContextSource(
+                url=item["url"],
+                queries=item.get("queries", [item["query"]]),
+                passages=[{"text": item["content"], "score": 0.0, "position": 0}]
+            )
+            for item in state.extracted_contents
+        ]
+    
+    @staticmethod
+    def _format_source(source: ContextSource) -> str:
+        """
+        Format one source for the report context.
+        """
+        queries = "; ".join(source.queries)
+        content = source.passages[0]["text"] if source.passages else ""
+        for previous, passage in zip(source.passages, source.passages[1:]):
+            # Consecutive passages continue each other; gaps are marked
+            separator = " " if passage["position"] == previous["position"] + 1 else "\n[...]\n"
+            content += separator + passage["text"]
+        return f"Source: {source.url}\nGenerated Queries: {queries}\nContent:\n{content}\n\n---\n"
+    
+    def _summarize_source(self, text: str, max_tokens: int) -> str:
+        """
+        Summarize the text of a source that doesn't fit its share of the context.
+        
+        Args:
+            text: The text of the source.
+            max_tokens: Tokens available for the summary.
+            
+        Returns:
+            The summary, or an empty string if summarization failed.
+        """
         prompt = f"""
+        Condense the following source text to at most {max(1, max_tokens * 3 // 4)} words.
+        Keep every fact, number, name and definition that could matter for a research report,
+        and drop everything else. Use only the information in the text.
+
+        --- START TEXT ---
+        {text}
+        --- END TEXT ---
+        """
+        try:
+            response = generate_cached(self.model, prompt, "summarize_source",
+                                       generation_config={"max_output_tokens": max_tokens})
+            return response.text.strip()
+        except Exception as e:
+            logger.warning(f"Could not summarize source, trimming it instead: {e}")
+            return ""
+    
+    def _plan_context(self, state: AgentState, sources: List[ContextSource]) -> BudgetPlan:
+        """
+        Fit the report material into the prompt budget.
+        """
+        counter = self.token_counter
+        prompt_overhead = counter.estimate(self._build_report_prompt(state.user_query, ""))
+        budget = self.max_prompt_tokens - prompt_overhead
+        if self.context_token_budget:
+            budget = min(budget, self.context_token_budget)
+        return fit_to_budget(
+            sources,
+            budget,
+            counter,
+            overhead=lambda source: counter.estimate(self._format_source(source.model_copy(update={"passages": []}))),
+            summarize=self._summarize_source if self.context_overflow == "summarize" else None
+        )
+    
+    @staticmethod
+    def _build_report_prompt(user_query: str, full_context: str) -> str:
+        """
+        Build the report prompt around the context.
+        """
+        return f"""
         **Original User Query:**
-        {state.user_query}
+        {user_query}
 
         **Context Gathered from Web Search:**
         --- START CONTEXT ---
@@ -284,10 +728,243 @@ class ResearchAgent:
 
         Generate the deeply detailed and engaging report now.
         """
+    
+    @staticmethod
+    def _build_map_prompt(user_query: str, query: str, context: str) -> str:
+        """
+        Build the prompt that condenses the sources of one query into notes for the report.
+        """
+        return f"""
+        **Original User Query:**
+        {user_query}
+
+        **Search Query That Found These Sources:**
+        {query}
+
+        **Sources:**
+        --- START CONTEXT ---
+        {context}
+        --- END CONTEXT ---
+
+        **Task:**
+        Write detailed research notes from the sources above that will later be merged with notes
+        from other sources into a report answering the original user query.
+
+        **Instructions:**
+
+        1.  Keep every fact, figure, definition, explanation and comparison relevant to the user query.
+        2.  Use only the information in the sources. Do not add external knowledge.
+        3.  Cite the source URL in parentheses immediately after every piece of information.
+        4.  Write concise markdown bullet points grouped by topic. Do not write an introduction or conclusion.
+        """
+    
+    @staticmethod
+    def _build_combine_prompt(user_query: str, notes: str) -> str:
+        """
+        Build the prompt that merges the notes of several chunks into one set of notes.
+        """
+        return f"""
+        **Original User Query:**
+        {user_query}
+
+        **Research Notes:**
+        --- START NOTES ---
+        {notes}
+        --- END NOTES ---
+
+        **Task:**
+        Merge the research notes above into one shorter set of notes that will later be combined
+        with other notes into a report answering the original user query.
+
+        **Instructions:**
+
+        1.  Keep every fact, figure and comparison relevant to the user query; merge repeated points.
+        2.  Use only the information in the notes. Do not add external knowledge.
+        3.  Keep the source URL in parentheses after every piece of information.
+        4.  Write concise markdown bullet points grouped by topic.
+        """
+    
+    @staticmethod
+    def _format_notes(summaries: List[dict]) -> str:
+        """
+        Format map notes for the reduce prompt.
+        """
+        return "\n".join(
+            f"Notes for search query: {summary['query']}\n{summary['notes']}\n\n---\n" for summary in summaries
+        )
+    
+    def _fit_notes(self, summaries: List[dict], budget: int) -> List[dict]:
+        """
+        Trim notes to a token budget, sharing it fairly across their queries.
+        """
+        counter = self.token_counter
+        sources = [
+            ContextSource(url=str(i), queries=[summary["query"]],
+                          passages=[{"text": summary["notes"], "score": 0.0, "position": 0}])
+            for i, summary in enumerate(summaries)
+        ]
+        plan = fit_to_budget(
+            sources, budget, counter,
+            overhead=lambda source: counter.estimate(self._format_notes([{"query": source.queries[0], "notes": ""}]))
+        )
+        return [{"query": source.queries[0], "notes": source.passages[0]["text"]} for source in plan.sources]
+    
+    async def _areduce_notes(self, user_query: str, summaries: List[dict]) -> tuple:
+        """
+        Bring the map notes within the budget of the reduce prompt. While they don't fit,
+        consecutive notes are merged in chunks of at most MAP_CHUNK_TOKENS, concurrently;
+        after MAX_REDUCE_LEVELS rounds whatever is still over is trimmed.
+        
+        Returns:
+            (notes, levels, calls): the fitted notes, the rounds of merging and the merge calls made
+        """
+        counter = self.token_counter
+        budget = self.max_prompt_tokens - counter.estimate(self._build_report_prompt(user_query, ""))
+        chunk_tokens = max(1, min(MAP_CHUNK_TOKENS, budget))
+        limit = asyncio.Semaphore(self.max_concurrent_summaries)
+        levels = calls = 0
+        
+        async def combine(group: List[dict]) -> dict:
+            nonlocal calls
+            query = "; ".join(dict.fromkeys(summary["query"] for summary in group))
+            # A single note larger than a chunk is trimmed so the merge prompt fits too
+            notes = self._format_notes(self._fit_notes(group, chunk_tokens))
+            async with limit:
+                calls += 1
+                try:
+                    response = await agenerate_cached(
+                        self.report_model, self._build_combine_prompt(user_query, notes), "reduce_notes",
+                        generation_config={"max_output_tokens": MAP_OUTPUT_TOKENS}
+                    )
+                    return {"query": query, "notes": response.text}
+                except Exception as e:
+                    logger.error(f"Error merging notes for '{query}': {e}")
+                    return {"query": query, "notes": notes}
+        
+        while counter.estimate(self._format_notes(summaries)) > budget and levels < MAX_REDUCE_LEVELS:
+            groups, group, size = [], [], 0
+            for summary in summaries:
+                tokens = counter.estimate(self._format_notes([summary]))
+                if group and size + tokens > chunk_tokens:
+                    groups.append(group)
+                    group, size = [], 0
+                group.append(summary)
+                size += tokens
+            if group:
+                groups.append(group)
+            levels += 1
+            logger.info(f"Reduce prompt over budget; merging {len(summaries)} notes in {len(groups)} chunks (level {levels})")
+            summaries = list(await asyncio.gather(*(combine(group) for group in groups)))
+        
+        if counter.estimate(self._format_notes(summaries)) > budget:
+            logger.warning(f"Notes still over the reduce budget after {levels} levels; trimming them")
+            summaries = self._fit_notes(summaries, budget)
+        return summaries, levels, calls
+    
+    def _map_clusters(self, state: AgentState, sources: List[ContextSource]) -> List[tuple]:
+        """
+        Group the sources by the first query that surfaced them, splitting large groups so
+        that every map prompt holds at most MAP_CHUNK_TOKENS of context. Map calls then
+        take about the same time however many sources there are.
+        
+        Returns:
+            (query, sources) pairs in query order
+        """
+        clusters: Dict[str, List[ContextSource]] = {}
+        for source in sources:
+            clusters.setdefault(source.queries[0] if source.queries else state.user_query, []).append(source)
+        
+        counter = self.token_counter
+        header = lambda source: counter.estimate(self._format_source(source.model_copy(update={"passages": []})))
+        chunks = []
+        for query, members in clusters.items():
+            chunk, size = [], 0
+            for source in members:
+                tokens = counter.estimate(self._format_source(source))
+                if chunk and size + tokens > MAP_CHUNK_TOKENS:
+                    chunks.append((query, chunk))
+                    chunk, size = [], 0
+                chunk.append(source)
+                size += tokens
+            if chunk:
+                chunks.append((query, chunk))
+        
+        # A single source larger than a chunk is trimmed to fit
+        fitted = []
+        for query, chunk in chunks:
+            plan = fit_to_budget(chunk, MAP_CHUNK_TOKENS, counter, overhead=header)
+            if plan.sources:
+                fitted.append((query, plan.sources))
+        return fitted
+    
+    async def _amap_summaries(self, user_query: str, clusters: List[tuple]) -> List[dict]:
+        """
+        Condense every cluster concurrently with the async Gemini client.
+        
+        Returns:
+            One {"query", "notes", "prompt_tokens", "output_tokens", "cached"} dict per cluster, in order
+        """
+        limit = asyncio.Semaphore(self.max_concurrent_summaries)
+        
+        async def summarize(query: str, members: List[ContextSource]) -> dict:
+            prompt = self._build_map_prompt(user_query, query, "\n".join(self._format_source(s) for s in members))
+            async with limit:
+                try:
+                    response = await agenerate_cached(
+                        self.report_model, prompt, "map_summary",
+                        generation_config={"max_output_tokens": MAP_OUTPUT_TOKENS}
+                    )
+                    notes = response.text
+                except Exception as e:
+                    logger.error(f"Error summarizing sources for '{query}': {e}")
+                    # Fall back to the raw sources so the reduce step still sees them
+                    notes = "\n".join(self._format_source(s) for s in members)
+                    response = None
+            emit_event("sources_summarized", query=query, sources=len(members), failed=response is None)
+            return {
+                "query": query,
+                "notes": notes,
+                "prompt_tokens": response.prompt_tokens if response else None,
+                "output_tokens": response.output_tokens if response else None,
+                "cached": response.cached if response else False
+            }
+        
+        return list(await asyncio.gather(*(summarize(query, members) for query, members in clusters)))
+    
+    async def _agenerate_report_map_reduce(self, state: AgentState, sources: List[ContextSource],
+                                           on_chunk: Optional[Callable[[str], None]] = None) -> AgentState:
+        """
+        Generate the report by condensing each query's sources concurrently (map),
+        then writing the report from the combined notes (reduce). Notes that don't fit
+        the prompt budget are merged further first (see _areduce_notes).
+        """
+        clusters = self._map_clusters(state, sources)
+        logger.info(f"Summarizing {sum(len(m) for _, m in clusters)} sources in {len(clusters)} chunks concurrently")
+        
+        started = time.perf_counter()
+        summaries = await self._amap_summaries(state.user_query, clusters)
+        map_seconds = time.perf_counter() - started
+        logger.info(f"Map step finished in {map_seconds:.1f}s")
+        
+        notes, reduce_levels, reduce_calls = await self._areduce_notes(state.user_query, summaries)
+        prompt = self._build_report_prompt(state.user_query, self._format_notes(notes))
+        state.token_usage = {
+            "mode": "map_reduce",
+            "map_calls": len(summaries),
+            "map_seconds": round(map_seconds, 2),
+            "map_prompt_tokens": sum(summary["prompt_tokens"] or 0 for summary in summaries),
+            "map_output_tokens": sum(summary["output_tokens"] or 0 for summary in summaries),
+            "map_cached_calls": sum(summary["cached"] for summary in summaries),
+            "reduce_levels": reduce_levels,
+            "reduce_calls": reduce_calls,
+            "planned_prompt_tokens": self.token_counter.estimate(prompt),
+        }
         
         try:
-            response = self.report_model.generate_content(prompt)
-            state.report = response.text
+            response = await self._awrite_report(state, prompt, on_chunk)
+            if response.prompt_tokens:
+                state.token_usage["actual_prompt_tokens"] = response.prompt_tokens
+                state.token_usage["output_tokens"] = response.output_tokens
             logger.info("Report generated successfully")
         except Exception as e:
             logger.error(f"Error generating report: {e}")
@@ -295,6 +972,182 @@ class ResearchAgent:
         
         return state
     
+    def _output_paths(self, state: AgentState) -> tuple:
+        """
+        Choose the JSON and report file paths of a run, once.
+        
+        Returns:
+            (json_path, report_path)
+        """
+        if not state.report_path:
+            # Create timestamp and sanitized query name for filenames
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            safe_query = state.user_query.lower().replace(" ", "_")
+            safe_query = "".join(c for c in safe_query if c.isalnum() or c == "_")
+            safe_query = safe_query[:50]  # Limit length
+            state.json_path = os.path.join(self.output_dir, f"{safe_query}_{timestamp}.json")
+            state.report_path = os.path.join(self.output_dir, f"{safe_query}_{timestamp}_report.txt")
+        return state.json_path, state.report_path
+    
+    @staticmethod
+    def _report_header(state: AgentState) -> str:
+        return f"Original Query: {state.user_query}\n\n" + "="*20 + " GENERATED REPORT " + "="*20 + "\n\n"
+    
+    async def _awrite_report(self, state: AgentState, prompt: str,
+                             on_chunk: Optional[Callable[[str], None]] = None) -> CachedResponse:
+        """
+        Generate the report text into state.report. When streaming, every chunk is passed
+        to on_chunk and appended to the report file as soon as it arrives. A report already
+        written for the same prompt is taken from the LLM cache.
+        
+        Args:
+            state: The current agent state.
+            prompt: The report prompt.
+            on_chunk: Called with each chunk of report text.
+            
+        Returns:
+            The report text with its token usage.
+        """
+        cache = get_llm_cache()
+        key = model_cache_key(self.report_model, prompt)
+        cached = await run_blocking(cache.get, key, "report") if cache else None
+        if cached is not None:
+            logger.info(f"Report taken from the LLM cache (saved ~{cached.seconds:.1f}s)")
+            state.report = cached.text
+            state.token_usage["report_cached"] = True
+            emit_event("report_chunk", text=state.report)
+            if on_chunk:
+                on_chunk(state.report)
+            return cached
+        
+        started = time.perf_counter()
+        if not self.stream_report:
+            response = await self.report_model.generate_content_async(prompt)
+            state.report = response.text
+            emit_event("report_chunk", text=state.report)
+            if on_chunk:
+                on_chunk(state.report)
+        else:
+            _, report_path = self._output_paths(state)
+            first_chunk = None
+            parts = []
+            response = await self.report_model.generate_content_async(prompt, stream=True)
+            with open(report_path, 'w', encoding='utf-8') as f:
+                f.write(self._report_header(state))
+                async for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunks without text (e.g. only a finish reason) are skipped
+                        continue
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - started
+                        logger.info(f"First report chunk after {first_chunk:.1f}s")
+                    parts.append(text)
+                    f.write(text)
+                    f.flush()
+                    emit_event("report_chunk", text=text)
+                    if on_chunk:
+                        on_chunk(text)
+            state.report = "".join(parts)
+            state.token_usage["first_chunk_seconds"] = round(first_chunk, 2) if first_chunk is not None else None
+        
+        seconds = time.perf_counter() - started
+        state.token_usage["generation_seconds"] = round(seconds, 2)
+        usage = getattr(response, "usage_metadata", None)
+        result = CachedResponse(
+            text=state.report,
+            prompt_tokens=usage.prompt_token_count if usage else None,
+            output_tokens=usage.candidates_token_count if usage else None,
+            seconds=seconds
+        )
+        if cache and state.report:
+            await run_blocking(cache.put, key, result, "report")
+        return result
+    
+    async def agenerate_report(self, state: AgentState, config: RunnableConfig = None) -> AgentState:
+        """
+        Generate a report based on extracted content.
+        
+        Args:
+            state: The current agent state.
+            config: Run configuration; configurable["on_report_chunk"] receives the
+                report text as it is generated.
+            
+        Returns:
+            Updated agent state with the generated report.
+        """
+        logger.info("Generating final report...")
+        on_chunk = (config or {}).get("configurable", {}).get("on_report_chunk")
+        
+        # Prepare context from the selected passages, or from the full extracted content
+        sources = self._context_sources(state)
+        
+        if not sources:
+            logger.warning("No content was extracted. Cannot generate report.")
+            state.report = "Error: No content was successfully extracted from web searches to generate a report."
+            return state
+        
+        if sum(state.token_savings.values()):
+            logger.info(f"Deduplication saved ~{sum(state.token_savings.values())} prompt tokens this run")
+        
+        if self.report_mode == "map_reduce":
+            return await self._agenerate_report_map_reduce(state, sources, on_chunk)
+        
+        # Fit the context into the budget with local estimates, then check the real count once.
+        # Planning may summarize sources and counting calls the API, both blocking, so they
+        # run in a worker thread.
+        plan = await run_blocking(self._plan_context, state, sources)
+        prompt = self._build_report_prompt(state.user_query, "\n".join(self._format_source(s) for s in plan.sources))
+        planned = self.token_counter.estimate(prompt)
+        counted = await run_blocking(self.token_counter.count, prompt)
+        if counted and counted > self.max_prompt_tokens:
+            # The estimator was recalibrated by the count, so a second plan fits
+            logger.warning(f"Report prompt has {counted} tokens, over the {self.max_prompt_tokens} limit; refitting")
+            plan = await run_blocking(self._plan_context, state, sources)
+            prompt = self._build_report_prompt(state.user_query, "\n".join(self._format_source(s) for s in plan.sources))
+            planned = self.token_counter.estimate(prompt)
+            counted = await run_blocking(self.token_counter.count, prompt)
+        
+        state.token_usage = {
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "context_budget": plan.budget,
+            "requested_context_tokens": plan.requested_tokens,
+            "planned_context_tokens": plan.planned_tokens,
+            "planned_prompt_tokens": planned,
+            "counted_prompt_tokens": counted,
+            "trimmed_tokens": plan.trimmed_tokens,
+            "dropped_sources": plan.dropped_sources,
+            "summarized_sources": plan.summarized_sources,
+        }
+        logger.info(
+            f"Report context: {len(plan.sources)} of {len(sources)} sources, "
+            f"~{plan.planned_tokens} of ~{plan.requested_tokens} tokens (budget {plan.budget}), "
+            f"{plan.summarized_sources} summarized"
+        )
+        
+        try:
+            response = await self._awrite_report(state, prompt, on_chunk)
+            if response.prompt_tokens:
+                state.token_usage["actual_prompt_tokens"] = response.prompt_tokens
+                state.token_usage["output_tokens"] = response.output_tokens
+                self.token_counter.calibrate(prompt, response.prompt_tokens)
+            logger.info(
+                f"Report generated successfully (prompt tokens: planned {planned}, "
+                f"actual {state.token_usage.get('actual_prompt_tokens', 'unknown')})"
+            )
+        except Exception as e:
+            logger.error(f"Error generating report: {e}")
+            state.report = f"Error generating report: {str(e)}"
+        
+        return state
+    
+    def generate_report(self, state: AgentState, config: RunnableConfig = None) -> AgentState:
+        """
+        Synchronous wrapper of agenerate_report.
+        """
+        return run_sync(self.agenerate_report(state, config))
+    
     def save_outputs(self, state: AgentState) -> AgentState:
         """
         Save the research data and report to files.
@@ -307,49 +1160,150 @@ class ResearchAgent:
         """
         logger.info("Saving outputs to files...")
         
-        # Create timestamp and sanitized query name for filenames
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_query = state.user_query.lower().replace(" ", "_")
-        safe_query = "".join(c for c in safe_query if c.isalnum() or c == "_")
-        safe_query = safe_query[:50]  # Limit length
+        json_path, report_path = self._output_paths(state)
         
         # Prepare data for JSON
         json_data = {
             "initial_query": state.user_query,
             "generated_queries": state.queries,
             "search_results": state.search_results,
-            "extracted_contents": state.extracted_contents
+            "extracted_contents": state.extracted_contents,
+            "passages": state.passages,
+            "token_savings": state.token_savings,
+            "token_usage": state.token_usage
         }
         
         # Save JSON data
-        json_filename = f"{safe_query}_{timestamp}.json"
-        json_path = os.path.join(self.output_dir, json_filename)
-        
         try:
             with open(json_path, 'w', encoding='utf-8') as f:
                 json.dump(json_data, f, ensure_ascii=False, indent=4)
-            state.json_path = json_path
             logger.info(f"Data saved to {json_path}")
         except Exception as e:
             logger.error(f"Error saving JSON data: {e}")
         
-        # Save report
-        report_filename = f"{safe_query}_{timestamp}_report.txt"
-        report_path = os.path.join(self.output_dir, report_filename)
-        
+        # Save report (rewritten in full, also when it was streamed to the file)
         try:
             with open(report_path, 'w', encoding='utf-8') as f:
-                f.write(f"Original Query: {state.user_query}\n\n")
-                f.write("="*20 + " GENERATED REPORT " + "="*20 + "\n\n")
+                f.write(self._report_header(state))
                 f.write(state.report)
-            state.report_path = report_path
             logger.info(f"Report saved to {report_path}")
         except Exception as e:
             logger.error(f"Error saving report: {e}")
         
+        llm_cache = get_llm_cache()
+        if llm_cache:
+            sites = llm_cache.stats()["sites"]
+            logger.info("LLM cache: " + ", ".join(
+                f"{site} {stats['hits']}/{stats['hits'] + stats['misses']} hits (saved {stats['saved_seconds']:.1f}s)"
+                for site, stats in sites.items()
+            ))
+        
+        emit_event("outputs_saved", json_path=json_path, report_path=report_path)
         return state
     
-    def call_llm(self, state: AgentState) -> dict:
+    def use_research_context(self, state: AgentState):
+        """
+        Make the report and sources of a research run the material follow-up chat turns
+        are answered from. The material replaces the previous run's and is cached on the
+        next chat turn.
+        
+        Args:
+            state: The final state of the research run.
+        """
+        if isinstance(state, dict):
+            state = AgentState(**state)
+        if not state.report or state.report.startswith("Error"):
+            return
+        
+        # The sources share what the report leaves of the prompt limit, trimmed but never summarized
+        counter = self.token_counter
+        report_tokens = counter.estimate(state.report)
+        plan = fit_to_budget(
+            self._context_sources(state),
+            self.max_prompt_tokens - report_tokens,
+            counter,
+            overhead=lambda source: counter.estimate(self._format_source(source.model_copy(update={"passages": []})))
+        )
+        context = ResearchContext(
+            user_query=state.user_query,
+            report=state.report,
+            sources="\n".join(self._format_source(source) for source in plan.sources),
+            tokens=report_tokens + plan.planned_tokens
+        )
+        with self._context_cache_lock:
+            previous, self.context_cache = self.context_cache, None
+            self.research_context = context
+        if previous is not None:
+            previous.release()
+    
+    def _get_context_cache(self):
+        """
+        Get the cache of the last run's material, creating it on first use and
+        keeping it alive while the chat uses it.
+        
+        Returns:
+            The context cache, or None if there is no material or caching is off.
+        """
+        with self._context_cache_lock:
+            if self.context_cache is not None:
+                try:
+                    self.context_cache.refresh()
+                except Exception as e:
+                    logger.warning(f"Context cache is gone, caching the research context again: {e}")
+                    self.context_cache = None
+            if self.context_cache is None and self.research_context is not None:
+                self.context_cache = create_context_cache(
+                    self.context_cache_backend,
+                    self.research_context,
+                    self.model,
+                    self.model_name,
+                    system_instruction=self.system_instruction,
+                    tools=self.tools,
+                    ttl=self.context_cache_ttl
+                )
+            return self.context_cache
+    
+    async def acompact_history(self, state: AgentState) -> dict:
+        """
+        Keep the conversation within the chat history budget. Tool payloads of earlier
+        turns are truncated, and once the conversation is over budget its oldest turns
+        are folded into the rolling summary.
+        
+        Args:
+            state: The current agent state.
+            
+        Returns:
+            The compacted messages and summary, or no update.
+        """
+        starts = turn_starts(state.messages)
+        messages = truncate_tool_payloads(state.messages, starts[-1] if starts else 0)
+        summary = state.history_summary
+        
+        def estimate(items: List[dict]) -> int:
+            return estimate_messages(items, self.token_counter.estimate)
+        
+        if estimate_messages(messages, self.token_counter.estimate, summary) > self.chat_history_tokens:
+            cut = split_history(messages, self.chat_history_tokens, estimate)
+            if cut:
+                try:
+                    response = await agenerate_cached(
+                        self.report_model,
+                        summary_prompt(summary, messages[:cut]),
+                        "chat_summary",
+                        generation_config={"max_output_tokens": SUMMARY_TOKENS}
+                    )
+                    summary = response.text.strip()
+                except Exception as e:
+                    # Dropping the old turns still bounds the prompt; only their details are lost
+                    logger.warning(f"Could not summarize the conversation, dropping its oldest turns: {e}")
+                messages = messages[cut:]
+                logger.info(f"Folded {cut} chat messages into the conversation summary")
+        
+        if messages == state.messages and summary == state.history_summary:
+            return {}
+        return {"messages": MessageHistory(messages), "history_summary": summary}
+    
+    async def acall_llm(self, state: AgentState) -> dict:
         """
         Call the LLM with the current messages.
         
@@ -359,20 +1313,19 @@ class ResearchAgent:
         Returns:
             Updated messages.
         """
+        model, contents = self.model, summary_messages(state.history_summary) + state.messages
+        context_cache = self.context_cache
+        if context_cache is not None:
+            # The research material comes from the cache instead of the conversation
+            model, contents = context_cache.prepare(contents)
         try:
-            response = self.model.generate_content(
-                state.messages,
+            response = await model.generate_content_async(
+                contents,
                 request_options=RequestOptions(
-                    retry=retry.Retry(initial=10, multiplier=2, maximum=60, timeout=300)
+                    retry=retry_async.AsyncRetry(initial=10, multiplier=2, maximum=60, timeout=300)
                 ),
             )
-            return {
-                "messages": [
-                    type(response.candidates[0].content).to_dict(
-                        response.candidates[0].content
-                    )
-                ]
-            }
+            message = type(response.candidates[0].content).to_dict(response.candidates[0].content)
         except Exception as e:
             logger.error(f"Error calling LLM: {e}", exc_info=True)
             # Return an error message if the call fails
@@ -381,46 +1334,96 @@ class ResearchAgent:
                     {"role": "model", "parts": [{"text": f"Error: {str(e)}"}]}
                 ]
             }
+        
+        # Usage is informational; a response without it is still a valid answer
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            logger.info(f"Chat turn used {getattr(usage, 'prompt_token_count', None)} prompt tokens "
+                        f"({getattr(usage, 'cached_content_token_count', None) or 0} from the context cache)")
+        return {"messages": [message]}
 
-    def use_tool(self, state: AgentState) -> dict:
+    async def ause_tool(self, state: AgentState) -> dict:
         """
-        Use a tool based on the function call from the LLM.
+        Run the function calls of the LLM's last message. The calls run concurrently
+        within the turn's timeout, and a call that fails or times out is answered with
+        an error without holding up the others.
+        
+        Successful results are memoized for the conversation by the call's normalized
+        arguments. A repeated call doesn't run again: it is answered with a short
+        reference when its result is still in the conversation, and with the memoized
+        result otherwise.
         
         Args:
             state: The current agent state.
             
         Returns:
-            Tool response to add to messages.
+            Tool responses to add to messages, in the order of the calls, and the
+            updated memoized results.
         """
         assert any("function_call" in part for part in state.messages[-1]["parts"])
+        calls = [part["function_call"] for part in state.messages[-1]["parts"] if "function_call" in part]
+        keys = [tool_call_key(call["name"], call.get("args")) for call in calls]
+        memo = dict(state.tool_results)
+        
+        async def run(call: dict) -> dict:
+            try:
+                result = await self.async_tool_mapping[call["name"]](**call["args"])
+                return result.model_dump(mode="json")
+            except Exception as e:
+                logger.error(f"Error using tool {call['name']}: {e}", exc_info=True)
+                return {"success": False, "content": f"Error: {str(e)}"}
+        
+        # Each distinct call runs once, and only if it wasn't answered earlier in the conversation
+        tasks: Dict[str, asyncio.Future] = {}
+        for key, call in zip(keys, calls):
+            if key not in memo and key not in tasks:
+                tasks[key] = asyncio.ensure_future(run(call))
+        done, pending = await asyncio.wait(tasks.values(), timeout=self.tool_timeout) if tasks else (set(), set())
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"{len(pending)} of {len(tasks)} tool calls did not finish within {self.tool_timeout}s")
+        
         tool_result_parts = []
+        answered = set()
+        for key, call in zip(keys, calls):
+            name = call["name"]
+            if key in tasks:
+                task = tasks[key]
+                if task in done:
+                    response = task.result()
+                    if is_successful_result(response):
+                        memo[key] = response
+                else:
+                    response = {"success": False, "content": f"Error: the tool did not finish within {self.tool_timeout}s"}
+            else:
+                # Keep the least recently used results at the front, to be dropped first
+                response = memo[key] = memo.pop(key)
+            
+            if key in answered or (key not in tasks and response_in_history(state.messages, name, response)):
+                response = repeated_call_response(name, response)
+            answered.add(key)
+            tool_result_parts.append({"function_response": {"name": name, "response": response}})
         
-        for part in state.messages[-1]["parts"]:
-            if "function_call" in part:
-                name = part["function_call"]["name"]
-                func = self.tool_mapping[name]
-                try:
-                    result = func(**part["function_call"]["args"])
-                    tool_result_parts.append(
-                        {
-                            "function_response": {
-                                "name": name,
-                                "response": result.model_dump(mode="json"),
-                            }
-                        }
-                    )
-                except Exception as e:
-                    logger.error(f"Error using tool {name}: {e}", exc_info=True)
-                    tool_result_parts.append(
-                        {
-                            "function_response": {
-                                "name": name,
-                                "response": {"success": False, "content": f"Error: {str(e)}"},
-                            }
-                        }
-                    )
+        repeats = len(calls) - len(tasks)
+        if repeats:
+            logger.info(f"Answered {repeats} of {len(calls)} tool calls from earlier in the conversation")
+        while len(memo) > MAX_MEMOIZED_TOOL_RESULTS:
+            memo.pop(next(iter(memo)))
         
-        return {"messages": [{"role": "tool", "parts": tool_result_parts}]}
+        return {"messages": [{"role": "tool", "parts": tool_result_parts}], "tool_results": memo}
+
+    def call_llm(self, state: AgentState) -> dict:
+        """
+        Synchronous wrapper of acall_llm.
+        """
+        return run_sync(self.acall_llm(state))
+
+    def use_tool(self, state: AgentState) -> dict:
+        """
+        Synchronous wrapper of ause_tool.
+        """
+        return run_sync(self.ause_tool(state))
 
     @staticmethod
     def should_we_stop(state: AgentState) -> str:
@@ -446,40 +1449,63 @@ class ResearchAgent:
         """
         Build the agent graph.
         """
-        # Create main langgraph for the agent conversation
+        # Create main langgraph for the agent conversation. Every model call is preceded
+        # by compaction, so the prompt stays bounded however long a thread runs.
         conversation_graph = StateGraph(AgentState)
-        conversation_graph.add_node("call_llm", self.call_llm)
-        conversation_graph.add_node("use_tool", self.use_tool)
-        conversation_graph.add_edge(START, "call_llm")
+        conversation_graph.add_node("compact_history", self.acompact_history)
+        conversation_graph.add_node("call_llm", self.acall_llm)
+        conversation_graph.add_node("use_tool", self.ause_tool)
+        conversation_graph.add_edge(START, "compact_history")
+        conversation_graph.add_edge("compact_history", "call_llm")
         conversation_graph.add_conditional_edges("call_llm", self.should_we_stop)
-        conversation_graph.add_edge("use_tool", "call_llm")
+        conversation_graph.add_edge("use_tool", "compact_history")
         
-        # Create the orchestration graph
+        # Create the orchestration graph. The I/O-bound steps are async; the CPU-bound
+        # ones are sync and run in LangGraph's worker threads, off the event loop.
         workflow = StateGraph(AgentState)
-        workflow.add_node("generate_queries", self.generate_queries)
-        workflow.add_node("perform_searches", self.perform_searches)
-        workflow.add_node("extract_content", self.extract_content)
-        workflow.add_node("generate_report", self.generate_report)
+        workflow.add_node("generate_queries", self.agenerate_queries)
+        workflow.add_node("search_and_extract", self.asearch_and_extract)
+        workflow.add_node("collect_contents", self.collect_contents)
+        workflow.add_node("deduplicate_content", self.deduplicate_content)
+        workflow.add_node("retrieve_passages", self.retrieve_passages)
+        workflow.add_node("generate_report", self.agenerate_report)
         workflow.add_node("save_outputs", self.save_outputs)
         
         # Connect the nodes
         workflow.add_edge(START, "generate_queries")
-        workflow.add_edge("generate_queries", "perform_searches")
-        workflow.add_edge("perform_searches", "extract_content")
-        workflow.add_edge("extract_content", "generate_report")
+        # Each query is searched and its pages fetched in a branch of its own
+        workflow.add_conditional_edges("generate_queries", self.fan_out_queries, ["search_and_extract", "collect_contents"])
+        workflow.add_edge("search_and_extract", "collect_contents")
+        workflow.add_edge("collect_contents", "deduplicate_content")
+        workflow.add_edge("deduplicate_content", "retrieve_passages")
+        workflow.add_edge("retrieve_passages", "generate_report")
         workflow.add_edge("generate_report", "save_outputs")
         workflow.add_edge("save_outputs", END)
         
         # Compile the graph
         self.workflow_graph = workflow.compile()
-        self.conversation_graph = conversation_graph.compile()
+        self.conversation_graph = conversation_graph.compile(checkpointer=self.chat_checkpointer)
+    
+    @staticmethod
+    def _run_config(on_report_chunk: Optional[Callable[[str], None]] = None) -> RunnableConfig:
+        """
+        Build the configuration of one workflow run.
+        
+        Args:
+            on_report_chunk: Called with each piece of the report as it is generated.
+            
+        Returns:
+            The run configuration, with the run's set of claimed URLs.
+        """
+        return {"configurable": {"on_report_chunk": on_report_chunk, "claimed_urls": set()}}
     
-    def research(self, query: str) -> AgentState:
+    async def aresearch(self, query: str, on_report_chunk: Optional[Callable[[str], None]] = None) -> AgentState:
         """
         Perform a complete research workflow.
         
         Args:
             query: The user query to research.
+            on_report_chunk: Called with each piece of the report as it is generated.
             
         Returns:
             The final agent state with all results.
@@ -491,29 +1517,128 @@ class ResearchAgent:
         
         # Run the workflow
         try:
-            final_state = self.workflow_graph.invoke(initial_state)
+            final_state = await self.workflow_graph.ainvoke(initial_state, config=self._run_config(on_report_chunk))
             logger.info("Research workflow completed successfully")
+            await run_blocking(self.use_research_context, final_state)
             return final_state
         except Exception as e:
             logger.error(f"Error in research workflow: {e}", exc_info=True)
             raise
     
-    def chat(self, query: str) -> str:
+    def research(self, query: str, on_report_chunk: Optional[Callable[[str], None]] = None) -> AgentState:
+        """
+        Perform a complete research workflow from synchronous code (see aresearch).
+        """
+        return run_sync(self.aresearch(query, on_report_chunk))
+    
+    async def astream_research(self, query: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Perform a complete research workflow, yielding progress events as they happen.
+        
+        Every event is a dict with an "event" key:
+        - "stage_started" (stage) and "stage_finished" (stage, seconds, error) around
+          every workflow node;
+        - the nodes' own events: "queries_generated", "search_done", "fetch_started",
+          "page_fetched", "page_failed", "deduplicated", "passages_selected",
+          "sources_summarized", "report_chunk" and "outputs_saved";
+        - "research_complete" (state, seconds, stage_seconds) last, with the final state.
+        
+        Args:
+            query: The user query to research.
+            
+        Yields:
+            The progress events.
+        """
+        logger.info(f"Starting research for query: {query}")
+        started = time.perf_counter()
+        # A stage runs as several parallel tasks (one per query for search_and_extract);
+        # it starts with its first task and finishes with its last one
+        stage_started: Dict[str, float] = {}
+        running: Dict[str, int] = {}
+        errors: Dict[str, str] = {}
+        stage_seconds: Dict[str, float] = {}
+        final_state = None
+        
+        try:
+            async for mode, payload in self.workflow_graph.astream(
+                AgentState(user_query=query),
+                config=self._run_config(),
+                stream_mode=["tasks", "custom", "values"]
+            ):
+                if mode == "custom":
+                    yield payload
+                elif mode == "values":
+                    final_state = payload
+                elif "input" in payload:
+                    stage = payload["name"]
+                    running[stage] = running.get(stage, 0) + 1
+                    if stage not in stage_started:
+                        stage_started[stage] = time.perf_counter()
+                        yield {"event": "stage_started", "stage": stage}
+                else:
+                    stage = payload["name"]
+                    running[stage] -= 1
+                    if payload.get("error"):
+                        errors[stage] = str(payload["error"])
+                    if not running[stage]:
+                        seconds = round(time.perf_counter() - stage_started[stage], 2)
+                        stage_seconds[stage] = seconds
+                        yield {"event": "stage_finished", "stage": stage, "seconds": seconds, "error": errors.get(stage)}
+        except Exception as e:
+            logger.error(f"Error in research workflow: {e}", exc_info=True)
+            raise
+        
+        logger.info("Research workflow completed successfully; stage timings: " +
+                    ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in stage_seconds.items()))
+        if final_state is not None:
+            await run_blocking(self.use_research_context, final_state)
+        yield {
+            "event": "research_complete",
+            "state": final_state,
+            "seconds": round(time.perf_counter() - started, 2),
+            "stage_seconds": stage_seconds
+        }
+    
+    def stream_research(self, query: str) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the progress events of a research workflow from synchronous code
+        (see astream_research). The workflow runs on a private event loop.
         """
-        Have a conversation with the agent.
+        loop = asyncio.new_event_loop()
+        events = self.astream_research(query)
+        try:
+            while True:
+                try:
+                    event = loop.run_until_complete(events.__anext__())
+                except StopAsyncIteration:
+                    break
+                yield event
+        finally:
+            loop.run_until_complete(events.aclose())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+    
+    async def achat(self, query: str, thread_id: str = DEFAULT_CHAT_THREAD) -> str:
+        """
+        Have a conversation with the agent. Turns of the same thread continue one
+        conversation, stored by the chat checkpointer.
         
         Args:
             query: The user query.
+            thread_id: The conversation to continue.
             
         Returns:
             The agent's response.
         """
-        initial_state = AgentState(
-            messages=[{"role": "user", "parts": [{"text": query}]}],
-        )
+        new_messages = {"messages": [{"role": "user", "parts": [{"text": query}]}]}
         
         try:
-            output_state = self.conversation_graph.invoke(initial_state)
+            # Follow-up questions are answered from the last research run's material
+            await run_blocking(self._get_context_cache)
+            output_state = await self.conversation_graph.ainvoke(
+                new_messages,
+                config={"configurable": {"thread_id": thread_id}}
+            )
             
             # Extract the final response
             final_message = output_state["messages"][-1]
@@ -529,3 +1654,18 @@ class ResearchAgent:
         except Exception as e:
             logger.error(f"Error in agent conversation: {e}", exc_info=True)
             return f"Error: {str(e)}"
+    
+    def chat(self, query: str, thread_id: str = DEFAULT_CHAT_THREAD) -> str:
+        """
+        Have a conversation with the agent from synchronous code (see achat).
+        """
+        return run_sync(self.achat(query, thread_id))
+    
+    def reset_chat(self, thread_id: str = DEFAULT_CHAT_THREAD):
+        """
+        Forget a chat thread, so its next turn starts a new conversation.
+        
+        Args:
+            thread_id: The conversation to forget.
+        """
+        self.chat_checkpointer.delete_thread(thread_id)
@@ -11,6 +11,17 @@ import google.generativeai as genai
 from agent import ResearchAgent
 from logger import logger, set_log_level
 
+# Workflow stages shown in the research progress panel, in order
+RESEARCH_STAGES = {
+    "generate_queries": "Generating search queries",
+    "search_and_extract": "Searching the web and fetching pages",
+    "collect_contents": "Collecting page contents",
+    "deduplicate_content": "Removing duplicate content",
+    "retrieve_passages": "Selecting relevant passages",
+    "generate_report": "Writing the report",
+    "save_outputs": "Saving outputs",
+}
+
 # --- Initial Setup ---
 st.set_page_config(
     page_title="AI Research Assistant",
@@ -400,6 +411,7 @@ with query_tab:
                     status = st.empty()
                     progress_bar = st.progress(0)
                     details = st.empty()
+                    report_preview = st.empty()
                     st.markdown('</div>', unsafe_allow_html=True)
                     
                     def update_progress(message, progress_value):
@@ -407,20 +419,67 @@ with query_tab:
                         progress_bar.progress(progress_value)
                         logger.info(message)
                     
-                    # Start research process
-                    update_progress("Starting research process...", 0.05)
+                    # Per-stage status lines, updated live from the agent's progress events
+                    stage_lines = {}
+                    counts = {"queries": 0, "searches": 0, "pages": 0, "done": 0, "failed": 0}
+                    
+                    def show_stage(stage, line):
+                        stage_lines[stage] = line
+                        details.markdown("\n".join(f"- {stage_lines[s]}" for s in RESEARCH_STAGES if s in stage_lines))
                     
-                    # Step 1: Generate search queries
-                    update_progress("Generating search queries...", 0.1)
-                    time.sleep(0.5)  # Small delay for UI updates
+                    def describe_event(event):
+                        kind = event["event"]
+                        if kind == "queries_generated":
+                            counts["queries"] = len(event["queries"])
+                            return f"{counts['queries']} queries generated"
+                        # Every query is searched and fetched in parallel, so the counts add up all of them
+                        if kind in ("search_done", "fetch_started", "page_fetched", "page_failed"):
+                            counts["searches"] += kind == "search_done"
+                            counts["pages"] += event.get("pages", 0) if kind == "fetch_started" else 0
+                            counts["done"] += kind in ("page_fetched", "page_failed")
+                            counts["failed"] += kind == "page_failed"
+                            return (
+                                f"{counts['searches']}/{counts['queries']} searches done, "
+                                f"{counts['done']}/{counts['pages']} pages fetched, {counts['failed']} failed"
+                            )
+                        if kind == "deduplicated":
+                            return f"{event['pages_removed']} duplicate pages removed, ~{event['tokens_saved']} tokens saved"
+                        if kind == "passages_selected":
+                            return f"{event['passages']} passages selected from {event['pages']} pages"
+                        if kind == "sources_summarized":
+                            return f"sources for '{event['query']}' summarized"
+                        return None
                     
-                    # Step 2: Run the agent
-                    update_progress("Performing research. This may take a few minutes...", 0.2)
+                    streamed_report = []
+                    current_stage = None
+                    
+                    update_progress("Starting research process...", 0.05)
                     
-                    # Run the agent asynchronously
                     try:
                         st.session_state.research_status = "in_progress"
-                        results = st.session_state.agent.research(research_query)
+                        results = None
+                        for event in st.session_state.agent.stream_research(research_query):
+                            kind = event["event"]
+                            if kind == "stage_started":
+                                current_stage = event["stage"]
+                                label = RESEARCH_STAGES.get(current_stage, current_stage)
+                                position = list(RESEARCH_STAGES).index(current_stage) if current_stage in RESEARCH_STAGES else 0
+                                update_progress(f"{label}...", 0.05 + 0.9 * position / len(RESEARCH_STAGES))
+                                show_stage(current_stage, f"⏳ **{label}**")
+                            elif kind == "stage_finished":
+                                label = RESEARCH_STAGES.get(event["stage"], event["stage"])
+                                mark = "❌" if event["error"] else "✅"
+                                show_stage(event["stage"], f"{mark} **{label}** ({event['seconds']:.1f}s)")
+                            elif kind == "report_chunk":
+                                # Show the report as it is written
+                                streamed_report.append(event["text"])
+                                report_preview.markdown("".join(streamed_report))
+                            elif kind == "research_complete":
+                                results = event["state"]
+                            elif current_stage:
+                                description = describe_event(event)
+                                if description:
+                                    show_stage(current_stage, f"⏳ **{RESEARCH_STAGES.get(current_stage, current_stage)}**: {description}")
                         st.session_state.research_results = results
                         st.session_state.research_status = "complete"
                         update_progress("Research completed!", 1.0)
@@ -541,7 +600,7 @@ with query_tab:
                         for item in extracted_contents:
                             st.markdown(f'<div style="padding: 0.75rem; border-radius: 6px; margin-bottom: 1rem; background-color: #f8fafc; border-left: 3px solid #3b82f6;">', unsafe_allow_html=True)
                             st.markdown(f'<p style="margin: 0 0 0.5rem 0; font-weight: 500; color: #334155;">Source: <a href="{item["url"]}" target="_blank">{item["url"]}</a></p>', unsafe_allow_html=True)
-                            st.markdown(f'<p style="margin: 0 0 0.5rem 0; font-size: 0.95rem;">Query: {item["query"]}</p>', unsafe_allow_html=True)
+                            st.markdown(f'<p style="margin: 0 0 0.5rem 0; font-size: 0.95rem;">Query: {"; ".join(item.get("queries", [item["query"]]))}</p>', unsafe_allow_html=True)
                             with st.expander("View Content"):
                                 st.text(item['content'])
                             st.markdown('</div>', unsafe_allow_html=True)
@@ -579,6 +638,9 @@ with chat_tab:
         </div>
         """, unsafe_allow_html=True)
     else:
+        if st.session_state.agent.research_context:
+            st.info(f"Follow-up questions are answered from the research on: {st.session_state.agent.research_context.user_query}")
+
         # Display chat history with better styling
         st.markdown('<div class="card-container" style="padding: 0; overflow: hidden;">', unsafe_allow_html=True)
         
@@ -648,6 +710,7 @@ with chat_tab:
         
         if clear_chat:
             st.session_state.chat_history = []
+            st.session_state.agent.reset_chat()
             st.rerun()
 
 # --- History Tab ---
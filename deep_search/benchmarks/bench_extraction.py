@@ -0,0 +1,184 @@
+"""
+Offline benchmark for the HTML text extraction backends.
+
+Runs extract_html_content over the checked-in corpus (benchmarks/corpus/*.html) plus a
+few generated pathological pages (huge tables, deep nesting, tens of thousands of
+paragraphs, a giant inline script) and reports, per backend:
+
+- throughput in pages/sec and p50/p99 per-page latency,
+- peak resident memory of a fresh worker process running only that backend,
+- output similarity against the golden texts in benchmarks/corpus/expected/
+  (or, for generated pages, against the reference "soup" backend).
+
+No network access is needed. Run it from the deep_search directory:
+
+    python benchmarks/bench_extraction.py --iterations 5
+    python benchmarks/bench_extraction.py --update-expected   # after an intended change
+"""
+
+import argparse
+import difflib
+import glob
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from extractors import EXTRACTORS  # noqa: E402
+from tools import MAX_CONTENT_LENGTH, extract_html_content  # noqa: E402
+
+CORPUS_DIR = os.path.join(BENCH_DIR, "corpus")
+EXPECTED_DIR = os.path.join(CORPUS_DIR, "expected")
+REFERENCE = "soup"
+
+
+def generated_pages():
+    """
+    Build the pathological pages. They are generated deterministically instead of
+    being checked in, to keep multi-megabyte fixtures out of the repository.
+    """
+    sentence = "The quick brown fox jumps over the lazy dog near the riverbank. "
+    rows = "".join(
+        f"<tr><td>Row {i} of the huge table with enough text to count</td><td>{sentence}</td></tr>"
+        for i in range(20000)
+    )
+    nested = "<div>" * 200 + f"<p>{sentence * 3}</p>" + "</div>" * 200
+    paragraphs = "".join(f"<p>{i}: {sentence}</p>" for i in range(50000))
+    script = "<script>var data = '" + "x" * 5_000_000 + "';</script>"
+    return {
+        "generated_huge_table.html": f"<html><body><article><table>{rows}</table></article></body></html>",
+        "generated_deep_nesting.html": f"<html><body><main>{nested * 50}</main></body></html>",
+        "generated_many_paragraphs.html": f"<html><body>{paragraphs}</body></html>",
+        "generated_giant_script.html": f"<html><head>{script}</head><body><p>{sentence}</p></body></html>",
+    }
+
+
+def load_corpus():
+    """
+    Load the checked-in and generated pages as (name, html bytes) pairs.
+    """
+    pages = []
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.html"))):
+        with open(path, "rb") as f:
+            pages.append((os.path.basename(path), f.read()))
+    for name, html in generated_pages().items():
+        pages.append((name, html.encode("utf-8")))
+    return pages
+
+
+def expected_path(name: str) -> str:
+    return os.path.join(EXPECTED_DIR, os.path.splitext(name)[0] + ".txt")
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def run_backend(name, pages, iterations, max_length, queue):
+    """
+    Benchmark one backend. Runs in its own process so peak RSS is per backend.
+    """
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    latencies = []
+    outputs = {}
+    for _ in range(iterations):
+        for page_name, html in pages:
+            start = time.perf_counter()
+            result = extract_html_content(html, page_name, max_length, extractor=name)
+            latencies.append(time.perf_counter() - start)
+            outputs[page_name] = result.content
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({
+        "latencies": latencies,
+        "outputs": outputs,
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        "peak_rss_mb": (peak_rss if sys.platform != "darwin" else peak_rss / 1024) / 1024,
+        "rss_growth_mb": ((peak_rss - baseline_rss) if sys.platform != "darwin" else (peak_rss - baseline_rss) / 1024) / 1024,
+    })
+
+
+def benchmark(name, pages, iterations, max_length):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=run_backend, args=(name, pages, iterations, max_length, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the HTML extraction backends offline.")
+    parser.add_argument("--backend", choices=list(EXTRACTORS), action="append",
+                        help="Backend to benchmark (repeatable; default: all)")
+    parser.add_argument("--iterations", type=int, default=3, help="Passes over the corpus per backend")
+    parser.add_argument("--max-length", type=int, default=MAX_CONTENT_LENGTH, help="max_length passed to the extractor")
+    parser.add_argument("--update-expected", action="store_true",
+                        help="Rewrite the golden texts from the reference backend and exit")
+    args = parser.parse_args()
+
+    pages = load_corpus()
+    checked_in = [(name, html) for name, html in pages if not name.startswith("generated_")]
+
+    if args.update_expected:
+        os.makedirs(EXPECTED_DIR, exist_ok=True)
+        for name, html in checked_in:
+            result = extract_html_content(html, name, MAX_CONTENT_LENGTH, extractor=REFERENCE)
+            with open(expected_path(name), "w", encoding="utf-8") as f:
+                f.write(result.content)
+        print(f"Wrote {len(checked_in)} golden texts to {EXPECTED_DIR}")
+        return
+
+    backends = args.backend or list(EXTRACTORS)
+    if REFERENCE not in backends:
+        backends.append(REFERENCE)
+
+    total_bytes = sum(len(html) for _, html in pages)
+    print(f"Corpus: {len(pages)} pages ({len(checked_in)} checked in), {total_bytes / 1024 / 1024:.1f} MiB, "
+          f"{args.iterations} iterations, max_length={args.max_length}\n")
+
+    results = {name: benchmark(name, pages, args.iterations, args.max_length) for name in backends}
+    reference_outputs = results[REFERENCE]["outputs"]
+
+    print(f"{'backend':8s} {'pages/s':>9s} {'p50 ms':>8s} {'p99 ms':>8s} {'peak MB':>8s} "
+          f"{'sim mean':>9s} {'sim min':>8s}")
+    for name in backends:
+        result = results[name]
+        latencies = result["latencies"]
+        scores = {}
+        for page_name, output in result["outputs"].items():
+            golden = expected_path(page_name)
+            if args.max_length == MAX_CONTENT_LENGTH and os.path.exists(golden):
+                with open(golden, encoding="utf-8") as f:
+                    expected = f.read()
+            else:
+                expected = reference_outputs[page_name]
+            scores[page_name] = similarity(output, expected)
+        result["scores"] = scores
+        print(f"{name:8s} {len(latencies) / sum(latencies):9.1f} "
+              f"{percentile(latencies, 50) * 1000:8.2f} {percentile(latencies, 99) * 1000:8.2f} "
+              f"{result['peak_rss_mb']:8.1f} {statistics.mean(scores.values()):9.4f} {min(scores.values()):8.4f}")
+
+    print("\nPages below similarity 1.0:")
+    below = [(name, page, score) for name in backends for page, score in results[name]["scores"].items() if score < 1.0]
+    for name, page, score in below:
+        print(f"  {name:8s} {page:36s} {score:.4f}")
+    if not below:
+        print("  none")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark for the concurrent fetch engine.
+
+Starts a local fixture HTTP server that answers every request with a small HTML page
+after an artificial delay, then compares the old serial extraction loop against the
+FetchEngine. Run it from the deep_search directory:
+
+    python benchmarks/bench_fetch.py --pages 40 --delay 0.3
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fetcher import FetchEngine, ParsePool, fetch_url  # noqa: E402
+from tools import configure_page_cache  # noqa: E402
+
+FIXTURE_PAGE = """<html><head><title>Fixture {path}</title></head>
+<body><nav>Navigation that should be removed</nav>
+<article>
+<h1>Fixture page {path}</h1>
+<p>This paragraph is long enough to be kept by the content extractor in tools.py.</p>
+<p>A second paragraph with more words so the extracted text is not trivially short.</p>
+</article></body></html>"""
+
+# Loopback aliases so the benchmark exercises more than one host
+HOSTS = ["127.0.0.1", "127.0.0.2", "127.0.0.3", "127.0.0.4"]
+
+
+def make_handler(delay: float):
+    """
+    Build a request handler class that sleeps for `delay` seconds per request.
+    """
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = FIXTURE_PAGE.format(path=self.path).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+def run_serial(urls):
+    """
+    Fetch the URLs one at a time, like the original extract_content loop (without its sleeps).
+    """
+    return [fetch_url(url) for url in urls]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serial vs concurrent page fetching.")
+    parser.add_argument("--pages", type=int, default=40, help="Number of pages to fetch")
+    parser.add_argument("--delay", type=float, default=0.3, help="Server-side delay per request in seconds")
+    parser.add_argument("--concurrency", type=int, default=8, help="Global concurrency limit")
+    parser.add_argument("--per-host", type=int, default=2, help="Per-host concurrency limit")
+    parser.add_argument("--parse-workers", type=int, default=2,
+                        help="Parse worker processes (0 parses in the download threads)")
+    args = parser.parse_args()
+
+    # Both runs must hit the network, so the page cache is switched off
+    configure_page_cache(enabled=False)
+
+    server = ThreadingHTTPServer(("", 0), make_handler(args.delay))
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    urls = [
+        f"http://{HOSTS[i % len(HOSTS)]}:{port}/page/{i}"
+        for i in range(args.pages)
+    ]
+
+    try:
+        start = time.perf_counter()
+        serial_results = run_serial(urls)
+        serial_time = time.perf_counter() - start
+
+        parse_pool = ParsePool(args.parse_workers) if args.parse_workers > 0 else None
+        if parse_pool:
+            # The pool is long-lived in the app, so don't time process start-up
+            parse_pool.warm_up(wait=True)
+        engine = FetchEngine(max_concurrency=args.concurrency, per_host_limit=args.per_host, parse_pool=parse_pool)
+        start = time.perf_counter()
+        engine_results = engine.fetch_all(urls)
+        engine_time = time.perf_counter() - start
+        engine.close()
+        if parse_pool:
+            parse_pool.shutdown()
+    finally:
+        server.shutdown()
+
+    same_output = [r.content for r in serial_results] == [r.content for r in engine_results]
+    ok = sum(1 for r in engine_results if r.success)
+
+    print(f"Pages fetched:        {args.pages} ({ok} successful)")
+    print(f"Serial loop:          {serial_time:.2f}s")
+    print(f"  incl. old 3s sleeps: {serial_time + 3 * args.pages:.2f}s")
+    print(f"FetchEngine:          {engine_time:.2f}s "
+          f"(concurrency={args.concurrency}, per_host={args.per_host}, parse_workers={args.parse_workers})")
+    print(f"Speedup:              {serial_time / engine_time:.1f}x")
+    print(f"Identical output:     {same_output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Check that every extraction backend matches the reference backend on the fixture corpus.
+
+Runs extract_html_content with each backend over benchmarks/corpus/*.html at several
+max_length values and reports any page where the output differs from the "soup"
+reference. Exits with status 1 if a backend is not equivalent. Run it from the
+deep_search directory:
+
+    python benchmarks/compare_extractors.py
+"""
+
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractors import EXTRACTORS  # noqa: E402
+from tools import extract_html_content  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+MAX_LENGTHS = [100, 1000, 4000, 100000]
+REFERENCE = "soup"
+
+
+def main():
+    paths = sorted(glob.glob(os.path.join(CORPUS_DIR, "*.html")))
+    pages = []
+    for path in paths:
+        with open(path, "rb") as f:
+            pages.append((os.path.basename(path), f.read()))
+
+    mismatches = 0
+    timings = {name: 0.0 for name in EXTRACTORS}
+    for filename, html in pages:
+        for max_length in MAX_LENGTHS:
+            outputs = {}
+            for name in EXTRACTORS:
+                start = time.perf_counter()
+                result = extract_html_content(html, filename, max_length, extractor=name)
+                timings[name] += time.perf_counter() - start
+                outputs[name] = (result.success, result.content)
+
+            for name, output in outputs.items():
+                if output != outputs[REFERENCE]:
+                    mismatches += 1
+                    print(f"MISMATCH {name} vs {REFERENCE}: {filename} (max_length={max_length})")
+                    print(f"  {REFERENCE}: {outputs[REFERENCE][1][:200]!r}")
+                    print(f"  {name}: {output[1][:200]!r}")
+
+    print(f"Compared {len(EXTRACTORS)} backends on {len(pages)} pages x {len(MAX_LENGTHS)} lengths")
+    for name, total in timings.items():
+        print(f"  {name:6s} {total * 1000:8.1f} ms total")
+    print("All backends equivalent" if not mismatches else f"{mismatches} mismatches")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,532 @@
+"""
+This module implements the caches used by the tools.
+
+The persistent page cache stores raw response bodies content-addressed (by SHA-256)
+on disk, with a SQLite index that maps each canonical URL to its body, the extracted
+text and the validators needed for conditional revalidation. The in-memory TTL cache
+holds search results keyed by normalized query. The LLM cache stores model responses
+in SQLite, keyed by a hash of the model, system instruction, generation settings and
+prompt.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from pydantic import BaseModel, Field
+
+from urls import canonicalize_url
+
+# Defaults for the page cache
+DEFAULT_CACHE_DIR = os.path.join(".cache", "pages")
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# Defaults for the search result cache
+DEFAULT_SEARCH_TTL = 6 * 60 * 60
+DEFAULT_SEARCH_MAX_ENTRIES = 1000
+
+# Defaults for the LLM response cache
+DEFAULT_LLM_CACHE_DIR = os.path.join(".cache", "llm")
+DEFAULT_LLM_TTL = 7 * 24 * 60 * 60
+DEFAULT_LLM_MAX_BYTES = 50 * 1024 * 1024
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a search query so that trivially different spellings share a cache entry.
+
+    Args:
+        query: The search query
+
+    Returns:
+        The query lowercased, with surrounding quotes removed and whitespace collapsed
+    """
+    return " ".join(query.lower().strip().strip("\"'").split())
+
+
+class CachedPage(BaseModel):
+    """
+    A page stored in the cache.
+    """
+    url: str = Field(description="Canonical URL of the page")
+    content: str = Field(description="Extracted text of the page")
+    max_length: int = Field(description="The max_length the text was extracted with")
+    content_hash: str = Field(description="SHA-256 of the raw response body")
+    etag: Optional[str] = Field(default=None, description="ETag validator from the response")
+    last_modified: Optional[str] = Field(default=None, description="Last-Modified validator from the response")
+    fetched_at: float = Field(description="Time the entry was last fetched or revalidated")
+
+    def is_fresh(self, ttl: float) -> bool:
+        """
+        Whether the entry is younger than `ttl` seconds.
+        """
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """
+        Headers for a conditional GET that revalidates this entry.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """
+    On-disk page cache with a TTL and size-bounded LRU eviction.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        """
+        Initialize the cache, creating its directory and index if needed.
+
+        Args:
+            cache_dir: Directory holding the index and the raw bodies.
+            ttl: Seconds after which an entry must be revalidated.
+            max_bytes: Total size of raw bodies above which the least recently used entries are evicted.
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                max_length INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+        self._db.commit()
+
+    def _blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.blob_dir, content_hash[:2], content_hash)
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """
+        Look up a page, marking it as recently used.
+
+        Args:
+            url: The URL of the page (canonicalized internally)
+
+        Returns:
+            The cached page, or None if it is not cached
+        """
+        key = canonicalize_url(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, content, max_length, content_hash, etag, last_modified, fetched_at "
+                "FROM pages WHERE url = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), key))
+            self._db.commit()
+
+        return CachedPage(
+            url=row[0],
+            content=row[1],
+            max_length=row[2],
+            content_hash=row[3],
+            etag=row[4],
+            last_modified=row[5],
+            fetched_at=row[6]
+        )
+
+    def read_raw(self, page: CachedPage) -> Optional[bytes]:
+        """
+        Read the raw response body of a cached page.
+
+        Returns:
+            The body, or None if the blob is missing
+        """
+        try:
+            with open(self._blob_path(page.content_hash), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(
+        self,
+        url: str,
+        raw: bytes,
+        content: str,
+        max_length: int,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ):
+        """
+        Store a page and evict old entries if the cache is over its size limit.
+
+        Args:
+            url: The URL of the page (canonicalized internally)
+            raw: The raw response body
+            content: The text extracted from the body
+            max_length: The max_length the text was extracted with
+            etag: ETag response header, if any
+            last_modified: Last-Modified response header, if any
+        """
+        key = canonicalize_url(url)
+        content_hash = hashlib.sha256(raw).hexdigest()
+        blob_path = self._blob_path(content_hash)
+
+        try:
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                tmp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(raw)
+                os.replace(tmp_path, blob_path)
+
+            now = time.time()
+            with self._lock:
+                old = self._db.execute("SELECT content_hash FROM pages WHERE url = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO pages "
+                    "(url, content, max_length, content_hash, size, etag, last_modified, fetched_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, content, max_length, content_hash, len(raw), etag, last_modified, now, now)
+                )
+                self._db.commit()
+                if old and old[0] != content_hash:
+                    self._delete_blob_if_unused(old[0])
+                self._evict()
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"Could not write {url} to the page cache: {e}")
+
+    def touch(self, url: str):
+        """
+        Mark a page as freshly revalidated (e.g. after a 304 Not Modified).
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?",
+                (now, now, canonicalize_url(url))
+            )
+            self._db.commit()
+
+    def _delete_blob_if_unused(self, content_hash: str):
+        """
+        Delete a raw body once no entry refers to it. Must be called with the lock held.
+        """
+        in_use = self._db.execute("SELECT 1 FROM pages WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone()
+        if not in_use:
+            try:
+                os.remove(self._blob_path(content_hash))
+            except OSError:
+                pass
+
+    def _evict(self):
+        """
+        Evict least recently used entries until the total body size fits. Must be called with the lock held.
+        """
+        # Bodies shared by several URLs are only stored once, so size the distinct blobs
+        total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT content_hash, MAX(size) AS size FROM pages GROUP BY content_hash)"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._db.execute("SELECT url, content_hash, size FROM pages ORDER BY accessed_at").fetchall()
+        evicted = 0
+        for url, content_hash, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            in_use = self._db.execute("SELECT 1 FROM pages WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone()
+            if not in_use:
+                total -= size
+                try:
+                    os.remove(self._blob_path(content_hash))
+                except OSError:
+                    pass
+            evicted += 1
+        self._db.commit()
+        logging.debug(f"Evicted {evicted} entries from the page cache")
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory LRU cache whose entries expire after a TTL.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_SEARCH_TTL, max_entries: int = DEFAULT_SEARCH_MAX_ENTRIES):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl: Seconds an entry stays valid.
+            max_entries: Number of entries above which the least recently used one is evicted.
+        """
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up a value, counting the hit or miss.
+
+        Returns:
+            The cached value, or None if it is missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def __contains__(self, key: Hashable) -> bool:
+        """
+        Whether an unexpired entry exists, without touching the counters or LRU order.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Store a value, evicting the least recently used entry if the cache is full.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all entries and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get the cache counters.
+
+        Returns:
+            A dictionary with entries, hits, misses, evictions and hit_rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class CachedResponse(BaseModel):
+    """
+    A model response stored in the LLM cache.
+    """
+    text: str = Field(description="Text of the response")
+    prompt_tokens: Optional[int] = Field(default=None, description="Prompt tokens reported by the model")
+    output_tokens: Optional[int] = Field(default=None, description="Output tokens reported by the model")
+    seconds: float = Field(default=0.0, description="Time the model took to produce the response")
+    cached: bool = Field(default=False, description="Whether the response came from the cache")
+
+
+def llm_cache_key(model_name: str, system_instruction: str, prompt: Any,
+                  generation_config: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build the cache key of a model call.
+
+    Args:
+        model_name: Name of the model
+        system_instruction: The model's system instruction
+        prompt: The prompt (a string or JSON-serializable contents)
+        generation_config: Generation settings that change the output, e.g. max_output_tokens
+
+    Returns:
+        The SHA-256 hex digest of all of them
+    """
+    payload = json.dumps([model_name, system_instruction, generation_config or {}, prompt],
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite cache of model responses with a TTL, size-bounded LRU eviction and hit
+    counters per call site.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_LLM_CACHE_DIR,
+        ttl: float = DEFAULT_LLM_TTL,
+        max_bytes: int = DEFAULT_LLM_MAX_BYTES
+    ):
+        """
+        Initialize the cache, creating its directory and database if needed.
+
+        Args:
+            cache_dir: Directory holding the database.
+            ttl: Seconds a response stays valid.
+            max_bytes: Total size of stored responses above which the least recently used are evicted.
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "responses.sqlite3"), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                site TEXT NOT NULL,
+                text TEXT NOT NULL,
+                prompt_tokens INTEGER,
+                output_tokens INTEGER,
+                seconds REAL NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._db.commit()
+        self._sites: Dict[str, Dict[str, float]] = {}
+
+    def _site_stats(self, site: str) -> Dict[str, float]:
+        return self._sites.setdefault(site, {"hits": 0, "misses": 0, "saved_seconds": 0.0})
+
+    def get(self, key: str, site: str = "") -> Optional[CachedResponse]:
+        """
+        Look up a response, counting the hit or miss for the call site.
+
+        Args:
+            key: Key from llm_cache_key
+            site: Name of the call site, for the metrics
+
+        Returns:
+            The cached response, or None if it is missing or expired
+        """
+        with self._lock:
+            stats = self._site_stats(site)
+            try:
+                row = self._db.execute(
+                    "SELECT text, prompt_tokens, output_tokens, seconds, created_at FROM responses WHERE key = ?",
+                    (key,)
+                ).fetchone()
+                if row is not None and time.time() - row[4] >= self.ttl:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                    row = None
+                if row is None:
+                    stats["misses"] += 1
+                    return None
+                self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"Could not read the LLM cache: {e}")
+                stats["misses"] += 1
+                return None
+            stats["hits"] += 1
+            stats["saved_seconds"] += row[3]
+
+        return CachedResponse(text=row[0], prompt_tokens=row[1], output_tokens=row[2], seconds=row[3], cached=True)
+
+    def put(self, key: str, response: CachedResponse, site: str = ""):
+        """
+        Store a response and evict old entries if the cache is over its size limit.
+
+        Args:
+            key: Key from llm_cache_key
+            response: The model response
+            site: Name of the call site
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses "
+                    "(key, site, text, prompt_tokens, output_tokens, seconds, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, site, response.text, response.prompt_tokens, response.output_tokens,
+                     response.seconds, len(response.text.encode("utf-8")), now, now)
+                )
+                self._db.commit()
+                self._evict()
+            except sqlite3.Error as e:
+                logging.warning(f"Could not write to the LLM cache: {e}")
+
+    def _evict(self):
+        """
+        Drop expired entries, then the least recently used ones until the total size
+        fits. Must be called with the lock held.
+        """
+        self._db.execute("DELETE FROM responses WHERE created_at <= ?", (time.time() - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            rows = self._db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+            evicted = 0
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+            logging.debug(f"Evicted {evicted} entries from the LLM cache")
+        self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the cache size and the counters of every call site.
+
+        Returns:
+            A dictionary with entries, bytes and, per site, hits, misses, hit_rate
+            and saved_seconds (model time the hits avoided)
+        """
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            sites = {}
+            for site, stats in self._sites.items():
+                lookups = stats["hits"] + stats["misses"]
+                sites[site] = {
+                    **stats,
+                    "saved_seconds": round(stats["saved_seconds"], 2),
+                    "hit_rate": stats["hits"] / lookups if lookups else 0.0
+                }
+            return {"entries": entries, "bytes": size, "sites": sites}
@@ -0,0 +1,242 @@
+"""
+This module keeps the prompt of a long chat bounded.
+
+The conversation is a list of Gemini content dicts. Before every model call:
+- the tool payloads of earlier turns are truncated, since the model has already
+  answered from them;
+- once the conversation is over its token budget, its oldest turns are folded into
+  a rolling summary, keeping the most recent turns (always the current one) verbatim.
+
+Tool results are also memoized per conversation by their normalized arguments, so a
+repeated call is answered without running the tool, and with a short reference when
+its result is still in the conversation.
+"""
+
+import json
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from urls import canonicalize_url
+
+# Tokens of conversation history sent with each chat turn before it is summarized
+DEFAULT_CHAT_HISTORY_TOKENS = int(os.getenv("RESEARCH_CHAT_HISTORY_TOKENS", 8000))
+# Output limit of a rolling summary
+SUMMARY_TOKENS = 1024
+# Longest string kept in a tool payload of an earlier turn
+TOOL_PAYLOAD_CHARS = 500
+# Longest tool payload shown in the transcript that is summarized
+TRANSCRIPT_PAYLOAD_CHARS = 300
+# Tool results memoized per conversation, the least recently used dropped first
+MAX_MEMOIZED_TOOL_RESULTS = 32
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def is_user_turn(message: dict) -> bool:
+    """
+    Whether a message starts a turn, i.e. is a user message with text (as opposed
+    to the tool responses, which are sent as their own messages).
+    """
+    return message.get("role") == "user" and any("text" in part for part in message.get("parts", []))
+
+
+def turn_starts(messages: List[dict]) -> List[int]:
+    """
+    Indices of the messages that start a turn.
+    """
+    return [i for i, message in enumerate(messages) if is_user_turn(message)]
+
+
+def _truncate_value(value: Any, max_chars: int) -> Any:
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + " ... [truncated]"
+    if isinstance(value, dict):
+        return {key: _truncate_value(item, max_chars) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_truncate_value(item, max_chars) for item in value]
+    return value
+
+
+def truncate_tool_payloads(messages: List[dict], end: int, max_chars: int = TOOL_PAYLOAD_CHARS) -> List[dict]:
+    """
+    Truncate the long strings in the tool responses of the messages before an index.
+
+    Args:
+        messages: The conversation.
+        end: Index of the first message left as is (the start of the current turn).
+        max_chars: Longest string kept.
+
+    Returns:
+        The conversation, sharing the unchanged messages.
+    """
+    compacted = []
+    for i, message in enumerate(messages):
+        if i < end and any("function_response" in part for part in message.get("parts", [])):
+            message = {**message, "parts": [_truncate_value(part, max_chars) for part in message["parts"]]}
+        compacted.append(message)
+    return compacted
+
+
+def format_transcript(messages: List[dict]) -> str:
+    """
+    Render messages as a plain-text transcript for summarization.
+    """
+    lines = []
+    for message in messages:
+        role = message.get("role", "user")
+        for part in message.get("parts", []):
+            if "text" in part:
+                lines.append(f"{role}: {part['text']}")
+            elif "function_call" in part:
+                call = part["function_call"]
+                lines.append(f"{role} called {call['name']}({json.dumps(call.get('args', {}), ensure_ascii=False)})")
+            elif "function_response" in part:
+                response = part["function_response"]
+                payload = json.dumps(response.get("response", {}), ensure_ascii=False)[:TRANSCRIPT_PAYLOAD_CHARS]
+                lines.append(f"{response['name']} returned: {payload}")
+    return "\n".join(lines)
+
+
+def summary_messages(summary: str) -> List[dict]:
+    """
+    The turns that put a rolling summary in front of the conversation.
+    """
+    if not summary:
+        return []
+    return [
+        {"role": "user", "parts": [{"text": f"Summary of our conversation so far:\n{summary}"}]},
+        {"role": "model", "parts": [{"text": "Understood. I will continue from this summary."}]}
+    ]
+
+
+def summary_prompt(summary: str, messages: List[dict]) -> str:
+    """
+    Build the prompt that folds old messages into the rolling summary.
+
+    Args:
+        summary: The current summary, if any.
+        messages: The messages to fold into it.
+
+    Returns:
+        The prompt.
+    """
+    return f"""
+    Update the summary of a conversation between a user and a research assistant with
+    the new part of the conversation below. Keep the user's questions and goals, the
+    facts and figures found, the sources (URLs) they came from and any open questions.
+    Write at most {SUMMARY_TOKENS * 3 // 4} words.
+
+    --- CURRENT SUMMARY ---
+    {summary or "(none)"}
+
+    --- NEW PART OF THE CONVERSATION ---
+    {format_transcript(messages)}
+    """
+
+
+def split_history(messages: List[dict], budget: int, estimate: Callable[[List[dict]], int]) -> int:
+    """
+    Choose where the conversation is cut: everything before the cut is summarized.
+    The most recent turns that fit in half the budget are kept, and always the
+    current one, so the conversation is not summarized again on the next turn.
+
+    Args:
+        messages: The conversation.
+        budget: Tokens of history sent with a turn.
+        estimate: Estimates the tokens of a list of messages.
+
+    Returns:
+        The index of the first kept message (0 keeps everything).
+    """
+    starts = turn_starts(messages)
+    if not starts:
+        return 0
+    cut = starts[-1]
+    for start in reversed(starts[:-1]):
+        if estimate(messages[start:]) > budget // 2:
+            break
+        cut = start
+    return cut
+
+
+def estimate_messages(messages: List[dict], count: Callable[[str], int], summary: Optional[str] = None) -> int:
+    """
+    Estimate the prompt tokens of a conversation and its summary.
+
+    Args:
+        messages: The conversation.
+        count: Estimates the tokens of a text.
+        summary: The rolling summary, if any.
+
+    Returns:
+        The estimated tokens.
+    """
+    return count(json.dumps(summary_messages(summary or "") + messages, ensure_ascii=False))
+
+
+def _normalize_argument(name: str, value: Any) -> Any:
+    if isinstance(value, float) and value.is_integer():
+        # Gemini sends integer arguments as floats
+        return int(value)
+    if not isinstance(value, str):
+        return value
+    if name == "url":
+        return canonicalize_url(value)
+    if name == "title":
+        # Wikipedia treats underscores and spaces in titles alike
+        value = value.replace("_", " ")
+    value = _WHITESPACE.sub(" ", value).strip()
+    return value.casefold() if name == "query" else value
+
+
+def tool_call_key(name: str, args: Dict[str, Any]) -> str:
+    """
+    Key of a tool call that is the same for calls that differ only in the spelling
+    of their arguments (URL form, whitespace, the case of search queries).
+
+    Args:
+        name: The tool name.
+        args: The call's arguments.
+
+    Returns:
+        The key.
+    """
+    normalized = {key: _normalize_argument(key, value) for key, value in (args or {}).items()}
+    return f"{name}:{json.dumps(normalized, sort_keys=True, ensure_ascii=False)}"
+
+
+def response_in_history(messages: List[dict], name: str, response: Dict[str, Any]) -> bool:
+    """
+    Whether a tool response is still in the conversation in full (not truncated or
+    folded into the summary).
+    """
+    return any(
+        part["function_response"]["name"] == name and part["function_response"]["response"] == response
+        for message in messages
+        for part in message.get("parts", [])
+        if "function_response" in part
+    )
+
+
+def is_successful_result(response: Dict[str, Any]) -> bool:
+    """
+    Whether a tool response is a real result worth memoizing: a page or article that
+    was fetched, or a search that found links. Failed and empty searches both come
+    back as {"links": []}, so they never count.
+    """
+    if "success" in response:
+        return response["success"] is True
+    return bool(response.get("links"))
+
+
+def repeated_call_response(name: str, response: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The short response to a repeated tool call whose response is already in the
+    conversation, with the outcome of that response.
+    """
+    return {
+        "success": is_successful_result(response),
+        "repeated_call": True,
+        "content": f"Same result as the earlier {name} call with these arguments, shown above."
+    }
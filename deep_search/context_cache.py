@@ -0,0 +1,207 @@
+"""
+This module keeps the material of a finished research run (its report and sources)
+where follow-up chat turns can reference it without sending or fetching it again.
+
+GeminiContextCache uploads the material once through Gemini's explicit context
+caching, and every chat turn then names the cache instead of carrying the material.
+LocalContextCache has the same interface but keeps the material in memory and puts
+it in front of each turn; it stands in for the API in tests and is used for material
+below the API's minimum cache size.
+"""
+
+import datetime
+import os
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+import google.generativeai as genai
+from google.generativeai import caching
+from pydantic import BaseModel, Field
+
+from logger import logger
+
+# Where the material of the last run is kept: "gemini", "local" or "off"
+DEFAULT_CONTEXT_CACHE = os.getenv("RESEARCH_CONTEXT_CACHE", "gemini")
+# Lifetime of an uploaded cache, extended while the chat keeps using it
+DEFAULT_CONTEXT_CACHE_TTL = int(os.getenv("RESEARCH_CONTEXT_CACHE_TTL", 3600))
+# The API refuses to cache less than this; smaller material is cheap to resend
+MIN_CACHED_TOKENS = int(os.getenv("RESEARCH_CONTEXT_CACHE_MIN_TOKENS", 4096))
+# Share of the TTL left at which a cache in use is extended
+REFRESH_BELOW = 0.5
+
+
+class ResearchContext(BaseModel):
+    """
+    The material of a research run that follow-up questions are answered from.
+    """
+    user_query: str = Field(description="The query that was researched")
+    report: str = Field(description="The generated report")
+    sources: str = Field(default="", description="The formatted source material of the report")
+    tokens: int = Field(default=0, description="Estimated tokens of the material")
+
+    def to_contents(self) -> List[dict]:
+        """
+        The material as the conversation turns put in front of the chat.
+        """
+        text = (
+            f"The following research was done on the query: {self.user_query}\n"
+            "Answer follow-up questions from this report and its sources first, citing the sources. "
+            "Only use the search tools for what they do not cover.\n\n"
+            f"--- START REPORT ---\n{self.report}\n--- END REPORT ---\n\n"
+            f"--- START SOURCES ---\n{self.sources}\n--- END SOURCES ---"
+        )
+        return [
+            {"role": "user", "parts": [{"text": text}]},
+            {"role": "model", "parts": [{"text": "Understood. I will answer from this research."}]}
+        ]
+
+
+class LocalContextCache:
+    """
+    Keeps the research material in memory and prepends it to every chat turn.
+    """
+
+    backend = "local"
+
+    def __init__(self, model: genai.GenerativeModel, context: ResearchContext):
+        """
+        Initialize the cache.
+
+        Args:
+            model: The chat model, with its tools and system instruction.
+            context: The research material.
+        """
+        self.model = model
+        self.context = context
+        self.contents = context.to_contents()
+        self.turns = 0
+
+    def prepare(self, messages: List[dict]) -> Tuple[genai.GenerativeModel, List[dict]]:
+        """
+        Get the model and the contents of a chat turn.
+
+        Args:
+            messages: The conversation so far.
+
+        Returns:
+            (model, contents) to call generate_content with.
+        """
+        self.turns += 1
+        return self.model, self.contents + list(messages)
+
+    def refresh(self):
+        """
+        Nothing to do: local material does not expire.
+        """
+
+    def release(self):
+        """
+        Drop the material.
+        """
+        self.contents = []
+
+
+class GeminiContextCache:
+    """
+    Uploads the research material once through Gemini's context caching; chat turns
+    then reference the cache by name.
+    """
+
+    backend = "gemini"
+
+    def __init__(self, model_name: str, context: ResearchContext, system_instruction: Optional[str] = None,
+                 tools: Optional[List[Callable]] = None, ttl: int = DEFAULT_CONTEXT_CACHE_TTL):
+        """
+        Create the cache. The system instruction and tools are cached with the material,
+        as a model built on a cache cannot set its own.
+
+        Args:
+            model_name: The chat model the cache is created for.
+            context: The research material.
+            system_instruction: The chat's system instruction.
+            tools: The chat's tools.
+            ttl: Lifetime of the cache in seconds.
+
+        Raises:
+            Exception: If the API refuses the cache (e.g. the material is too small).
+        """
+        self.context = context
+        self.ttl = ttl
+        self.turns = 0
+        self.cached_content = caching.CachedContent.create(
+            model=model_name,
+            display_name=f"research: {context.user_query}"[:128],
+            system_instruction=system_instruction,
+            contents=context.to_contents(),
+            tools=tools,
+            ttl=datetime.timedelta(seconds=ttl)
+        )
+        self.expires_at = time.time() + ttl
+        self.model = genai.GenerativeModel.from_cached_content(self.cached_content)
+        logger.info(f"Uploaded research context to {self.cached_content.name} (~{context.tokens} tokens)")
+
+    def prepare(self, messages: List[dict]) -> Tuple[genai.GenerativeModel, List[dict]]:
+        """
+        Get the model and the contents of a chat turn. The material is not part of the
+        contents; the model references it in the cache.
+
+        Args:
+            messages: The conversation so far.
+
+        Returns:
+            (model, contents) to call generate_content with.
+        """
+        self.turns += 1
+        return self.model, list(messages)
+
+    def refresh(self):
+        """
+        Extend the cache's lifetime when it is close to expiring.
+        """
+        if self.expires_at - time.time() > REFRESH_BELOW * self.ttl:
+            return
+        self.cached_content.update(ttl=datetime.timedelta(seconds=self.ttl))
+        self.expires_at = time.time() + self.ttl
+
+    def release(self):
+        """
+        Delete the cache, so it stops being billed before it expires.
+        """
+        try:
+            self.cached_content.delete()
+        except Exception as e:
+            logger.warning(f"Could not delete context cache {self.cached_content.name}: {e}")
+
+
+def create_context_cache(backend: str, context: ResearchContext, model: genai.GenerativeModel,
+                         model_name: str, system_instruction: Optional[str] = None,
+                         tools: Optional[List[Callable]] = None,
+                         ttl: int = DEFAULT_CONTEXT_CACHE_TTL) -> Optional[Any]:
+    """
+    Make the research material available to the chat.
+
+    Args:
+        backend: "gemini", "local" or "off".
+        context: The research material.
+        model: The chat model, used as is by the local cache.
+        model_name: The chat model's name, used to create a Gemini cache.
+        system_instruction: The chat's system instruction.
+        tools: The chat's tools.
+        ttl: Lifetime of a Gemini cache in seconds.
+
+    Returns:
+        A GeminiContextCache or LocalContextCache, or None when caching is off. Material
+        below the API's minimum, and material the API refuses, is kept locally.
+    """
+    if backend == "off":
+        return None
+    if backend == "gemini":
+        if context.tokens < MIN_CACHED_TOKENS:
+            logger.info(f"Research context has ~{context.tokens} tokens, below the "
+                        f"{MIN_CACHED_TOKENS} caching minimum; keeping it locally")
+        else:
+            try:
+                return GeminiContextCache(model_name, context, system_instruction, tools, ttl)
+            except Exception as e:
+                logger.warning(f"Could not create a Gemini context cache, keeping the context locally: {e}")
+    return LocalContextCache(model, context)
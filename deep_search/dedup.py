@@ -0,0 +1,176 @@
+"""
+This module removes near-duplicate text before it reaches the report prompt.
+
+- Pages: mirrors, syndicated articles and Wikipedia clones are found with MinHash
+  signatures over word shingles and LSH banding; only the first copy is kept.
+- Repeated text inside a page: sentences repeated verbatim (e.g. list or table rows
+  joined by the extractor) are kept once.
+- Passages: a passage is a repeat when nearly all of its word shingles already
+  appeared in earlier passages, which also catches repeats that start mid-passage.
+"""
+
+import re
+import zlib
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# MinHash settings: BANDS * ROWS hash functions over SHINGLE_WORDS-word shingles
+SHINGLE_WORDS = 5
+MINHASH_BANDS = 16
+MINHASH_ROWS = 8
+# Pages whose estimated Jaccard similarity reaches this are duplicates
+PAGE_SIMILARITY_THRESHOLD = 0.8
+# Passages with at least this share of their shingles seen before are duplicates
+PASSAGE_CONTAINMENT_THRESHOLD = 0.8
+# Sentences shorter than this are never treated as repeats ("Yes.", "Read more.")
+MIN_REPEATED_SENTENCE = 40
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(1)
+_HASH_A = _rng.integers(1, _MERSENNE_PRIME, MINHASH_BANDS * MINHASH_ROWS, dtype=np.uint64)
+_HASH_B = _rng.integers(0, _MERSENNE_PRIME, MINHASH_BANDS * MINHASH_ROWS, dtype=np.uint64)
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])(\s+)")
+_CONTENT_HEADER = re.compile(r"^(Content from[^\n]*\n+)")
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        shingles = {" ".join(words)} if words else set()
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.array([zlib.crc32(shingle.encode("utf-8")) for shingle in shingles], dtype=np.uint64)
+
+
+def minhash(text: str) -> np.ndarray:
+    """
+    MinHash signature of a text's word shingles.
+
+    Args:
+        text: The text
+
+    Returns:
+        MINHASH_BANDS * MINHASH_ROWS minimum hash values
+    """
+    hashes = _shingle_hashes(text)
+    if not len(hashes):
+        return np.full(len(_HASH_A), _MERSENNE_PRIME, dtype=np.uint64)
+    # (a * x + b) mod p for every hash function and shingle at once; fits in uint64
+    values = (np.outer(_HASH_A, hashes) + _HASH_B[:, None]) % _MERSENNE_PRIME
+    return values.min(axis=1)
+
+
+def find_near_duplicate_texts(texts: Sequence[str], threshold: float = PAGE_SIMILARITY_THRESHOLD) -> Dict[int, int]:
+    """
+    Find texts that are near-duplicates of an earlier text with MinHash and LSH.
+
+    Args:
+        texts: The texts, in priority order
+        threshold: Minimum estimated Jaccard similarity of duplicates
+
+    Returns:
+        Mapping from the index of each duplicate to the index of the text it duplicates
+    """
+    signatures = [minhash(text) for text in texts]
+    buckets: Dict[Tuple[int, bytes], List[int]] = {}
+    duplicates: Dict[int, int] = {}
+    for i, signature in enumerate(signatures):
+        candidates = set()
+        for band in range(MINHASH_BANDS):
+            key = (band, signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS].tobytes())
+            candidates.update(buckets.setdefault(key, []))
+            buckets[key].append(i)
+        # Confirm LSH candidates with the full signature
+        for j in sorted(candidates):
+            if j not in duplicates and np.mean(signatures[j] == signature) >= threshold:
+                duplicates[i] = j
+                break
+    return duplicates
+
+
+def find_repeated_passages(texts: Sequence[str], threshold: float = PASSAGE_CONTAINMENT_THRESHOLD) -> List[int]:
+    """
+    Find passages whose text mostly appeared in earlier passages.
+
+    Args:
+        texts: The passages, in priority order
+        threshold: Share of a passage's shingles that must have been seen before
+
+    Returns:
+        The indexes of the repeated passages
+    """
+    seen = set()
+    repeated = []
+    for i, text in enumerate(texts):
+        hashes = set(_shingle_hashes(text).tolist())
+        if hashes and len(hashes & seen) >= threshold * len(hashes):
+            repeated.append(i)
+            continue
+        seen.update(hashes)
+    return repeated
+
+
+def drop_repeated_sentences(text: str) -> str:
+    """
+    Keep only the first occurrence of each long sentence in a text.
+
+    Args:
+        text: The text of a page
+
+    Returns:
+        The text without verbatim repeats
+    """
+    header = _CONTENT_HEADER.match(text)
+    prefix = header.group(1) if header else ""
+    seen = set()
+    kept = []
+    # Sentences alternate with the whitespace separating them
+    parts = _SENTENCE_END.split(text[len(prefix):])
+    for k in range(0, len(parts), 2):
+        sentence = parts[k]
+        key = " ".join(sentence.lower().split())
+        if len(key) >= MIN_REPEATED_SENTENCE:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append((parts[k - 1] if k else "") + sentence)
+    return prefix + "".join(kept)
+
+
+def deduplicate_contents(extracted_contents: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Drop near-duplicate pages and repeated sentences from the extracted contents.
+
+    Duplicate pages are merged into the first copy: their queries are added to it and
+    their URLs listed under "duplicates", so attribution is preserved.
+
+    Args:
+        extracted_contents: The extracted pages ({"url", "query", "queries", "content"})
+
+    Returns:
+        The deduplicated pages, and the characters removed as
+        {"duplicate_pages": ..., "repeated_text": ...}
+    """
+    removed = {"duplicate_pages": 0, "repeated_text": 0}
+    duplicates = find_near_duplicate_texts([_CONTENT_HEADER.sub("", item["content"], count=1) for item in extracted_contents])
+
+    kept: List[Dict[str, Any]] = []
+    positions: Dict[int, int] = {}
+    for i, item in enumerate(extracted_contents):
+        if i in duplicates:
+            original = kept[positions[duplicates[i]]]
+            for query in item.get("queries", [item["query"]]):
+                if query not in original["queries"]:
+                    original["queries"].append(query)
+            original.setdefault("duplicates", []).append(item["url"])
+            removed["duplicate_pages"] += len(item["content"])
+            continue
+
+        content = drop_repeated_sentences(item["content"])
+        removed["repeated_text"] += len(item["content"]) - len(content)
+        positions[i] = len(kept)
+        kept.append({**item, "queries": list(item.get("queries", [item["query"]])), "content": content})
+    return kept, removed
@@ -0,0 +1,172 @@
+"""
+This module contains the pluggable HTML text extraction backends.
+
+Every backend finds the main content of a page the same way and returns the
+qualifying text blocks in document order; tools.extract_html_content turns those
+blocks into the final ContentResult. The BeautifulSoup backend is the reference
+implementation, and the lxml backend produces the same blocks without building
+a BeautifulSoup tree.
+"""
+
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Type
+
+# Elements removed before extraction
+UNWANTED_TAGS = ["script", "style", "nav", "footer", "aside", "header", "form", "button", "noscript"]
+# Text-bearing elements extracted from the main content
+CONTENT_TAGS = ["p", "h1", "h2", "h3", "h4", "li", "td", "th"]
+# Boilerplate blocks skipped inside the main content
+BOILERPLATE_PREFIXES = ("copyright", "related posts", "leave a reply")
+MIN_BLOCK_LENGTH = 25
+
+DEFAULT_EXTRACTOR = os.getenv("RESEARCH_EXTRACTOR", "lxml")
+
+
+def collect_blocks(texts: Iterable[str], max_length: int, skip_boilerplate: bool) -> List[str]:
+    """
+    Keep the qualifying text blocks until the joined text is longer than max_length.
+
+    Args:
+        texts: Candidate text blocks in document order
+        max_length: Length after which the remaining blocks can't change the output
+        skip_boilerplate: Whether to drop blocks starting with a boilerplate prefix
+
+    Returns:
+        The qualifying blocks
+    """
+    blocks = []
+    # Length of the collapsed, space-joined text so far
+    collected = -1
+    for text in texts:
+        if len(text) <= MIN_BLOCK_LENGTH:
+            continue
+        if skip_boilerplate and text.lower().startswith(BOILERPLATE_PREFIXES):
+            continue
+        blocks.append(text)
+        collected += len(re.sub(r'\s{2,}', ' ', text)) + 1
+        if collected > max_length:
+            break
+    return blocks
+
+
+class BaseExtractor:
+    """
+    Interface for an HTML text extraction backend.
+    """
+    name = "base"
+
+    def extract_blocks(self, html: bytes, max_length: int) -> List[str]:
+        """
+        Extract the readable text blocks of a page.
+
+        Args:
+            html: The raw HTML of the page
+            max_length: Length after which extraction may stop
+
+        Returns:
+            The text blocks in document order
+        """
+        raise NotImplementedError
+
+
+class SoupExtractor(BaseExtractor):
+    """
+    Reference backend built on BeautifulSoup.
+    """
+    name = "soup"
+
+    def extract_blocks(self, html: bytes, max_length: int) -> List[str]:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, 'lxml')
+
+        # Remove unwanted elements
+        for element in soup(UNWANTED_TAGS):
+            element.decompose()
+
+        # Try to find main content first
+        main_content = None
+        for selector in ['article', 'main', '[role="main"]']:
+            try:
+                main_content = soup.select_one(selector)
+                if main_content:
+                    break
+            except Exception:
+                continue
+
+        if main_content:
+            tags = main_content.find_all(CONTENT_TAGS, recursive=True)
+            texts = (tag.get_text(separator=' ', strip=True) for tag in tags)
+            return collect_blocks(texts, max_length, skip_boilerplate=True)
+
+        # Fallback to all paragraphs
+        texts = (p.get_text(separator=' ', strip=True) for p in soup.find_all('p'))
+        return collect_blocks(texts, max_length, skip_boilerplate=False)
+
+
+class LxmlExtractor(BaseExtractor):
+    """
+    Fast backend that walks the lxml tree directly.
+    """
+    name = "lxml"
+
+    @staticmethod
+    def _text(element) -> str:
+        # Same as BeautifulSoup's get_text(separator=' ', strip=True)
+        return ' '.join(part.strip() for part in element.itertext() if part.strip())
+
+    def extract_blocks(self, html: bytes, max_length: int) -> List[str]:
+        import lxml.html
+        from lxml import etree
+        from bs4.dammit import UnicodeDammit
+
+        # Decode the same way BeautifulSoup does, so both backends see the same text
+        markup = UnicodeDammit(html, is_html=True).unicode_markup if isinstance(html, bytes) else html
+        if not markup or not markup.strip():
+            return []
+        try:
+            root = lxml.html.document_fromstring(markup)
+        except (etree.ParserError, ValueError):
+            return []
+
+        etree.strip_elements(root, *UNWANTED_TAGS, with_tail=False)
+
+        main_content = None
+        for path in ['.//article', './/main', './/*[@role="main"]']:
+            main_content = root.find(path)
+            if main_content is not None:
+                break
+
+        if main_content is not None:
+            texts = (self._text(el) for el in main_content.iterdescendants(*CONTENT_TAGS))
+            return collect_blocks(texts, max_length, skip_boilerplate=True)
+
+        texts = (self._text(p) for p in root.iter('p'))
+        return collect_blocks(texts, max_length, skip_boilerplate=False)
+
+
+EXTRACTORS: Dict[str, Type[BaseExtractor]] = {
+    SoupExtractor.name: SoupExtractor,
+    LxmlExtractor.name: LxmlExtractor,
+}
+
+_instances: Dict[str, BaseExtractor] = {}
+
+
+def get_extractor(name: Optional[str] = None) -> BaseExtractor:
+    """
+    Get an extraction backend by name.
+
+    Args:
+        name: "soup" or "lxml"; defaults to the RESEARCH_EXTRACTOR environment variable (lxml)
+
+    Returns:
+        The extractor instance
+    """
+    name = (name or DEFAULT_EXTRACTOR).lower()
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown extractor '{name}'. Available: {', '.join(EXTRACTORS)}")
+    if name not in _instances:
+        _instances[name] = EXTRACTORS[name]()
+    return _instances[name]
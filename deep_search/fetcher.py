@@ -0,0 +1,349 @@
+"""
+This module implements the concurrent page-fetch engine used by the research agent.
+Pages are downloaded with a bounded global concurrency limit and a per-host limit,
+and results are always returned in the same order as the requested URLs.
+
+Downloading and parsing are separate steps: downloads run on a thread pool, and
+the CPU-bound HTML extraction runs in a process pool shared by all engines, so
+parsing never holds the GIL of the process serving requests.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from logger import logger
+from scheduler import PolitenessScheduler
+from tools import (
+    ContentResult,
+    MAX_CONTENT_LENGTH,
+    WIKIPEDIA_BACKEND,
+    download_page,
+    extract_html_content,
+    get_page_content,
+    get_wikipedia_page,
+    get_wikipedia_pages,
+    run_blocking,
+    run_sync,
+    store_page_content
+)
+from urls import canonicalize_url
+from wikipedia_api import title_from_url
+
+# Default limits for the fetch engine
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_PER_HOST_LIMIT = 2
+DEFAULT_PARSE_WORKERS = int(os.getenv("RESEARCH_PARSE_WORKERS", min(4, os.cpu_count() or 1)))
+
+
+def fetch_url(url: str) -> ContentResult:
+    """
+    Fetch a single URL with the tool that matches it.
+
+    Args:
+        url: The URL to fetch
+
+    Returns:
+        A ContentResult for the URL
+    """
+    # Handle Wikipedia links specially
+    if is_wikipedia_url(url):
+        return get_wikipedia_page(title_from_url(url))
+    return get_page_content(url)
+
+
+def is_wikipedia_url(url: str) -> bool:
+    """
+    Whether a URL points at a Wikipedia article.
+    """
+    return "wikipedia.org/wiki/" in url
+
+
+def plan_fetches(search_results: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+    """
+    Build a global fetch plan that downloads each canonical URL once.
+
+    Args:
+        search_results: Links found for each query, in query order.
+
+    Returns:
+        One entry per canonical URL, in first-seen order, with the URL to fetch
+        (its first spelling), the canonical URL and every query that surfaced it.
+    """
+    plan: Dict[str, Dict[str, Any]] = {}
+    for query, links in search_results.items():
+        for link in links:
+            canonical = canonicalize_url(link)
+            item = plan.get(canonical)
+            if item is None:
+                item = plan[canonical] = {"url": link, "canonical_url": canonical, "queries": []}
+            if query not in item["queries"]:
+                item["queries"].append(query)
+    return list(plan.values())
+
+
+class ParsePool:
+    """
+    Process pool that runs extract_html_content outside the calling process.
+    """
+
+    def __init__(self, workers: int = DEFAULT_PARSE_WORKERS):
+        """
+        Initialize the pool. Worker processes are only started on first use.
+
+        Args:
+            workers: Number of worker processes.
+        """
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn avoids forking a process that already runs threads (e.g. Streamlit)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def warm_up(self, wait: bool = False):
+        """
+        Start all worker processes ahead of the first real parse.
+
+        Args:
+            wait: Whether to block until the workers are ready.
+        """
+        executor = self._get_executor()
+        futures = [
+            executor.submit(extract_html_content, b"<p>warm up</p>", "about:blank", 1)
+            for _ in range(self.workers)
+        ]
+        if wait:
+            for future in futures:
+                future.result()
+
+    async def aparse(self, body: bytes, url: str, max_length: int = MAX_CONTENT_LENGTH) -> ContentResult:
+        """
+        Extract the content of a downloaded page in a worker process.
+
+        Args:
+            body: The raw HTML.
+            url: The URL the page was downloaded from.
+            max_length: Maximum length of content to return.
+
+        Returns:
+            The extracted ContentResult.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            return await loop.run_in_executor(executor, extract_html_content, body, url, max_length)
+        except BrokenProcessPool:
+            logger.warning("Parse pool broke, restarting it and parsing this page in a thread")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            return await run_blocking(extract_html_content, body, url, max_length)
+
+    def shutdown(self):
+        """
+        Stop the worker processes.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+_shared_parse_pool: Optional[ParsePool] = None
+_shared_parse_pool_lock = threading.Lock()
+
+
+def get_parse_pool() -> ParsePool:
+    """
+    Get the parse pool shared by every fetch engine in this process, so concurrent
+    research runs (e.g. several Streamlit sessions) share one set of workers.
+    """
+    global _shared_parse_pool
+    with _shared_parse_pool_lock:
+        if _shared_parse_pool is None:
+            _shared_parse_pool = ParsePool(DEFAULT_PARSE_WORKERS)
+        return _shared_parse_pool
+
+
+class FetchEngine:
+    """
+    Fetches many pages concurrently while respecting global and per-host limits.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+        scheduler: Optional[PolitenessScheduler] = None,
+        parse_pool: Optional[ParsePool] = None,
+        max_pending_parses: Optional[int] = None
+    ):
+        """
+        Initialize the fetch engine.
+
+        Args:
+            max_concurrency: Maximum number of pages fetched at the same time.
+            per_host_limit: Maximum number of simultaneous fetches against one host.
+            scheduler: Politeness scheduler consulted before each request, if any.
+            parse_pool: Process pool for HTML extraction. None parses in the download thread.
+            max_pending_parses: Maximum number of pages downloaded or being downloaded but not
+                yet parsed. Downloads wait when it is reached, which bounds memory use when
+                fetching outruns parsing. Defaults to max_concurrency plus two per parse worker.
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_host_limit = max(1, per_host_limit)
+        self.scheduler = scheduler
+        self.parse_pool = parse_pool
+        if max_pending_parses is None:
+            max_pending_parses = self.max_concurrency + 2 * (parse_pool.workers if parse_pool else 0)
+        self.max_pending_parses = max(1, max_pending_parses)
+        # The tool functions are blocking, so they run on a dedicated pool sized to the limit
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="fetch"
+        )
+        # Limits of each event loop, shared by concurrent afetch_all calls on it
+        self._loop_limits = weakref.WeakKeyDictionary()
+
+    def _limits(self):
+        """
+        Get the (global, pending parses, per host) limits of the running event loop.
+        Semaphores are bound to the loop they are used on, so each loop gets its own.
+        """
+        loop = asyncio.get_running_loop()
+        limits = self._loop_limits.get(loop)
+        if limits is None:
+            limits = self._loop_limits[loop] = (
+                asyncio.Semaphore(self.max_concurrency),
+                asyncio.Semaphore(self.max_pending_parses),
+                {}
+            )
+        return limits
+
+    async def afetch_all(self, urls: List[str],
+                         on_result: Optional[Callable[[str, ContentResult], None]] = None) -> List[ContentResult]:
+        """
+        Fetch all URLs concurrently. Concurrent calls on the same event loop share the
+        global and per-host limits.
+
+        Args:
+            urls: The URLs to fetch.
+            on_result: Called with each URL and its ContentResult as soon as it is done.
+
+        Returns:
+            A list of ContentResults in the same order as the URLs.
+        """
+        global_limit, pending_parses, host_limits = self._limits()
+        loop = asyncio.get_running_loop()
+
+        async def download(url: str):
+            host = urlparse(url).netloc.lower()
+            if host not in host_limits:
+                host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+
+            async with host_limits[host]:
+                # Wait for the politeness delay before taking a global slot,
+                # so a throttled host never blocks fetches to other hosts
+                if self.scheduler:
+                    await self.scheduler.aacquire(self.scheduler.key_for_url(url))
+
+                # The pending-parse slot is taken only after the host and politeness waits,
+                # so pages queued behind a slow host never hold slots other hosts need.
+                # fetch_one releases it once the page is parsed.
+                await pending_parses.acquire()
+                try:
+                    async with global_limit:
+                        logger.info(f"Extracting content from: {url}")
+                        # Wikipedia articles come back as text and need no HTML parsing
+                        if self.parse_pool is None or is_wikipedia_url(url):
+                            return await loop.run_in_executor(self.executor, fetch_url, url)
+                        return await loop.run_in_executor(self.executor, download_page, url)
+                except BaseException:
+                    pending_parses.release()
+                    raise
+
+        async def fetch_wikipedia(wikipedia_urls: List[str]) -> Dict[str, ContentResult]:
+            # All articles are requested together in batched API calls instead of one by one
+            titles = {url: title_from_url(url) for url in wikipedia_urls}
+            if self.scheduler and WIKIPEDIA_BACKEND != "local":
+                await self.scheduler.aacquire(self.scheduler.key_for_url(wikipedia_urls[0]))
+            async with global_limit:
+                logger.info(f"Extracting content from {len(titles)} Wikipedia articles")
+                pages = await loop.run_in_executor(self.executor, get_wikipedia_pages, list(titles.values()))
+            return {url: pages[title] for url, title in titles.items()}
+
+        wikipedia_batch = None
+        if WIKIPEDIA_BACKEND != "library":
+            wikipedia_urls = list(dict.fromkeys(url for url in urls if is_wikipedia_url(url)))
+            if wikipedia_urls:
+                wikipedia_batch = asyncio.ensure_future(fetch_wikipedia(wikipedia_urls))
+
+        async def fetch_one(url: str) -> ContentResult:
+            try:
+                if wikipedia_batch is not None and is_wikipedia_url(url):
+                    # Wikipedia articles come back as text and need no HTML parsing
+                    return (await wikipedia_batch)[url]
+                result = await download(url)
+                try:
+                    if isinstance(result, ContentResult):
+                        return result
+                    if result.result is not None:
+                        return result.result
+
+                    content = await self.parse_pool.aparse(result.body, url, MAX_CONTENT_LENGTH)
+                finally:
+                    pending_parses.release()
+                await loop.run_in_executor(self.executor, store_page_content, result, content, MAX_CONTENT_LENGTH)
+                return content
+            except Exception as e:
+                logger.error(f"Error fetching {url}: {e}", exc_info=True)
+                return ContentResult(
+                    content=f"Unexpected error fetching the page: {str(e)}",
+                    success=False,
+                    url=url
+                )
+
+        async def fetch_and_report(url: str) -> ContentResult:
+            result = await fetch_one(url)
+            if on_result:
+                on_result(url, result)
+            return result
+
+        return list(await asyncio.gather(*(fetch_and_report(url) for url in urls)))
+
+    def fetch_all(self, urls: List[str],
+                  on_result: Optional[Callable[[str, ContentResult], None]] = None) -> List[ContentResult]:
+        """
+        Fetch all URLs concurrently from synchronous code.
+
+        Args:
+            urls: The URLs to fetch.
+            on_result: Called with each URL and its ContentResult as soon as it is done.
+
+        Returns:
+            A list of ContentResults in the same order as the URLs.
+        """
+        if not urls:
+            return []
+        return run_sync(self.afetch_all(urls, on_result))
+
+    def close(self):
+        """
+        Shut down the worker threads used by the engine. The shared parse pool stays up.
+        """
+        self.executor.shutdown(wait=False)
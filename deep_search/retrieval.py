@@ -0,0 +1,282 @@
+"""
+This module implements passage-level retrieval for the report context.
+
+Extracted pages are split into overlapping passages, which are scored against the
+user query and every generated query with BM25. Scores are computed for all passages
+at once over a sparse term matrix held in numpy arrays. Optionally, the best BM25
+candidates are reranked with a local sentence-embedding model. Only the top passages
+that fit the token budget are sent to the report model.
+"""
+
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from dedup import find_repeated_passages
+
+# Passage size in words, and the overlap between consecutive passages
+PASSAGE_WORDS = 120
+PASSAGE_OVERLAP = 20
+# Rough characters per token, used to keep the context within the budget
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = int(os.getenv("RESEARCH_CONTEXT_TOKENS", 24000))
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# The user query counts this many times more than each generated query
+USER_QUERY_WEIGHT = 2.0
+
+# Local sentence-transformers model for reranking (e.g. "all-MiniLM-L6-v2"); empty disables it
+EMBEDDING_MODEL = os.getenv("RESEARCH_EMBEDDING_MODEL", "")
+# Number of BM25 candidates reranked with embeddings, and the weight of the embedding score
+RERANK_CANDIDATES = 100
+EMBEDDING_WEIGHT = 0.5
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i in is it its of on or that the this
+to was what when where which who why will with you your do does did can about into than
+""".split())
+
+_TOKEN = re.compile(r"\w+")
+# "Content from: <url>" / "Content from Wikipedia: <url>" header added by the tools
+_CONTENT_HEADER = re.compile(r"^Content from[^\n]*\n+")
+
+
+class Passage(BaseModel):
+    """
+    A passage of an extracted page.
+    """
+    url: str = Field(description="URL of the page the passage comes from")
+    queries: List[str] = Field(default_factory=list, description="Queries that surfaced the page")
+    source_index: int = Field(description="Position of the page in extracted_contents")
+    position: int = Field(description="Position of the passage within its page")
+    text: str = Field(description="Text of the passage")
+    score: float = Field(default=0.0, description="Relevance score")
+
+
+class PassageSelection(BaseModel):
+    """
+    Passages selected for the report context.
+    """
+    passages: List[Passage] = Field(default_factory=list, description="Selected passages in page and position order")
+    total_passages: int = Field(default=0, description="Number of passages the pages were split into")
+    duplicate_passages: int = Field(default=0, description="Near-duplicate passages dropped before ranking")
+    duplicate_tokens: int = Field(default=0, description="Estimated tokens of the dropped duplicates")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a text.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase a text and split it into terms, dropping stopwords.
+    """
+    return [term for term in _TOKEN.findall(text.lower()) if term not in STOPWORDS]
+
+
+def split_passages(extracted_contents: List[Dict[str, Any]], words: int = PASSAGE_WORDS,
+                   overlap: int = PASSAGE_OVERLAP) -> List[Passage]:
+    """
+    Split extracted pages into overlapping passages of about `words` words.
+
+    Args:
+        extracted_contents: The extracted pages ({"url", "query", "queries", "content"})
+        words: Passage length in words
+        overlap: Words shared by consecutive passages
+
+    Returns:
+        The passages of every page, in page order
+    """
+    passages = []
+    step = max(1, words - overlap)
+    for source_index, item in enumerate(extracted_contents):
+        text = _CONTENT_HEADER.sub("", item["content"], count=1)
+        page_words = text.split()
+        queries = item.get("queries", [item.get("query", "")])
+        for position, start in enumerate(range(0, max(1, len(page_words) - overlap), step)):
+            chunk = " ".join(page_words[start:start + words])
+            if chunk:
+                passages.append(Passage(
+                    url=item["url"],
+                    queries=queries,
+                    source_index=source_index,
+                    position=position,
+                    text=chunk
+                ))
+    return passages
+
+
+class BM25Index:
+    """
+    BM25 over a fixed set of texts, scoring all of them per query in one pass.
+    """
+
+    def __init__(self, texts: List[str], k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Build the index.
+
+        Args:
+            texts: The texts to score
+            k1: Term frequency saturation
+            b: Length normalization
+        """
+        self.vocabulary: Dict[str, int] = {}
+        doc_ids, term_ids = [], []
+        lengths = np.zeros(len(texts), dtype=np.float64)
+        for doc_id, text in enumerate(texts):
+            terms = tokenize(text)
+            lengths[doc_id] = len(terms)
+            for term in terms:
+                doc_ids.append(doc_id)
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+
+        # Sparse document-term matrix as (doc, term, count) triples
+        pairs = np.array([doc_ids, term_ids], dtype=np.int64).reshape(2, -1)
+        unique, counts = np.unique(pairs, axis=1, return_counts=True)
+        self.doc_ids, self.term_ids = unique[0], unique[1]
+
+        n_docs = max(1, len(texts))
+        doc_freq = np.bincount(self.term_ids, minlength=len(self.vocabulary))
+        self.idf = np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+        average_length = lengths.mean() if len(texts) and lengths.mean() > 0 else 1.0
+        norm = k1 * (1 - b + b * lengths / average_length)
+        # Per-pair BM25 weight; a query score is the sum over its matching pairs
+        self.weights = self.idf[self.term_ids] * counts * (k1 + 1) / (counts + norm[self.doc_ids])
+        self.n_docs = len(texts)
+
+    def score(self, query: str) -> np.ndarray:
+        """
+        Score every text against a query.
+
+        Returns:
+            One BM25 score per text
+        """
+        scores = np.zeros(self.n_docs, dtype=np.float64)
+        query_terms = [self.vocabulary[term] for term in set(tokenize(query)) if term in self.vocabulary]
+        if query_terms:
+            mask = np.isin(self.term_ids, query_terms)
+            np.add.at(scores, self.doc_ids[mask], self.weights[mask])
+        return scores
+
+
+_embedding_model = None
+
+
+def _get_embedding_model(name: str):
+    global _embedding_model
+    if _embedding_model is None:
+        from sentence_transformers import SentenceTransformer
+        _embedding_model = SentenceTransformer(name)
+    return _embedding_model
+
+
+def score_passages(passages: List[Passage], user_query: str, queries: List[str],
+                   embedding_model: Optional[str] = EMBEDDING_MODEL) -> np.ndarray:
+    """
+    Score passages against the user query and the generated queries.
+
+    Each query's BM25 scores are scaled to [0, 1] so no single query dominates, then
+    summed with the user query weighted by USER_QUERY_WEIGHT. With an embedding model,
+    the top BM25 candidates are blended with their cosine similarity to the queries.
+
+    Args:
+        passages: The passages to score
+        user_query: The original user query
+        queries: The generated search queries
+        embedding_model: Name of a local sentence-transformers model, or empty to skip reranking
+
+    Returns:
+        One score per passage
+    """
+    index = BM25Index([passage.text for passage in passages])
+    weighted = [(user_query, USER_QUERY_WEIGHT)] + [(query, 1.0) for query in queries if query != user_query]
+    scores = np.zeros(len(passages), dtype=np.float64)
+    for query, weight in weighted:
+        query_scores = index.score(query)
+        if query_scores.max(initial=0) > 0:
+            scores += weight * query_scores / query_scores.max()
+    scores /= sum(weight for _, weight in weighted)
+
+    if embedding_model and len(passages):
+        try:
+            model = _get_embedding_model(embedding_model)
+        except ImportError:
+            # sentence-transformers is optional; BM25 alone is used without it
+            return scores
+        candidates = np.argsort(-scores)[:RERANK_CANDIDATES]
+        passage_vectors = model.encode([passages[i].text for i in candidates], normalize_embeddings=True)
+        query_vectors = model.encode([query for query, _ in weighted], normalize_embeddings=True)
+        weights = np.array([weight for _, weight in weighted])
+        similarity = (passage_vectors @ query_vectors.T) @ weights / weights.sum()
+        scores[candidates] = (1 - EMBEDDING_WEIGHT) * scores[candidates] + EMBEDDING_WEIGHT * similarity
+    return scores
+
+
+def select_passages(extracted_contents: List[Dict[str, Any]], user_query: str, queries: List[str],
+                    token_budget: int = DEFAULT_TOKEN_BUDGET,
+                    embedding_model: Optional[str] = EMBEDDING_MODEL,
+                    count_tokens: Callable[[str], int] = None) -> PassageSelection:
+    """
+    Pick the most relevant passages of the extracted pages that fit a token budget.
+
+    Near-duplicate passages are dropped first, keeping the earliest copy. The best
+    passage from the pages of each generated query is taken first, so every query
+    keeps some coverage, then the remaining budget is filled in score order.
+
+    Args:
+        extracted_contents: The extracted pages
+        user_query: The original user query
+        queries: The generated search queries
+        token_budget: Maximum estimated tokens of passage text
+        embedding_model: Name of a local sentence-transformers model, or empty to skip reranking
+        count_tokens: Token counter for the budget; defaults to estimate_tokens
+
+    Returns:
+        The selected passages and deduplication counts
+    """
+    count_tokens = count_tokens or estimate_tokens
+    passages = split_passages(extracted_contents)
+    if not passages:
+        return PassageSelection()
+
+    selection = PassageSelection(total_passages=len(passages))
+    duplicates = set(find_repeated_passages([passage.text for passage in passages]))
+    if duplicates:
+        selection.duplicate_passages = len(duplicates)
+        selection.duplicate_tokens = sum(count_tokens(passages[i].text) for i in duplicates)
+        passages = [passage for i, passage in enumerate(passages) if i not in duplicates]
+
+    scores = score_passages(passages, user_query, queries, embedding_model)
+    for passage, score in zip(passages, scores):
+        passage.score = float(score)
+
+    order = list(np.argsort(-scores, kind="stable"))
+    for query in reversed(queries):
+        best = next((i for i in order if query in passages[i].queries), None)
+        if best is not None:
+            order.remove(best)
+            order.insert(0, best)
+
+    selected, used = [], 0
+    for i in order:
+        tokens = count_tokens(passages[i].text)
+        if used + tokens > token_budget:
+            continue
+        selected.append(passages[i])
+        used += tokens
+    selected.sort(key=lambda passage: (passage.source_index, passage.position))
+    # Don't repeat the overlap when consecutive passages of a page are both selected
+    for previous, passage in zip(selected, selected[1:]):
+        if passage.source_index == previous.source_index and passage.position == previous.position + 1:
+            passage.text = " ".join(passage.text.split()[PASSAGE_OVERLAP:])
+    selection.passages = selected
+    return selection
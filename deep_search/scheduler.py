@@ -0,0 +1,202 @@
+"""
+This module implements the politeness scheduler used by the research agent.
+Every host or search provider gets its own token bucket, so a request is only
+delayed when it would hit the same host too often.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+# Provider keys for the search backends
+DUCKDUCKGO = "duckduckgo"
+WIKIPEDIA = "wikipedia"
+
+# Default (rate in requests per second, burst size) for each provider
+DEFAULT_RATES: Dict[str, Tuple[float, int]] = {
+    DUCKDUCKGO: (0.5, 1),
+    WIKIPEDIA: (5.0, 5),
+}
+# Default (rate, burst) for any other host
+DEFAULT_HOST_RATE: Tuple[float, int] = (1.0, 2)
+
+
+class TokenBucket:
+    """
+    A token bucket that hands out reservations instead of blocking.
+
+    Reserving a token returns how long the caller has to wait for it, so
+    concurrent callers are queued in arrival order without holding the lock.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        Initialize the bucket.
+
+        Args:
+            rate: Tokens added per second.
+            capacity: Maximum number of tokens (the allowed burst).
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """
+        Take one token, going into debt if none are available.
+
+        Returns:
+            The number of seconds to wait before the token may be used.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class PolitenessScheduler:
+    """
+    Rate limits requests per host and per search provider.
+    """
+
+    def __init__(
+        self,
+        rates: Optional[Dict[str, Tuple[float, int]]] = None,
+        default_rate: Tuple[float, int] = DEFAULT_HOST_RATE
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            rates: (rate, burst) overrides keyed by provider name or host.
+            default_rate: (rate, burst) used for hosts without an override.
+        """
+        self.rates = dict(DEFAULT_RATES)
+        if rates:
+            self.rates.update(rates)
+        self.default_rate = default_rate
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for_url(url: str) -> str:
+        """
+        Get the scheduling key for a URL.
+
+        Args:
+            url: The URL that is about to be requested.
+
+        Returns:
+            The provider name for Wikipedia links, otherwise the lowercased host.
+        """
+        host = urlparse(url).netloc.lower()
+        if host.endswith("wikipedia.org"):
+            return WIKIPEDIA
+        return host
+
+    def _reserve(self, key: str) -> float:
+        """
+        Reserve a slot for `key` and record it in the stats.
+        """
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                rate, burst = self.rates.get(key, self.default_rate)
+                bucket = self._buckets[key] = TokenBucket(rate, burst)
+            stats = self._stats.setdefault(key, {
+                "requests": 0,
+                "delayed": 0,
+                "queue_depth": 0,
+                "max_queue_depth": 0,
+                "total_wait": 0.0,
+                "max_wait": 0.0,
+            })
+            wait = bucket.reserve()
+            stats["requests"] += 1
+            if wait > 0:
+                stats["delayed"] += 1
+                stats["queue_depth"] += 1
+                stats["max_queue_depth"] = max(stats["max_queue_depth"], stats["queue_depth"])
+                stats["total_wait"] += wait
+                stats["max_wait"] = max(stats["max_wait"], wait)
+            return wait
+
+    def _release(self, key: str):
+        """
+        Mark a delayed request for `key` as no longer waiting.
+        """
+        with self._lock:
+            self._stats[key]["queue_depth"] -= 1
+
+    def acquire(self, key: str) -> float:
+        """
+        Block until a request to `key` is allowed.
+
+        Args:
+            key: A provider name or host (see key_for_url).
+
+        Returns:
+            The number of seconds the caller waited.
+        """
+        wait = self._reserve(key)
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                self._release(key)
+        return wait
+
+    async def aacquire(self, key: str) -> float:
+        """
+        Wait without blocking the event loop until a request to `key` is allowed.
+
+        Args:
+            key: A provider name or host (see key_for_url).
+
+        Returns:
+            The number of seconds the caller waited.
+        """
+        wait = self._reserve(key)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._release(key)
+        return wait
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get the queue depth and wait-time statistics for every key.
+
+        Returns:
+            A dictionary of per-key stats: requests, delayed, queue_depth,
+            max_queue_depth, total_wait, max_wait and avg_wait (in seconds).
+        """
+        with self._lock:
+            result = {}
+            for key, stats in self._stats.items():
+                result[key] = dict(stats)
+                result[key]["avg_wait"] = stats["total_wait"] / stats["requests"] if stats["requests"] else 0.0
+            return result
+
+    def log_stats(self, logger):
+        """
+        Log a one-line summary per key that had to wait.
+
+        Args:
+            logger: The logger to write to.
+        """
+        for key, stats in self.stats().items():
+            if stats["delayed"]:
+                logger.info(
+                    f"Politeness wait for {key}: {stats['delayed']}/{stats['requests']} requests delayed, "
+                    f"total {stats['total_wait']:.2f}s, max {stats['max_wait']:.2f}s, "
+                    f"max queue depth {stats['max_queue_depth']}"
+                )
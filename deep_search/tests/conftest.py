@@ -0,0 +1,84 @@
+"""
+Shared test setup: the modules of deep_search import each other as top-level
+modules, so the package directory goes on the path. Also provides fakes of the
+Gemini responses and models, and a ResearchAgent factory that uses them.
+"""
+
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeContent(dict):
+    """
+    Stands in for the proto Content of a Gemini response.
+    """
+
+    @staticmethod
+    def to_dict(content):
+        return dict(content)
+
+
+def fake_response(parts, prompt_tokens=10, cached_tokens=0):
+    """
+    A Gemini response with one candidate made of the given parts.
+    """
+    return types.SimpleNamespace(
+        text="".join(part.get("text", "") for part in parts),
+        usage_metadata=types.SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            cached_content_token_count=cached_tokens,
+            candidates_token_count=5
+        ),
+        candidates=[types.SimpleNamespace(content=FakeContent(role="model", parts=parts))]
+    )
+
+
+class FakeChatModel:
+    """
+    Records the contents of every call and answers with a text, or with what reply(contents) returns.
+    """
+
+    model_name = "models/fake"
+
+    def __init__(self, reply=None):
+        self.calls = []
+        self.reply = reply
+
+    async def generate_content_async(self, contents, **kwargs):
+        self.calls.append(contents)
+        if self.reply is not None:
+            return self.reply(contents)
+        return fake_response([{"text": "answer"}])
+
+    def count_tokens(self, text):
+        return types.SimpleNamespace(total_tokens=len(str(text).split()))
+
+
+@pytest.fixture
+def make_agent(tmp_path, monkeypatch):
+    """
+    Build ResearchAgents that never reach the network or the on-disk LLM cache.
+    """
+    import agent
+    import tools
+
+    monkeypatch.setattr(tools, "_llm_cache", None)
+    monkeypatch.setattr(tools, "LLM_CACHE_ENABLED", False)
+
+    def make(**kwargs):
+        research_agent = agent.ResearchAgent(
+            api_key="test-key",
+            parse_in_processes=False,
+            output_dir=str(tmp_path / "outputs"),
+            **kwargs
+        )
+        research_agent.model = research_agent.report_model = FakeChatModel()
+        research_agent.token_counter.model = None
+        return research_agent
+
+    return make
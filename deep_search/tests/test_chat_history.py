@@ -0,0 +1,83 @@
+from chat_history import estimate_messages, split_history, truncate_tool_payloads, turn_starts
+from conftest import FakeChatModel, fake_response
+from token_budget import TokenCounter
+
+
+def user(text):
+    return {"role": "user", "parts": [{"text": text}]}
+
+
+def model(text):
+    return {"role": "model", "parts": [{"text": text}]}
+
+
+def tool(content):
+    return {"role": "tool", "parts": [{"function_response": {"name": "get_page_content",
+                                                              "response": {"success": True, "content": content}}}]}
+
+
+def estimate(messages):
+    return estimate_messages(messages, TokenCounter().estimate)
+
+
+def test_split_history_always_keeps_the_current_turn():
+    messages = [user("old question"), model("old answer"), user("huge question " * 5000)]
+
+    assert split_history(messages, budget=100, estimate=estimate) == 2
+
+
+def test_split_history_keeps_the_recent_turns_that_fit_half_the_budget():
+    messages = []
+    for i in range(10):
+        messages += [user(f"question {i}"), model("answer " * 50)]
+    messages.append(user("current question"))
+
+    cut = split_history(messages, budget=400, estimate=estimate)
+
+    assert cut in turn_starts(messages)
+    assert estimate(messages[cut:]) <= 200
+    # One more turn would not have fit
+    previous = turn_starts(messages)[turn_starts(messages).index(cut) - 1]
+    assert estimate(messages[previous:]) > 200
+
+
+def test_only_tool_payloads_of_earlier_turns_are_truncated():
+    messages = [user("q1"), tool("page " * 1000), model("a1"), user("q2"), tool("page " * 1000)]
+
+    compacted = truncate_tool_payloads(messages, end=3, max_chars=100)
+
+    assert compacted[1]["parts"][0]["function_response"]["response"]["content"].endswith("[truncated]")
+    assert len(compacted[1]["parts"][0]["function_response"]["response"]["content"]) < 150
+    assert compacted[4] is messages[4]
+
+
+def test_long_conversation_stays_within_the_history_budget(make_agent):
+    budget = 2000
+    agent = make_agent(chat_history_tokens=budget, context_cache="off")
+    agent.model = FakeChatModel(reply=lambda contents: fake_response([{"text": "answer " * 150}]))
+    summaries = FakeChatModel(reply=lambda prompt: fake_response([{"text": "summary of the conversation"}]))
+    agent.report_model = summaries
+
+    for i in range(25):
+        agent.chat(f"question {i}", thread_id="long")
+
+    sent = [estimate(contents) for contents in agent.model.calls]
+    assert max(sent) <= budget
+    assert summaries.calls, "old turns were never summarized"
+    state = agent.conversation_graph.get_state({"configurable": {"thread_id": "long"}}).values
+    assert state["history_summary"] == "summary of the conversation"
+    assert agent.model.calls[-1][0]["parts"][0]["text"].startswith("Summary of our conversation so far")
+
+
+def test_threads_keep_their_own_history(make_agent):
+    agent = make_agent(context_cache="off")
+    agent.chat("first", thread_id="a")
+    agent.chat("second", thread_id="a")
+    agent.chat("other", thread_id="b")
+
+    assert [m["parts"][0]["text"] for m in agent.model.calls[1] if m["role"] == "user"] == ["first", "second"]
+    assert len(agent.model.calls[2]) == 1
+
+    agent.reset_chat("a")
+    agent.chat("again", thread_id="a")
+    assert len(agent.model.calls[3]) == 1
@@ -0,0 +1,111 @@
+import context_cache
+from agent import AgentState
+from conftest import FakeChatModel
+from context_cache import GeminiContextCache, LocalContextCache
+
+
+def research_state(report_words=3000):
+    return AgentState(
+        user_query="solar power",
+        queries=["solar power"],
+        report="Solar report. " * report_words,
+        extracted_contents=[{"url": "https://example.com/solar", "query": "solar power", "content": "Panels " * 300}]
+    )
+
+
+class FakeCachedContent:
+    created = []
+    deleted = []
+
+    def __init__(self, **kwargs):
+        self.name = f"cachedContents/{len(self.created)}"
+        self.kwargs = kwargs
+
+    @classmethod
+    def create(cls, **kwargs):
+        cached = cls(**kwargs)
+        cls.created.append(cached)
+        return cached
+
+    def update(self, ttl):
+        pass
+
+    def delete(self):
+        self.deleted.append(self.name)
+
+
+def use_fake_gemini_cache(monkeypatch):
+    FakeCachedContent.created, FakeCachedContent.deleted = [], []
+    cached_model = FakeChatModel()
+    monkeypatch.setattr(context_cache.caching, "CachedContent", FakeCachedContent)
+    monkeypatch.setattr(context_cache.genai.GenerativeModel, "from_cached_content",
+                        classmethod(lambda cls, cached_content: cached_model))
+    return cached_model
+
+
+def test_local_cache_answers_follow_ups_from_the_research(make_agent):
+    agent = make_agent(context_cache="local")
+    tools_run = []
+    for name in agent.async_tool_mapping:
+        agent.async_tool_mapping[name] = lambda **kwargs: tools_run.append(kwargs)
+    agent.use_research_context(research_state())
+
+    assert agent.chat("What did the report conclude?") == "answer"
+    assert isinstance(agent.context_cache, LocalContextCache)
+    contents = agent.model.calls[0]
+    assert "Solar report." in contents[0]["parts"][0]["text"]
+    assert "https://example.com/solar" in contents[0]["parts"][0]["text"]
+    assert contents[-1]["parts"][0]["text"] == "What did the report conclude?"
+    assert tools_run == []
+
+
+def test_gemini_cache_uploads_the_material_once(make_agent, monkeypatch):
+    cached_model = use_fake_gemini_cache(monkeypatch)
+    agent = make_agent(context_cache="gemini")
+    agent.use_research_context(research_state())
+
+    agent.chat("First follow-up")
+    agent.chat("Second follow-up")
+
+    assert len(FakeCachedContent.created) == 1
+    uploaded = FakeCachedContent.created[0].kwargs
+    assert "Solar report." in uploaded["contents"][0]["parts"][0]["text"]
+    assert uploaded["system_instruction"] == agent.system_instruction
+    assert isinstance(agent.context_cache, GeminiContextCache)
+    # Turns reference the cache: only the conversation is sent, never the material
+    assert agent.model.calls == []
+    assert len(cached_model.calls) == 2
+    for contents in cached_model.calls:
+        assert all("Solar report." not in str(message) for message in contents)
+    assert cached_model.calls[-1][-1]["parts"][0]["text"] == "Second follow-up"
+
+
+def test_new_research_replaces_and_deletes_the_previous_cache(make_agent, monkeypatch):
+    use_fake_gemini_cache(monkeypatch)
+    agent = make_agent(context_cache="gemini")
+    agent.use_research_context(research_state())
+    agent.chat("Follow-up")
+
+    agent.use_research_context(research_state().model_copy(update={"user_query": "wind power"}))
+
+    assert FakeCachedContent.deleted == ["cachedContents/0"]
+    assert agent.context_cache is None
+    assert agent.research_context.user_query == "wind power"
+
+
+def test_small_or_refused_material_is_kept_locally(make_agent, monkeypatch):
+    use_fake_gemini_cache(monkeypatch)
+    agent = make_agent(context_cache="gemini")
+    agent.use_research_context(research_state(report_words=10))
+    agent.chat("Follow-up")
+    assert isinstance(agent.context_cache, LocalContextCache)
+    assert FakeCachedContent.created == []
+
+    def refuse(**kwargs):
+        raise ValueError("cached content is too small")
+
+    monkeypatch.setattr(FakeCachedContent, "create", staticmethod(refuse))
+    agent = make_agent(context_cache="gemini")
+    agent.use_research_context(research_state())
+    agent.chat("Follow-up")
+    assert isinstance(agent.context_cache, LocalContextCache)
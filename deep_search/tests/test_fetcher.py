@@ -0,0 +1,26 @@
+import time
+
+import fetcher
+from fetcher import FetchEngine
+from tools import ContentResult
+
+
+def test_slow_host_does_not_delay_other_hosts(monkeypatch):
+    def fake_fetch_url(url):
+        time.sleep(0.2 if "slow.example" in url else 0.01)
+        return ContentResult(content=f"Content from: {url}", success=True, url=url)
+
+    monkeypatch.setattr(fetcher, "fetch_url", fake_fetch_url)
+    engine = FetchEngine(max_concurrency=4, per_host_limit=2)
+    urls = [f"https://slow.example/{i}" for i in range(12)] + ["https://fast.example/page"]
+    finished = {}
+    started = time.perf_counter()
+    try:
+        results = engine.fetch_all(urls, on_result=lambda url, result: finished.setdefault(url, time.perf_counter() - started))
+    finally:
+        engine.close()
+
+    assert [result.url for result in results] == urls
+    # The slow host needs six rounds of 0.2s; the other host's page must not queue behind them
+    assert finished["https://fast.example/page"] < 0.15
+    assert max(finished.values()) >= 1.0
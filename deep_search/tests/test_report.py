@@ -0,0 +1,47 @@
+import asyncio
+
+from agent import MAX_REDUCE_LEVELS
+from conftest import FakeChatModel, fake_response
+
+
+def notes(words):
+    return " ".join(f"fact{i} (https://example.com/{i})" for i in range(words))
+
+
+def test_reduce_prompt_stays_within_the_budget(make_agent):
+    agent = make_agent(report_mode="map_reduce")
+    agent.max_prompt_tokens = agent.token_counter.estimate(agent._build_report_prompt("query", "")) + 600
+    # Every merge keeps a good part of its input, so one level is not enough
+    agent.report_model = FakeChatModel(reply=lambda prompt: fake_response([{"text": notes(40)}]))
+    summaries = [{"query": f"query {i}", "notes": notes(60)} for i in range(12)]
+
+    fitted, levels, calls = asyncio.run(agent._areduce_notes("query", summaries))
+
+    budget = agent.max_prompt_tokens
+    assert levels > 1
+    assert calls == len(agent.report_model.calls)
+    assert all(agent.token_counter.estimate(prompt) <= budget for prompt in agent.report_model.calls)
+    assert agent.token_counter.estimate(agent._build_report_prompt("query", agent._format_notes(fitted))) <= budget
+
+
+def test_notes_that_fit_are_not_merged(make_agent):
+    agent = make_agent(report_mode="map_reduce")
+    summaries = [{"query": "query", "notes": notes(20)}]
+
+    fitted, levels, calls = asyncio.run(agent._areduce_notes("query", summaries))
+
+    assert (fitted, levels, calls) == (summaries, 0, 0)
+    assert agent.report_model.calls == []
+
+
+def test_notes_left_over_budget_are_trimmed(make_agent):
+    agent = make_agent(report_mode="map_reduce")
+    agent.max_prompt_tokens = agent.token_counter.estimate(agent._build_report_prompt("query", "")) + 600
+    # Merges that do not shrink the notes leave them over budget after every level
+    agent.report_model = FakeChatModel(reply=lambda prompt: fake_response([{"text": notes(200)}]))
+    summaries = [{"query": f"query {i}", "notes": notes(200)} for i in range(4)]
+
+    fitted, levels, _ = asyncio.run(agent._areduce_notes("query", summaries))
+
+    assert levels == MAX_REDUCE_LEVELS
+    assert agent.token_counter.estimate(agent._build_report_prompt("query", agent._format_notes(fitted))) <= agent.max_prompt_tokens
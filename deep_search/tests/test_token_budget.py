@@ -0,0 +1,23 @@
+import token_budget
+from token_budget import TokenCounter
+
+
+def test_long_texts_are_cached_by_digest():
+    counter = TokenCounter()
+    text = "word " * 5000
+    first = counter.estimate(text)
+
+    assert counter.estimate(text) == first
+    assert first == counter.estimate("word " * 4999 + "word ")
+    # Long texts leave only a digest in the cache
+    assert all(isinstance(key, bytes) and len(key) == 16 for key in token_budget._long_estimates)
+    assert token_budget._short_estimate.cache_info().currsize <= token_budget.ESTIMATE_CACHE_SIZE
+
+
+def test_estimate_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(token_budget, "ESTIMATE_CACHE_SIZE", 3)
+    counter = TokenCounter()
+    for i in range(10):
+        counter.estimate(f"text {i} " + "x" * token_budget.CACHED_TEXT_CHARS)
+
+    assert len(token_budget._long_estimates) == 3
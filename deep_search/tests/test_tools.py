@@ -0,0 +1,55 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import tools
+from tools import HttpClient
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_dns_cache_is_scoped_to_the_client(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    lookups = []
+    real_getaddrinfo = socket.getaddrinfo
+
+    def counting_getaddrinfo(host, *args, **kwargs):
+        lookups.append(host)
+        return real_getaddrinfo(host, *args, **kwargs)
+
+    monkeypatch.setattr(tools.socket, "getaddrinfo", counting_getaddrinfo)
+    try:
+        client = HttpClient(http2=False)
+        url = f"http://localhost:{server.server_port}/"
+        # The server closes every connection, so each request opens a new one
+        assert [client.get(url).text for _ in range(3)] == ["ok"] * 3
+    finally:
+        server.shutdown()
+
+    # Connecting to a cached address still goes through getaddrinfo, but without a DNS query
+    assert [host for host in lookups if host == "localhost"] == ["localhost"]
+    # Building a client leaves the process-wide resolver alone
+    assert socket.getaddrinfo is counting_getaddrinfo
+
+
+def test_host_without_cached_addresses_connects_normally(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = HttpClient(http2=False)
+        monkeypatch.setattr(client.dns_cache, "resolve", lambda host, port: [])
+        assert client.get(f"http://localhost:{server.server_port}/").text == "ok"
+    finally:
+        server.shutdown()
@@ -0,0 +1,147 @@
+import asyncio
+import time
+
+from agent import AgentState
+from conftest import FakeChatModel, fake_response
+from tools import ContentResult, SearchResult
+
+
+def call(name, **args):
+    return {"function_call": {"name": name, "args": args}}
+
+
+def tool_turn(*calls, history=()):
+    return AgentState(messages=[*history, {"role": "model", "parts": list(calls)}])
+
+
+def responses(update):
+    return [part["function_response"] for part in update["messages"][0]["parts"]]
+
+
+def fake_page_tool(delays, runs=None):
+    async def get_page_content(url):
+        if runs is not None:
+            runs.append(url)
+        await asyncio.sleep(delays.get(url, 0.05))
+        if "broken" in url:
+            raise RuntimeError("connection reset")
+        return ContentResult(content=f"page {url}", success=True, url=url)
+    return get_page_content
+
+
+def test_calls_run_concurrently_in_call_order(make_agent):
+    agent = make_agent()
+    urls = [f"https://example.com/{i}" for i in range(4)]
+    agent.async_tool_mapping["get_page_content"] = fake_page_tool({url: 0.3 - 0.05 * i for i, url in enumerate(urls)})
+
+    started = time.perf_counter()
+    update = asyncio.run(agent.ause_tool(tool_turn(*(call("get_page_content", url=url) for url in urls))))
+
+    assert time.perf_counter() - started < 0.6
+    assert [response["response"]["url"] for response in responses(update)] == urls
+
+
+def test_failed_and_timed_out_calls_do_not_affect_the_others(make_agent):
+    agent = make_agent(tool_timeout=0.3)
+    agent.async_tool_mapping["get_page_content"] = fake_page_tool({"https://slow.example/": 5})
+
+    started = time.perf_counter()
+    update = asyncio.run(agent.ause_tool(tool_turn(
+        call("get_page_content", url="https://a.example/"),
+        call("get_page_content", url="https://slow.example/"),
+        call("get_page_content", url="https://broken.example/"),
+        call("no_such_tool"),
+        call("get_page_content", url="https://b.example/"),
+    )))
+
+    assert time.perf_counter() - started < 1
+    results = [response["response"] for response in responses(update)]
+    assert results[0]["content"] == "page https://a.example/"
+    assert results[1]["success"] is False and "did not finish" in results[1]["content"]
+    assert results[2] == {"success": False, "content": "Error: connection reset"}
+    assert results[3]["success"] is False
+    assert results[4]["content"] == "page https://b.example/"
+
+
+def test_tool_call_keys_normalize_arguments():
+    from chat_history import tool_call_key
+
+    assert tool_call_key("get_page_content", {"url": "http://Example.com/a/?utm_source=x#top"}) == \
+        tool_call_key("get_page_content", {"url": "https://example.com/a"})
+    assert tool_call_key("search_duck_duck_go", {"query": "  Solar   Power ", "max_results": 5.0}) == \
+        tool_call_key("search_duck_duck_go", {"query": "solar power", "max_results": 5})
+    assert tool_call_key("get_wikipedia_page", {"title": "Solar_power"}) == \
+        tool_call_key("get_wikipedia_page", {"title": "Solar power"})
+    assert tool_call_key("get_page_content", {"url": "https://example.com/a"}) != \
+        tool_call_key("get_page_content", {"url": "https://example.com/b"})
+
+
+def test_repeated_calls_reuse_the_memoized_result(make_agent):
+    agent = make_agent()
+    runs = []
+    agent.async_tool_mapping["get_page_content"] = fake_page_tool({}, runs)
+    first = tool_turn(call("get_page_content", url="https://example.com/a"),
+                      call("get_page_content", url="https://EXAMPLE.com/a/"))
+    update = asyncio.run(agent.ause_tool(first))
+    first_responses = responses(update)
+    assert first_responses[1]["response"]["repeated_call"] is True
+    assert first_responses[1]["response"]["success"] is True
+
+    # Still in the conversation: a short reference
+    history = first.messages + update["messages"]
+    second = tool_turn(call("get_page_content", url="https://example.com/a"), history=history)
+    second.tool_results = update["tool_results"]
+    repeat = responses(asyncio.run(agent.ause_tool(second)))[0]["response"]
+    assert repeat["repeated_call"] is True
+
+    # No longer in the conversation (truncated or summarized): the full memoized result
+    third = tool_turn(call("get_page_content", url="https://example.com/a"))
+    third.tool_results = update["tool_results"]
+    full = responses(asyncio.run(agent.ause_tool(third)))[0]["response"]
+    assert full["content"] == "page https://example.com/a"
+
+    assert runs == ["https://example.com/a"]
+
+
+def test_failures_and_empty_searches_are_not_memoized(make_agent):
+    agent = make_agent()
+    searches = []
+
+    async def search_duck_duck_go(query, max_results=5):
+        searches.append(query)
+        return SearchResult(links=[])
+
+    agent.async_tool_mapping["search_duck_duck_go"] = search_duck_duck_go
+    agent.async_tool_mapping["get_page_content"] = fake_page_tool({})
+    turn = tool_turn(call("search_duck_duck_go", query="nothing here"),
+                     call("get_page_content", url="https://broken.example/"),
+                     call("get_page_content", url="https://broken.example/"))
+    update = asyncio.run(agent.ause_tool(turn))
+
+    assert update["tool_results"] == {}
+    # A repeat in the same turn refers to the failure and says so
+    assert responses(update)[2]["response"]["success"] is False
+
+    again = tool_turn(call("search_duck_duck_go", query="nothing here"), history=turn.messages + update["messages"])
+    again.tool_results = update["tool_results"]
+    asyncio.run(agent.ause_tool(again))
+    assert searches == ["nothing here", "nothing here"]
+
+
+def test_chat_returns_within_the_timeout_of_a_blocking_tool(make_agent, monkeypatch):
+    import tools
+
+    def search_duck_duck_go(query, max_results):
+        time.sleep(3)
+        return SearchResult(links=[])
+
+    monkeypatch.setattr(tools, "search_duck_duck_go", search_duck_duck_go)
+    agent = make_agent(context_cache="off", tool_timeout=0.3)
+    agent.model = FakeChatModel(reply=lambda contents: fake_response(
+        [{"text": "no results"}] if contents[-1]["role"] == "tool"
+        else [{"function_call": {"name": "search_duck_duck_go", "args": {"query": "solar"}}}]
+    ))
+
+    started = time.perf_counter()
+    assert agent.chat("Search for solar") == "no results"
+    assert time.perf_counter() - started < 1.5
@@ -0,0 +1,46 @@
+from wikipedia_api import WikipediaAPI
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+def test_search_follows_extract_continuation_before_stopping():
+    # Full extracts come one per response: the first response carries the extract of
+    # the first hit plus the generator offset, the second the extract of the other hit
+    responses = [
+        {
+            "continue": {"excontinue": 1, "gsroffset": 2, "continue": "gsroffset||info"},
+            "query": {"pages": [
+                {"pageid": 1, "title": "Alpha", "index": 1, "extract": "Alpha text"},
+                {"pageid": 2, "title": "Beta", "index": 2},
+            ]},
+        },
+        {
+            "continue": {"gsroffset": 2, "continue": "gsroffset||"},
+            "query": {"pages": [
+                {"pageid": 1, "title": "Alpha", "index": 1},
+                {"pageid": 2, "title": "Beta", "index": 2, "extract": "Beta text"},
+            ]},
+        },
+        {"query": {"pages": [{"pageid": 3, "title": "Gamma", "index": 3, "extract": "next batch"}]}},
+    ]
+    requests = []
+
+    def get(url, params):
+        requests.append(params)
+        return FakeResponse(responses[len(requests) - 1])
+
+    pages = WikipediaAPI(get).search("alpha", limit=2)
+
+    assert [(page.title, page.extract) for page in pages] == [("Alpha", "Alpha text"), ("Beta", "Beta text")]
+    # The extract continuation is followed, the generator's next batch is not
+    assert len(requests) == 2
+    assert requests[1]["excontinue"] == 1
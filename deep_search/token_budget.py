@@ -0,0 +1,264 @@
+"""
+This module keeps the report prompt within a token budget.
+
+Token counts come from a fast local estimator whose results are cached per text and
+whose scale is calibrated against the model's count_tokens API. The budget is shared
+fairly (max-min) first across queries, then across the sources of each query; a
+source that needs more than its share loses its lowest-scoring passages first, is
+then truncated, or is summarized when a summarizer is given.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from pydantic import BaseModel, Field
+
+# Upper bound for the whole report prompt, well below the model's input limit
+DEFAULT_MAX_PROMPT_TOKENS = int(os.getenv("RESEARCH_MAX_PROMPT_TOKENS", 100000))
+# How the lowest-value material is cut: "trim" or "summarize"
+DEFAULT_OVERFLOW = os.getenv("RESEARCH_CONTEXT_OVERFLOW", "trim")
+# Sources cut below this share of their size are summarized instead of trimmed
+SUMMARIZE_BELOW = 0.5
+# Smallest allocation worth keeping a source for
+MIN_SOURCE_TOKENS = 50
+# Weight of the latest count_tokens measurement in the calibration factor
+CALIBRATION_SMOOTHING = 0.5
+# Number of cached estimates; texts longer than CACHED_TEXT_CHARS are cached by digest,
+# so the cache never keeps whole prompts or pages alive
+ESTIMATE_CACHE_SIZE = 4096
+CACHED_TEXT_CHARS = 1024
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+
+_long_estimates: "OrderedDict[bytes, int]" = OrderedDict()
+_long_estimates_lock = threading.Lock()
+
+
+def _count_pieces(text: str) -> int:
+    # Words become about one token per 4 characters, punctuation one token each
+    return sum(1 + (len(piece) - 1) // 4 for piece in _PIECE.findall(text))
+
+
+_short_estimate = lru_cache(maxsize=ESTIMATE_CACHE_SIZE)(_count_pieces)
+
+
+def _raw_estimate(text: str) -> int:
+    if len(text) <= CACHED_TEXT_CHARS:
+        return _short_estimate(text)
+    key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    with _long_estimates_lock:
+        if key in _long_estimates:
+            _long_estimates.move_to_end(key)
+            return _long_estimates[key]
+    estimate = _count_pieces(text)
+    with _long_estimates_lock:
+        _long_estimates[key] = estimate
+        while len(_long_estimates) > ESTIMATE_CACHE_SIZE:
+            _long_estimates.popitem(last=False)
+    return estimate
+
+
+class TokenCounter:
+    """
+    Cached local token estimator calibrated against a model's count_tokens API.
+    """
+
+    def __init__(self, model=None):
+        """
+        Initialize the counter.
+
+        Args:
+            model: GenerativeModel whose count_tokens is used for calibration, if any
+        """
+        self.model = model
+        self.scale = 1.0
+        self.checks = 0
+
+    def estimate(self, text: str) -> int:
+        """
+        Estimate the number of tokens in a text without calling the API.
+        """
+        return math.ceil(_raw_estimate(text) * self.scale)
+
+    def count(self, text: str) -> Optional[int]:
+        """
+        Count the tokens of a text with the model's API and recalibrate the estimator.
+
+        Returns:
+            The exact count, or None if there is no model or the call fails
+        """
+        if self.model is None:
+            return None
+        try:
+            actual = self.model.count_tokens(text).total_tokens
+        except Exception as e:
+            logging.warning(f"count_tokens failed, keeping the local estimate: {e}")
+            return None
+        self.calibrate(text, actual)
+        return actual
+
+    def calibrate(self, text: str, actual: int):
+        """
+        Adjust the estimator's scale towards a known token count.
+        """
+        raw = _raw_estimate(text)
+        if raw and actual:
+            ratio = actual / raw
+            self.scale = ratio if not self.checks else (
+                CALIBRATION_SMOOTHING * ratio + (1 - CALIBRATION_SMOOTHING) * self.scale
+            )
+            self.checks += 1
+
+
+def allocate_fairly(demands: Dict[Hashable, int], budget: int) -> Dict[Hashable, int]:
+    """
+    Split a budget with max-min fairness: nobody gets more than they ask for, and what
+    small demands leave unused is shared among the larger ones.
+
+    Args:
+        demands: Tokens wanted per key
+        budget: Tokens available
+
+    Returns:
+        Tokens allocated per key
+    """
+    allocation = {key: 0 for key in demands}
+    remaining = dict(demands)
+    budget = max(0, budget)
+    while remaining and budget > 0:
+        share = budget // len(remaining)
+        satisfied = {key: want for key, want in remaining.items() if want <= share}
+        if not satisfied:
+            # Everyone wants more than the share: split evenly, the remainder in order
+            for position, key in enumerate(remaining):
+                allocation[key] += share + (1 if position < budget - share * len(remaining) else 0)
+            break
+        for key, want in satisfied.items():
+            allocation[key] += want
+            budget -= want
+            del remaining[key]
+    return allocation
+
+
+class ContextSource(BaseModel):
+    """
+    The material of one source in the report context.
+    """
+    url: str = Field(description="URL of the source")
+    queries: List[str] = Field(default_factory=list, description="Queries that surfaced the source")
+    passages: List[Dict[str, Any]] = Field(
+        default_factory=list,
+        description="Passages of the source ({text, score, position}) in position order"
+    )
+    summarized: bool = Field(default=False, description="Whether the text was replaced by a summary")
+
+
+class BudgetPlan(BaseModel):
+    """
+    The fitted context and the planned token usage.
+    """
+    sources: List[ContextSource] = Field(default_factory=list, description="Sources fitted to the budget")
+    budget: int = Field(description="Tokens available for the context")
+    requested_tokens: int = Field(description="Estimated tokens of all material before fitting")
+    planned_tokens: int = Field(description="Estimated tokens of the fitted material")
+    trimmed_tokens: int = Field(default=0, description="Estimated tokens cut from the material")
+    dropped_sources: int = Field(default=0, description="Sources left out entirely")
+    summarized_sources: int = Field(default=0, description="Sources replaced by a summary")
+
+
+def _truncate(text: str, tokens: int, counter: TokenCounter) -> str:
+    if counter.estimate(text) <= tokens:
+        return text
+    words = text.split()
+    # Estimate the cut from the average token density, then back off until it fits
+    keep = max(0, int(len(words) * tokens / max(1, counter.estimate(text))))
+    while keep > 0 and counter.estimate(" ".join(words[:keep]) + " ...") > tokens:
+        keep = int(keep * 0.9)
+    return " ".join(words[:keep]) + " ..." if keep else ""
+
+
+def _fit_source(source: ContextSource, tokens: int, counter: TokenCounter,
+                summarize: Optional[Callable[[str, int], str]]) -> ContextSource:
+    texts = [passage["text"] for passage in source.passages]
+    demand = sum(counter.estimate(text) for text in texts)
+    if demand <= tokens:
+        return source
+
+    if summarize and tokens < SUMMARIZE_BELOW * demand:
+        summary = summarize("\n".join(texts), tokens)
+        if summary:
+            summary = _truncate(summary, tokens, counter)
+            passage = {"text": summary, "score": max((p.get("score", 0.0) for p in source.passages), default=0.0),
+                       "position": 0}
+            return source.model_copy(update={"passages": [passage], "summarized": True})
+
+    # Drop the lowest-scoring passages until the rest fit
+    kept = sorted(source.passages, key=lambda passage: -passage.get("score", 0.0))
+    while len(kept) > 1 and sum(counter.estimate(p["text"]) for p in kept) > tokens:
+        kept.pop()
+    kept.sort(key=lambda passage: passage.get("position", 0))
+    if sum(counter.estimate(p["text"]) for p in kept) > tokens:
+        kept = [{**kept[0], "text": _truncate(kept[0]["text"], tokens, counter)}]
+    return source.model_copy(update={"passages": [p for p in kept if p["text"]]})
+
+
+def fit_to_budget(sources: List[ContextSource], budget: int, counter: TokenCounter,
+                  overhead: Callable[[ContextSource], int] = lambda source: 0,
+                  summarize: Optional[Callable[[str, int], str]] = None) -> BudgetPlan:
+    """
+    Fit the report material into a token budget.
+
+    The budget is first split fairly across queries (each source counts for the first
+    query that surfaced it), then across the sources of each query. Sources over their
+    allocation are summarized (when a summarizer is given and they would lose more than
+    half) or trimmed, dropping their lowest-scoring passages first.
+
+    Args:
+        sources: The report material in priority order
+        budget: Tokens available for the whole context
+        counter: Token counter used for the estimates
+        overhead: Tokens a source costs besides its passages (its header)
+        summarize: Optional function (text, max_tokens) -> summary
+
+    Returns:
+        The fitted sources and the planned usage
+    """
+    demands = {
+        i: overhead(source) + sum(counter.estimate(p["text"]) for p in source.passages)
+        for i, source in enumerate(sources)
+    }
+    requested = sum(demands.values())
+
+    groups: Dict[str, List[int]] = {}
+    for i, source in enumerate(sources):
+        groups.setdefault(source.queries[0] if source.queries else "", []).append(i)
+    group_budgets = allocate_fairly({query: sum(demands[i] for i in members) for query, members in groups.items()}, budget)
+
+    allocation: Dict[int, int] = {}
+    for query, members in groups.items():
+        allocation.update(allocate_fairly({i: demands[i] for i in members}, group_budgets[query]))
+
+    plan = BudgetPlan(budget=budget, requested_tokens=requested, planned_tokens=0)
+    for i, source in enumerate(sources):
+        tokens = allocation[i] - overhead(source)
+        if tokens < min(MIN_SOURCE_TOKENS, demands[i] - overhead(source)):
+            plan.dropped_sources += 1
+            continue
+        fitted = _fit_source(source, tokens, counter, summarize)
+        if not fitted.passages:
+            plan.dropped_sources += 1
+            continue
+        plan.summarized_sources += fitted.summarized
+        plan.sources.append(fitted)
+        plan.planned_tokens += overhead(fitted) + sum(counter.estimate(p["text"]) for p in fitted.passages)
+
+    plan.trimmed_tokens = max(0, requested - plan.planned_tokens)
+    return plan
@@ -3,23 +3,518 @@ This module contains all the tools used by the research agent.
 Each tool is defined as a function that can be used by the agent.
 """
 
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Callable
 from pydantic import BaseModel, Field
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
 import re
 from duckduckgo_search import DDGS
 import logging
 from urllib.parse import urlparse
 import time
+import os
+import socket
+import threading
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from scheduler import DUCKDUCKGO, WIKIPEDIA
+from extractors import get_extractor
+from wikipedia_api import WikipediaAPI, article_url
+from wikipedia_index import WikipediaIndex, DEFAULT_INDEX_DIR
+from cache import (
+    PageCache,
+    TTLCache,
+    LLMCache,
+    CachedResponse,
+    llm_cache_key,
+    normalize_query,
+    DEFAULT_CACHE_DIR,
+    DEFAULT_TTL,
+    DEFAULT_MAX_BYTES,
+    DEFAULT_SEARCH_TTL,
+    DEFAULT_SEARCH_MAX_ENTRIES,
+    DEFAULT_LLM_CACHE_DIR,
+    DEFAULT_LLM_TTL,
+    DEFAULT_LLM_MAX_BYTES
+)
 
 # Constants for the tools
 MAX_LINKS_PER_SEARCH = 5
+MAX_WIKIPEDIA_RESULTS = 3
 MAX_CONTENT_LENGTH = 4000
+# Pages announcing a larger body are skipped; bodies are only read up to MAX_DOWNLOAD_BYTES
+MAX_PAGE_BYTES = int(os.getenv("RESEARCH_MAX_PAGE_BYTES", 10 * 1024 * 1024))
+MAX_DOWNLOAD_BYTES = int(os.getenv("RESEARCH_MAX_DOWNLOAD_BYTES", 1024 * 1024))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36'
 }
 
+# Constants for the shared HTTP client
+HTTP_POOL_SIZE = 20
+HTTP_TIMEOUT = 15
+DNS_CACHE_TTL = 300
+DNS_CACHE_MAX_ENTRIES = 1024
+USE_HTTP2 = os.getenv("RESEARCH_HTTP2", "").lower() in ("1", "true", "yes")
+
+# Threads running the blocking tool and I/O calls made from async code
+BLOCKING_WORKERS = int(os.getenv("RESEARCH_BLOCKING_WORKERS", 32))
+
+# Constants for the page cache
+PAGE_CACHE_ENABLED = os.getenv("RESEARCH_PAGE_CACHE", "1").lower() not in ("0", "false", "no")
+PAGE_CACHE_DIR = os.getenv("RESEARCH_PAGE_CACHE_DIR", DEFAULT_CACHE_DIR)
+PAGE_CACHE_TTL = float(os.getenv("RESEARCH_PAGE_CACHE_TTL", DEFAULT_TTL))
+PAGE_CACHE_MAX_BYTES = int(os.getenv("RESEARCH_PAGE_CACHE_MAX_MB", DEFAULT_MAX_BYTES // (1024 * 1024))) * 1024 * 1024
+
+# Constants for the search result cache
+SEARCH_CACHE_TTL = float(os.getenv("RESEARCH_SEARCH_CACHE_TTL", DEFAULT_SEARCH_TTL))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("RESEARCH_SEARCH_CACHE_MAX_ENTRIES", DEFAULT_SEARCH_MAX_ENTRIES))
+
+# Constants for the LLM response cache
+LLM_CACHE_ENABLED = os.getenv("RESEARCH_LLM_CACHE", "1").lower() not in ("0", "false", "no")
+LLM_CACHE_DIR = os.getenv("RESEARCH_LLM_CACHE_DIR", DEFAULT_LLM_CACHE_DIR)
+LLM_CACHE_TTL = float(os.getenv("RESEARCH_LLM_CACHE_TTL", DEFAULT_LLM_TTL))
+LLM_CACHE_MAX_BYTES = int(os.getenv("RESEARCH_LLM_CACHE_MAX_MB", DEFAULT_LLM_MAX_BYTES // (1024 * 1024))) * 1024 * 1024
+
+# Constants for Wikipedia: "api" batches MediaWiki API requests, "local" reads an index
+# built from a dump (see wikipedia_index.py), "library" uses the wikipedia package
+WIKIPEDIA_BACKEND = os.getenv("RESEARCH_WIKIPEDIA_BACKEND", "api").lower()
+WIKIPEDIA_INDEX_DIR = os.getenv("RESEARCH_WIKIPEDIA_INDEX", DEFAULT_INDEX_DIR)
+WIKIPEDIA_INTRO_ONLY = os.getenv("RESEARCH_WIKIPEDIA_INTRO_ONLY", "").lower() in ("1", "true", "yes")
+
+# Search results shared by the research workflow and the chat tool calls
+search_cache = TTLCache(ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_MAX_ENTRIES)
+
+def search_cache_key(provider: str, query: str, max_results: int) -> tuple:
+    """
+    Build the search cache key for a provider ("duckduckgo" or "wikipedia") and query.
+    """
+    return (provider, normalize_query(query), max_results)
+
+# Blocking work from async code. It runs on a dedicated pool rather than the event loop's
+# default executor: asyncio.run waits for the default executor's threads when it closes
+# the loop, so a call abandoned on a timeout would still hold up the sync wrappers.
+_blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """
+    Run a blocking call on the shared worker pool without blocking the event loop.
+    Like asyncio.to_thread, the call sees the caller's context variables. Cancelling
+    the await abandons the call; the worker thread finishes it in the background.
+    
+    Args:
+        func: The blocking function
+        *args: Its positional arguments
+        **kwargs: Its keyword arguments
+        
+    Returns:
+        The function's result
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_blocking_executor, functools.partial(context.run, func, *args, **kwargs))
+
+def run_sync(coroutine) -> Any:
+    """
+    Run a coroutine from synchronous code, on a new event loop. Blocking work in the
+    coroutine goes through run_blocking, so closing the loop never waits for a call
+    that was abandoned on a timeout.
+    
+    Args:
+        coroutine: The coroutine to run
+        
+    Returns:
+        The coroutine's result
+    """
+    return asyncio.run(coroutine)
+
+# Shared HTTP client layer
+class DnsCache:
+    """
+    Bounded cache of resolved addresses, used only by the connections of one HttpClient.
+    """
+    def __init__(self, ttl: float = DNS_CACHE_TTL, max_entries: int = DNS_CACHE_MAX_ENTRIES):
+        self._cache = TTLCache(ttl=ttl, max_entries=max_entries)
+
+    def resolve(self, host: str, port: int) -> List[str]:
+        """
+        Get the addresses of a host, resolving it only when the cached answer is missing or expired.
+        """
+        addresses = self._cache.get((host, port))
+        if addresses is None:
+            infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+            addresses = list(dict.fromkeys(info[4][0] for info in infos))
+            if addresses:
+                self._cache.put((host, port), addresses)
+        return addresses
+
+class _CachedDnsConnectionMixin:
+    """
+    Connects to the addresses in the class's DNS cache instead of resolving the host
+    on every new connection. TLS still verifies and sends SNI for the real host name.
+    """
+    dns_cache: DnsCache = None
+
+    def _new_conn(self):
+        host = self._dns_host
+        try:
+            addresses = self.dns_cache.resolve(host, self.port)
+        except OSError:
+            # Let the normal connection path report the resolution error
+            return super()._new_conn()
+        if not addresses:
+            return super()._new_conn()
+        error = None
+        try:
+            for address in addresses:
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except (NewConnectionError, ConnectTimeoutError) as e:
+                    error = e
+        finally:
+            self._dns_host = host
+        raise error
+
+class _CachedDnsAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connection pools connect through a DNS cache.
+    """
+    def __init__(self, dns_cache: DnsCache, **kwargs):
+        http_connection = type("CachedDnsHTTPConnection", (_CachedDnsConnectionMixin, HTTPConnection), {"dns_cache": dns_cache})
+        https_connection = type("CachedDnsHTTPSConnection", (_CachedDnsConnectionMixin, HTTPSConnection), {"dns_cache": dns_cache})
+        self._pool_classes = {
+            "http": type("CachedDnsHTTPConnectionPool", (HTTPConnectionPool,), {"ConnectionCls": http_connection}),
+            "https": type("CachedDnsHTTPSConnectionPool", (HTTPSConnectionPool,), {"ConnectionCls": https_connection}),
+        }
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self._pool_classes
+
+class _Http2Response:
+    """
+    Wraps an httpx response so callers can treat it like a requests.Response.
+    """
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+
+    @property
+    def content(self) -> bytes:
+        return self._response.read()
+
+    @property
+    def text(self) -> str:
+        self._response.read()
+        return self._response.text
+
+    def json(self):
+        self._response.read()
+        return self._response.json()
+
+    def iter_content(self, chunk_size: int = 8192):
+        return self._response.iter_bytes(chunk_size)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+    def close(self):
+        self._response.close()
+
+class HttpClient:
+    """
+    Shared HTTP client with connection pooling, keep-alive, a DNS cache and optional HTTP/2.
+    
+    HTTP/1.1 requests go through a pooled requests.Session. When HTTP/2 is enabled and
+    httpx (with h2) is installed, requests are multiplexed through an httpx.Client instead;
+    its responses and errors are adapted to the requests API so callers don't change.
+    """
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, http2: bool = USE_HTTP2):
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        # Pooled and new connections of this session skip repeated DNS resolution
+        self.dns_cache = DnsCache()
+        adapter = _CachedDnsAdapter(self.dns_cache, pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        
+        self.http2_client = None
+        if http2:
+            try:
+                import httpx
+                self.http2_client = httpx.Client(
+                    http2=True,
+                    headers=HEADERS,
+                    follow_redirects=True,
+                    limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+                )
+            except ImportError:
+                logging.warning("HTTP/2 requested but httpx[http2] is not installed; using HTTP/1.1")
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None,
+            timeout: float = HTTP_TIMEOUT, stream: bool = False, **kwargs):
+        """
+        Send a GET request through the shared connection pool.
+        
+        Args:
+            url: The URL to request
+            params: Optional query parameters
+            headers: Optional extra headers
+            timeout: Request timeout in seconds
+            stream: Whether to defer downloading the body
+            
+        Returns:
+            A requests.Response (or a compatible wrapper when HTTP/2 is used)
+        """
+        if self.http2_client is None:
+            return self.session.get(url, params=params, headers=headers, timeout=timeout, stream=stream, **kwargs)
+        
+        import httpx
+        try:
+            request = self.http2_client.build_request("GET", url, params=params, headers=headers, timeout=timeout)
+            response = self.http2_client.send(request, stream=stream)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e)) from e
+        except httpx.HTTPError as e:
+            raise requests.exceptions.RequestException(str(e)) from e
+        return _Http2Response(response)
+
+_http_client: Optional[HttpClient] = None
+_http_client_lock = threading.Lock()
+
+def get_http_client() -> HttpClient:
+    """
+    Get the HTTP client shared by all tools, creating it on first use.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HttpClient()
+        return _http_client
+
+_ddgs: Optional[DDGS] = None
+_ddgs_lock = threading.Lock()
+
+def _get_ddgs() -> DDGS:
+    """
+    Get the DuckDuckGo client shared by all searches, creating it on first use.
+    """
+    global _ddgs
+    if _ddgs is None:
+        _ddgs = DDGS(headers=HEADERS, timeout=20)
+    return _ddgs
+
+_page_cache: Optional[PageCache] = None
+_page_cache_lock = threading.Lock()
+
+def configure_page_cache(
+    enabled: bool = True,
+    cache_dir: str = PAGE_CACHE_DIR,
+    ttl: float = PAGE_CACHE_TTL,
+    max_bytes: int = PAGE_CACHE_MAX_BYTES
+):
+    """
+    Replace the page cache shared by get_page_content and get_wikipedia_page.
+    
+    Args:
+        enabled: Whether pages should be cached at all
+        cache_dir: Directory for the cache index and raw bodies
+        ttl: Seconds after which an entry is revalidated
+        max_bytes: Size limit for the stored raw bodies
+    """
+    global _page_cache, PAGE_CACHE_ENABLED
+    with _page_cache_lock:
+        PAGE_CACHE_ENABLED = enabled
+        _page_cache = PageCache(cache_dir=cache_dir, ttl=ttl, max_bytes=max_bytes) if enabled else None
+
+def get_page_cache() -> Optional[PageCache]:
+    """
+    Get the page cache shared by the tools, creating it on first use.
+    
+    Returns:
+        The cache, or None if caching is disabled or the cache directory is unusable
+    """
+    global _page_cache, PAGE_CACHE_ENABLED
+    with _page_cache_lock:
+        if _page_cache is None and PAGE_CACHE_ENABLED:
+            try:
+                _page_cache = PageCache(cache_dir=PAGE_CACHE_DIR, ttl=PAGE_CACHE_TTL, max_bytes=PAGE_CACHE_MAX_BYTES)
+            except Exception as e:
+                logging.warning(f"Page cache disabled: {e}")
+                PAGE_CACHE_ENABLED = False
+        return _page_cache
+
+_llm_cache: Optional[LLMCache] = None
+_llm_cache_lock = threading.Lock()
+
+def configure_llm_cache(
+    enabled: bool = True,
+    cache_dir: str = LLM_CACHE_DIR,
+    ttl: float = LLM_CACHE_TTL,
+    max_bytes: int = LLM_CACHE_MAX_BYTES
+):
+    """
+    Replace the LLM response cache shared by query generation and report writing.
+    
+    Args:
+        enabled: Whether responses should be cached at all
+        cache_dir: Directory for the cache database
+        ttl: Seconds a response stays valid
+        max_bytes: Size limit for the stored responses
+    """
+    global _llm_cache, LLM_CACHE_ENABLED
+    with _llm_cache_lock:
+        LLM_CACHE_ENABLED = enabled
+        _llm_cache = LLMCache(cache_dir=cache_dir, ttl=ttl, max_bytes=max_bytes) if enabled else None
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """
+    Get the LLM response cache, creating it on first use.
+    
+    Returns:
+        The cache, or None if caching is disabled or the cache directory is unusable
+    """
+    global _llm_cache, LLM_CACHE_ENABLED
+    with _llm_cache_lock:
+        if _llm_cache is None and LLM_CACHE_ENABLED:
+            try:
+                _llm_cache = LLMCache(cache_dir=LLM_CACHE_DIR, ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES)
+            except Exception as e:
+                logging.warning(f"LLM cache disabled: {e}")
+                LLM_CACHE_ENABLED = False
+        return _llm_cache
+
+def model_cache_key(model, prompt: Any, generation_config: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build the LLM cache key of a call to a GenerativeModel.
+    
+    Args:
+        model: The model that is called
+        prompt: The prompt
+        generation_config: The generation settings of the call
+        
+    Returns:
+        The cache key
+    """
+    instruction = getattr(model, "_system_instruction", None)
+    instruction_text = "".join(part.text for part in instruction.parts) if instruction else ""
+    return llm_cache_key(getattr(model, "model_name", ""), instruction_text, prompt, generation_config)
+
+def _response_usage(response) -> Dict[str, Optional[int]]:
+    usage = getattr(response, "usage_metadata", None)
+    return {
+        "prompt_tokens": usage.prompt_token_count if usage else None,
+        "output_tokens": usage.candidates_token_count if usage else None
+    }
+
+def generate_cached(model, prompt: str, site: str, generation_config: Optional[Dict[str, Any]] = None,
+                    cache_if: Optional[Callable[[str], bool]] = None) -> CachedResponse:
+    """
+    Call a model, answering identical calls from the LLM cache.
+    
+    Args:
+        model: The model to call
+        prompt: The prompt
+        site: Name of the call site, for the cache metrics
+        generation_config: Generation settings of the call
+        cache_if: Only responses whose text passes this check are cached
+        
+    Returns:
+        The response text and usage
+    """
+    cache = get_llm_cache()
+    key = model_cache_key(model, prompt, generation_config)
+    if cache:
+        cached = cache.get(key, site)
+        if cached is not None:
+            return cached
+    
+    started = time.perf_counter()
+    response = model.generate_content(prompt, generation_config=generation_config)
+    result = CachedResponse(text=response.text, seconds=time.perf_counter() - started, **_response_usage(response))
+    if cache and (cache_if is None or cache_if(result.text)):
+        cache.put(key, result, site)
+    return result
+
+async def agenerate_cached(model, prompt: str, site: str, generation_config: Optional[Dict[str, Any]] = None,
+                           cache_if: Optional[Callable[[str], bool]] = None) -> CachedResponse:
+    """
+    Call a model with the async client, answering identical calls from the LLM cache.
+    
+    Args:
+        model: The model to call
+        prompt: The prompt
+        site: Name of the call site, for the cache metrics
+        generation_config: Generation settings of the call
+        cache_if: Only responses whose text passes this check are cached
+        
+    Returns:
+        The response text and usage
+    """
+    cache = get_llm_cache()
+    key = model_cache_key(model, prompt, generation_config)
+    if cache:
+        cached = await run_blocking(cache.get, key, site)
+        if cached is not None:
+            return cached
+    
+    started = time.perf_counter()
+    response = await model.generate_content_async(prompt, generation_config=generation_config)
+    result = CachedResponse(text=response.text, seconds=time.perf_counter() - started, **_response_usage(response))
+    if cache and (cache_if is None or cache_if(result.text)):
+        await run_blocking(cache.put, key, result, site)
+    return result
+
+class _WikipediaRequests:
+    """
+    Stands in for the `requests` module inside the wikipedia package so it uses the shared client.
+    """
+    exceptions = requests.exceptions
+
+    @staticmethod
+    def get(url, **kwargs):
+        return get_http_client().get(url, **kwargs)
+
+_wikipedia_client = None
+_wikipedia_client_lock = threading.Lock()
+
+def get_wikipedia_client():
+    """
+    Get the Wikipedia client shared by the Wikipedia tools, creating it on first use.
+    
+    Returns:
+        The local WikipediaIndex for the "local" backend, otherwise the MediaWiki WikipediaAPI
+    """
+    global _wikipedia_client
+    with _wikipedia_client_lock:
+        if _wikipedia_client is None:
+            if WIKIPEDIA_BACKEND == "local":
+                _wikipedia_client = WikipediaIndex(WIKIPEDIA_INDEX_DIR)
+            else:
+                _wikipedia_client = WikipediaAPI(get_http_client().get, intro_only=WIKIPEDIA_INTRO_ONLY)
+        return _wikipedia_client
+
+def _get_wikipedia():
+    """
+    Import the wikipedia package with its HTTP calls routed through the shared client.
+    """
+    import wikipedia
+    import wikipedia.wikipedia as wikipedia_module
+    if not isinstance(wikipedia_module.requests, _WikipediaRequests):
+        wikipedia_module.requests = _WikipediaRequests()
+    return wikipedia
+
 # Response models for each tool
 class SearchResult(BaseModel):
     links: List[str] = Field(description="List of relevant web links")
@@ -44,143 +539,254 @@ def search_duck_duck_go(query: str, max_results: int = MAX_LINKS_PER_SEARCH) ->
     Returns:
         A SearchResult containing links
     """
+    cache_key = search_cache_key(DUCKDUCKGO, query, max_results)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return SearchResult(links=list(cached))
+    
     links = []
     try:
-        with DDGS(headers=HEADERS, timeout=20) as ddgs:
-            results = ddgs.text(query, region='wt-wt', safesearch='moderate', max_results=max_results + 5)
-            count = 0
-            
-            if results:
-                for result in results:
-                    if 'href' in result:
-                        href_lower = result['href'].lower()
-                        # Filter out file types we don't want
-                        if not any(ext in href_lower for ext in ['.pdf', '.doc', '.docx', '.ppt', '.pptx', '.xls', '.xlsx', '.zip', '.rar', '.jpg', '.png', '.gif', '.svg']):
-                            # Check if the URL is valid
-                            try:
-                                parsed = urlparse(result['href'])
-                                if parsed.scheme and parsed.netloc:
-                                    links.append(result['href'])
-                                    count += 1
-                            except Exception:
-                                continue
-                            
-                    if count >= max_results:
-                        break
+        # The shared client keeps its session alive between queries; it is not thread-safe
+        with _ddgs_lock:
+            results = _get_ddgs().text(query, region='wt-wt', safesearch='moderate', max_results=max_results + 5)
+        count = 0
+        
+        if results:
+            for result in results:
+                if 'href' in result:
+                    href_lower = result['href'].lower()
+                    # Filter out file types we don't want
+                    if not any(ext in href_lower for ext in ['.pdf', '.doc', '.docx', '.ppt', '.pptx', '.xls', '.xlsx', '.zip', '.rar', '.jpg', '.png', '.gif', '.svg']):
+                        # Check if the URL is valid
+                        try:
+                            parsed = urlparse(result['href'])
+                            if parsed.scheme and parsed.netloc:
+                                links.append(result['href'])
+                                count += 1
+                        except Exception:
+                            continue
                         
+                if count >= max_results:
+                    break
+                    
     except Exception as e:
         logging.error(f"Error during DuckDuckGo search: {e}")
+        # Start with a fresh session next time in case this one is broken
+        global _ddgs
+        with _ddgs_lock:
+            _ddgs = None
     
+    # Only cache real answers, so a failed search is retried next time
+    if links:
+        search_cache.put(cache_key, tuple(links))
     return SearchResult(links=links)
 
-def get_page_content(url: str, max_length: int = MAX_CONTENT_LENGTH) -> ContentResult:
+def extract_html_content(html: bytes, url: str, max_length: int = MAX_CONTENT_LENGTH,
+                         extractor: Optional[str] = None) -> ContentResult:
     """
-    Fetch and extract content from a webpage.
+    Extract the readable text from an HTML document.
     
     Args:
-        url: The URL to fetch content from
+        html: The raw HTML of the page
+        url: The URL the page was fetched from
         max_length: Maximum length of content to return
+        extractor: Extraction backend name ("soup" or "lxml"); defaults to RESEARCH_EXTRACTOR
         
     Returns:
         A ContentResult containing the extracted content
     """
-    try:
-        response = requests.get(url, headers=HEADERS, timeout=15)
-        response.raise_for_status()
-        
-        content_type = response.headers.get('content-type', '').lower()
-        if 'html' not in content_type:
-            return ContentResult(
-                content=f"Cannot extract content: not HTML (content-type: {content_type})",
-                success=False,
-                url=url
-            )
-        
-        soup = BeautifulSoup(response.content, 'lxml')
-        
-        # Remove unwanted elements
-        for element in soup(["script", "style", "nav", "footer", "aside", "header", "form", "button", "noscript"]):
-            element.decompose()
-        
-        # Try to find main content first
-        main_content_tags = ['article', 'main', '[role="main"]']
-        main_content = None
-        for tag in main_content_tags:
-            try:
-                main_content = soup.select_one(tag)
-                if main_content:
-                    break
-            except Exception:
-                continue
-        
-        text_parts = []
-        if main_content:
-            tags_to_extract = main_content.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'li', 'td', 'th'], recursive=True)
-            for tag in tags_to_extract:
-                text = tag.get_text(separator=' ', strip=True)
-                if len(text) > 25 and not text.lower().startswith(('copyright', 'related posts', 'leave a reply')):
-                    text_parts.append(text)
-        else:
-            # Fallback to all paragraphs
-            paragraphs = soup.find_all('p')
-            for p in paragraphs:
-                text = p.get_text(separator=' ', strip=True)
-                if len(text) > 25:
-                    text_parts.append(text)
-        
-        if not text_parts:
-            return ContentResult(
-                content=f"No significant content found on the page.",
-                success=False,
-                url=url
-            )
+    text_parts = get_extractor(extractor).extract_blocks(html, max_length)
+    
+    if not text_parts:
+        return ContentResult(
+            content=f"No significant content found on the page.",
+            success=False,
+            url=url
+        )
+    
+    full_text = ' '.join(text_parts)
+    full_text = re.sub(r'\s{2,}', ' ', full_text).strip()
+    
+    # Add URL as source at the beginning
+    content_with_source = f"Content from: {url}\n\n{full_text[:max_length]}"
+    if len(full_text) > max_length:
+        content_with_source += "..."
+    
+    return ContentResult(
+        content=content_with_source,
+        success=True,
+        url=url
+    )
+
+class DownloadResult(BaseModel):
+    """
+    Outcome of the network half of get_page_content.
+    
+    Either `result` is final (cache hit or error), or `body` still has to be parsed
+    with extract_html_content and the outcome stored with store_page_content.
+    """
+    url: str
+    body: Optional[bytes] = None
+    result: Optional[ContentResult] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    from_cache: bool = False
+
+def _read_capped(response, max_bytes: int) -> bytes:
+    """
+    Read a streamed response body, stopping after max_bytes.
+    """
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            break
+    return b''.join(chunks)[:max_bytes]
+
+def _from_cache(cache: PageCache, cached, url: str, max_length: int) -> Optional[DownloadResult]:
+    """
+    Serve a cache entry, handing back the raw body for re-extraction if the entry
+    was extracted with a different max_length.
+    """
+    if cached.max_length == max_length:
+        return DownloadResult(url=url, result=ContentResult(content=cached.content, success=True, url=url))
+    raw = cache.read_raw(cached)
+    if raw is None:
+        return None
+    return DownloadResult(url=url, body=raw, from_cache=True)
+
+def download_page(url: str, max_length: int = MAX_CONTENT_LENGTH) -> DownloadResult:
+    """
+    Download a webpage (or serve it from the page cache) without parsing it.
+    
+    Args:
+        url: The URL to fetch content from
+        max_length: Maximum length of content that will be extracted
         
-        full_text = ' '.join(text_parts)
-        full_text = re.sub(r'\s{2,}', ' ', full_text).strip()
+    Returns:
+        A DownloadResult with either a final result or a body to parse
+    """
+    try:
+        # Serve fresh entries from the page cache, and revalidate stale ones
+        cache = get_page_cache()
+        cached = cache.get(url) if cache else None
+        if cached and cached.is_fresh(cache.ttl):
+            download = _from_cache(cache, cached, url, max_length)
+            if download:
+                return download
         
-        # Add URL as source at the beginning
-        content_with_source = f"Content from: {url}\n\n{full_text[:max_length]}"
-        if len(full_text) > max_length:
-            content_with_source += "..."
+        # Stream the body so non-HTML and oversized pages are rejected from the headers alone
+        response = get_http_client().get(url, headers=cached.conditional_headers() if cached else None, stream=True)
+        try:
+            if response.status_code == 304 and cached:
+                download = _from_cache(cache, cached, url, max_length)
+                if download:
+                    cache.touch(url)
+                    return download
+                # The cached body is gone, so fetch the page unconditionally
+                response.close()
+                response = get_http_client().get(url, stream=True)
+            response.raise_for_status()
+            
+            content_type = response.headers.get('content-type', '').lower()
+            if 'html' not in content_type:
+                return DownloadResult(url=url, result=ContentResult(
+                    content=f"Cannot extract content: not HTML (content-type: {content_type})",
+                    success=False,
+                    url=url
+                ))
+            
+            content_length = response.headers.get('content-length', '')
+            if content_length.isdigit() and int(content_length) > MAX_PAGE_BYTES:
+                return DownloadResult(url=url, result=ContentResult(
+                    content=f"Cannot extract content: page too large ({content_length} bytes)",
+                    success=False,
+                    url=url
+                ))
+            
+            body = _read_capped(response, MAX_DOWNLOAD_BYTES)
+        finally:
+            response.close()
         
-        return ContentResult(
-            content=content_with_source,
-            success=True,
-            url=url
+        return DownloadResult(
+            url=url,
+            body=body,
+            etag=response.headers.get('etag'),
+            last_modified=response.headers.get('last-modified')
         )
         
     except requests.exceptions.Timeout:
-        return ContentResult(
+        return DownloadResult(url=url, result=ContentResult(
             content=f"Timeout error when fetching the page.",
             success=False,
             url=url
-        )
+        ))
     except requests.exceptions.RequestException as e:
-        return ContentResult(
+        return DownloadResult(url=url, result=ContentResult(
             content=f"Error fetching the page: {str(e)}",
             success=False,
             url=url
-        )
+        ))
     except Exception as e:
-        return ContentResult(
+        return DownloadResult(url=url, result=ContentResult(
             content=f"Unexpected error processing the page: {str(e)}",
             success=False,
             url=url
+        ))
+
+def store_page_content(download: DownloadResult, result: ContentResult, max_length: int = MAX_CONTENT_LENGTH):
+    """
+    Store a freshly parsed page in the page cache.
+    
+    Args:
+        download: The DownloadResult the page was parsed from
+        result: The ContentResult extracted from download.body
+        max_length: The max_length the content was extracted with
+    """
+    cache = get_page_cache()
+    if cache and result.success and not download.from_cache:
+        cache.put(
+            download.url,
+            raw=download.body,
+            content=result.content,
+            max_length=max_length,
+            etag=download.etag,
+            last_modified=download.last_modified
         )
 
-def generate_search_queries(query: str, model, num_queries: int = 5) -> GeneratedQueriesResult:
+def get_page_content(url: str, max_length: int = MAX_CONTENT_LENGTH) -> ContentResult:
     """
-    Generate related search queries using an LLM.
+    Fetch and extract content from a webpage.
     
     Args:
-        query: The original user query
-        model: The LLM model to use for generation
-        num_queries: Number of queries to generate
+        url: The URL to fetch content from
+        max_length: Maximum length of content to return
         
     Returns:
-        A GeneratedQueriesResult containing the list of generated queries
+        A ContentResult containing the extracted content
+    """
+    download = download_page(url, max_length)
+    if download.result is not None:
+        return download.result
+    
+    try:
+        result = extract_html_content(download.body, url, max_length)
+    except Exception as e:
+        return ContentResult(
+            content=f"Unexpected error processing the page: {str(e)}",
+            success=False,
+            url=url
+        )
+    store_page_content(download, result, max_length)
+    return result
+
+def _search_queries_prompt(query: str, num_queries: int) -> str:
     """
-    prompt = f"""
+    Build the prompt asking the LLM for related search queries.
+    """
+    return f"""
     Given the user's query: "{query}"
     Generate a list of {num_queries} specific and diverse search engine queries that, when researched individually, 
     would help provide a comprehensive and well-structured explanation of the original query. 
@@ -190,38 +796,100 @@ def generate_search_queries(query: str, model, num_queries: int = 5) -> Generate
     Example format:
     ["query about definition", "query about applications", "query about examples", "query about benefits", "query about related concepts"]
     """
+
+def _load_query_list(response_text: str) -> Optional[List[str]]:
+    """
+    Load the LLM's JSON list of queries.
     
-    try:
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
-        
-        # Clean up response to extract JSON
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        elif response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        
-        response_text = response_text.strip()
+    Returns:
+        The queries, or None if the JSON is not a list of strings
         
-        # Try to parse as JSON
-        import json
-        queries_list = json.loads(response_text)
+    Raises:
+        ValueError: If the response is not valid JSON
+    """
+    response_text = response_text.strip()
+    
+    # Clean up response to extract JSON
+    if response_text.startswith("```json"):
+        response_text = response_text[7:]
+    elif response_text.startswith("```"):
+        response_text = response_text[3:]
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]
+    
+    response_text = response_text.strip()
+    
+    # Try to parse as JSON
+    import json
+    queries_list = json.loads(response_text)
+    
+    # Validate
+    if isinstance(queries_list, list) and all(isinstance(item, str) for item in queries_list):
+        return queries_list
+    return None
+
+def _is_query_list(response_text: str) -> bool:
+    """
+    Whether a response is a valid list of queries (only those are worth caching).
+    """
+    try:
+        return _load_query_list(response_text) is not None
+    except ValueError:
+        return False
+
+def _parse_search_queries(response_text: str, query: str, num_queries: int) -> GeneratedQueriesResult:
+    """
+    Parse the LLM's JSON list of queries, falling back to the original query.
+    """
+    queries_list = _load_query_list(response_text)
+    if queries_list is not None:
+        return GeneratedQueriesResult(queries=queries_list[:num_queries])
+    else:
+        # Fallback if JSON structure is not as expected
+        logging.warning("LLM response was not a valid list of strings")
+        return GeneratedQueriesResult(queries=[query])  # Return original query as fallback
+
+def generate_search_queries(query: str, model, num_queries: int = 5) -> GeneratedQueriesResult:
+    """
+    Generate related search queries using an LLM.
+    
+    Args:
+        query: The original user query
+        model: The LLM model to use for generation
+        num_queries: Number of queries to generate
         
-        # Validate and filter
-        if isinstance(queries_list, list) and all(isinstance(item, str) for item in queries_list):
-            return GeneratedQueriesResult(queries=queries_list[:num_queries])
-        else:
-            # Fallback if JSON structure is not as expected
-            logging.warning("LLM response was not a valid list of strings")
-            return GeneratedQueriesResult(queries=[query])  # Return original query as fallback
+    Returns:
+        A GeneratedQueriesResult containing the list of generated queries
+    """
+    try:
+        response = generate_cached(model, _search_queries_prompt(query, num_queries), "generate_queries",
+                                   cache_if=_is_query_list)
+        return _parse_search_queries(response.text, query, num_queries)
+    except Exception as e:
+        logging.error(f"Error generating search queries: {e}")
+        return GeneratedQueriesResult(queries=[query])  # Return original query as fallback
+
+async def agenerate_search_queries(query: str, model, num_queries: int = 5) -> GeneratedQueriesResult:
+    """
+    Generate related search queries using an LLM, without blocking the event loop.
     
+    Args:
+        query: The original user query
+        model: The LLM model to use for generation
+        num_queries: Number of queries to generate
+        
+    Returns:
+        A GeneratedQueriesResult containing the list of generated queries
+    """
+    try:
+        response = await agenerate_cached(model, _search_queries_prompt(query, num_queries), "generate_queries",
+                                          cache_if=_is_query_list)
+        return _parse_search_queries(response.text, query, num_queries)
     except Exception as e:
         logging.error(f"Error generating search queries: {e}")
         return GeneratedQueriesResult(queries=[query])  # Return original query as fallback
 
-def search_wikipedia(query: str, max_results: int = 3) -> SearchResult:
+def search_wikipedia(query: str, max_results: int = MAX_WIKIPEDIA_RESULTS) -> SearchResult:
     """
     Search Wikipedia for relevant articles.
     
@@ -232,38 +900,218 @@ def search_wikipedia(query: str, max_results: int = 3) -> SearchResult:
     Returns:
         A SearchResult containing links to Wikipedia articles
     """
+    cache_key = search_cache_key(WIKIPEDIA, query, max_results)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return SearchResult(links=list(cached))
+    
     try:
-        import wikipedia
-        search_results = wikipedia.search(query, results=max_results)
-        links = [f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}" for title in search_results]
+        if WIKIPEDIA_BACKEND == "library":
+            wikipedia = _get_wikipedia()
+            links = [article_url(title) for title in wikipedia.search(query, results=max_results)]
+        else:
+            # One generator=search request returns the hits together with their extracts,
+            # so priming the page cache saves a request per article later
+            pages = get_wikipedia_client().search(query, limit=max_results)
+            links = [article_url(page.title) for page in pages]
+            # Local articles are already on disk and need no caching
+            cache = get_page_cache() if WIKIPEDIA_BACKEND != "local" else None
+            if cache:
+                for page in pages:
+                    if page.extract:
+                        _store_wikipedia_text(cache, {article_url(page.title), page.url}, page.extract)
+        if links:
+            search_cache.put(cache_key, tuple(links))
         return SearchResult(links=links)
     except Exception as e:
         logging.error(f"Error during Wikipedia search: {e}")
         return SearchResult(links=[])
 
-def get_wikipedia_page(title: str) -> ContentResult:
+def _format_wikipedia_content(url: str, text: str) -> str:
     """
-    Get content from a Wikipedia page.
+    Format the text of a Wikipedia article the way get_wikipedia_page returns it.
+    """
+    return f"Content from Wikipedia: {url}\n\n{text[:MAX_CONTENT_LENGTH]}{'...' if len(text) > MAX_CONTENT_LENGTH else ''}"
+
+def _store_wikipedia_text(cache: PageCache, urls, text: str):
+    """
+    Cache the text of a Wikipedia article under each of its URLs.
+    """
+    for url in urls:
+        content = _format_wikipedia_content(url, text)
+        cache.put(url, raw=text.encode('utf-8'), content=content, max_length=MAX_CONTENT_LENGTH)
+
+def _cached_wikipedia_page(cache: Optional[PageCache], title_url: str) -> Optional[ContentResult]:
+    """
+    Get a Wikipedia article from the page cache, if a fresh copy is stored.
+    """
+    # Wikipedia text carries no validators, so stale entries are simply refetched
+    cached = cache.get(title_url) if cache else None
+    if not cached or not cached.is_fresh(cache.ttl):
+        return None
+    if cached.max_length == MAX_CONTENT_LENGTH:
+        return ContentResult(content=cached.content, success=True, url=title_url)
+    raw = cache.read_raw(cached)
+    if raw is None:
+        return None
+    return ContentResult(
+        content=_format_wikipedia_content(title_url, raw.decode('utf-8')),
+        success=True,
+        url=title_url
+    )
+
+def get_wikipedia_pages(titles: List[str]) -> Dict[str, ContentResult]:
+    """
+    Get content from several Wikipedia pages, fetching the uncached ones in batched API requests
+    (or from the local index).
     
     Args:
-        title: The title of the Wikipedia page
+        titles: The titles of the Wikipedia pages
         
     Returns:
-        A ContentResult containing the extracted content
+        A ContentResult for every title, keyed by the title
     """
+    results: Dict[str, ContentResult] = {}
+    cache = get_page_cache() if WIKIPEDIA_BACKEND != "local" else None
+    missing = []
+    for title in dict.fromkeys(titles):
+        cached = _cached_wikipedia_page(cache, article_url(title))
+        if cached:
+            results[title] = cached
+        else:
+            missing.append(title)
+    if not missing:
+        return results
+    
+    if WIKIPEDIA_BACKEND == "library":
+        for title in missing:
+            results[title] = _get_wikipedia_page_library(title, cache)
+        return results
+    
     try:
-        import wikipedia
+        pages = get_wikipedia_client().fetch_extracts(missing)
+    except Exception as e:
+        for title in missing:
+            results[title] = ContentResult(
+                content=f"Error getting Wikipedia page: {str(e)}",
+                success=False,
+                url=article_url(title)
+            )
+        return results
+    
+    for title in missing:
+        page = pages.get(title)
+        if page is None or page.missing or not page.extract:
+            results[title] = ContentResult(
+                content=f"Error getting Wikipedia page: Page id \"{title}\" does not match any pages",
+                success=False,
+                url=article_url(title)
+            )
+            continue
+        if cache:
+            # Store under both the requested title and the resolved article URL
+            _store_wikipedia_text(cache, {article_url(title), page.url}, page.extract)
+        results[title] = ContentResult(
+            content=_format_wikipedia_content(page.url, page.extract),
+            success=True,
+            url=page.url
+        )
+    return results
+
+def _get_wikipedia_page_library(title: str, cache: Optional[PageCache]) -> ContentResult:
+    """
+    Get content from a Wikipedia page with the wikipedia package.
+    """
+    try:
+        wikipedia = _get_wikipedia()
         page = wikipedia.page(title)
-        content = page.content[:MAX_CONTENT_LENGTH]
-        url = page.url
+        if cache:
+            _store_wikipedia_text(cache, {article_url(title), page.url}, page.content)
         return ContentResult(
-            content=f"Content from Wikipedia: {url}\n\n{content}{'...' if len(page.content) > MAX_CONTENT_LENGTH else ''}",
+            content=_format_wikipedia_content(page.url, page.content),
             success=True,
-            url=url
+            url=page.url
         )
     except Exception as e:
         return ContentResult(
             content=f"Error getting Wikipedia page: {str(e)}",
             success=False,
-            url=f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}"
-        )
\ No newline at end of file
+            url=article_url(title)
+        )
+
+def get_wikipedia_page(title: str) -> ContentResult:
+    """
+    Get content from a Wikipedia page.
+    
+    Args:
+        title: The title of the Wikipedia page
+        
+    Returns:
+        A ContentResult containing the extracted content
+    """
+    return get_wikipedia_pages([title])[title]
+
+# Async variants of the tools. The search and HTTP clients are blocking, so the calls
+# run on the blocking worker pool (see run_blocking) and the event loop stays free.
+async def asearch_duck_duck_go(query: str, max_results: int = MAX_LINKS_PER_SEARCH) -> SearchResult:
+    """
+    Search DuckDuckGo for relevant web pages without blocking the event loop.
+    
+    Args:
+        query: The search query
+        max_results: Maximum number of results to return
+        
+    Returns:
+        A SearchResult containing links
+    """
+    return await run_blocking(search_duck_duck_go, query, max_results)
+
+async def aget_page_content(url: str, max_length: int = MAX_CONTENT_LENGTH) -> ContentResult:
+    """
+    Fetch and extract content from a webpage without blocking the event loop.
+    
+    Args:
+        url: The URL to fetch content from
+        max_length: Maximum length of content to return
+        
+    Returns:
+        A ContentResult containing the extracted content
+    """
+    return await run_blocking(get_page_content, url, max_length)
+
+async def asearch_wikipedia(query: str, max_results: int = MAX_WIKIPEDIA_RESULTS) -> SearchResult:
+    """
+    Search Wikipedia for relevant articles without blocking the event loop.
+    
+    Args:
+        query: The search query
+        max_results: Maximum number of results to return
+        
+    Returns:
+        A SearchResult containing links to Wikipedia articles
+    """
+    return await run_blocking(search_wikipedia, query, max_results)
+
+async def aget_wikipedia_pages(titles: List[str]) -> Dict[str, ContentResult]:
+    """
+    Get the content of several Wikipedia pages without blocking the event loop.
+    
+    Args:
+        titles: The titles of the Wikipedia pages
+        
+    Returns:
+        A ContentResult per requested title
+    """
+    return await run_blocking(get_wikipedia_pages, titles)
+
+async def aget_wikipedia_page(title: str) -> ContentResult:
+    """
+    Get content from a Wikipedia page without blocking the event loop.
+    
+    Args:
+        title: The title of the Wikipedia page
+        
+    Returns:
+        A ContentResult containing the extracted content
+    """
+    return (await aget_wikipedia_pages([title]))[title]
@@ -0,0 +1,70 @@
+"""
+This module contains the URL canonicalizer used to deduplicate links.
+Two links with the same canonical form are treated as the same page.
+"""
+
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "igshid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "_hsenc", "_hsmi", "mkt_tok", "ref", "ref_src",
+    "ref_url", "spm", "si", "s_cid", "cmpid", "oly_enc_id", "oly_anon_id", "vero_id",
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "hsa_")
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Reduce a URL to a canonical form.
+
+    The scheme is normalized to https, the host is lowercased and stripped of
+    default ports, mobile Wikipedia hosts are mapped to their desktop host,
+    fragments, tracking parameters and trailing slashes are removed, and the
+    remaining query parameters are sorted.
+
+    Args:
+        url: The URL to canonicalize
+
+    Returns:
+        The canonical URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme == "http":
+        scheme = "https"
+
+    host = (parts.hostname or "").rstrip(".")
+    try:
+        port = parts.port
+    except ValueError:
+        # Malformed port: leave the URL alone rather than guess
+        return url.strip()
+    if port and str(port) != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+    # en.m.wikipedia.org -> en.wikipedia.org
+    if host.endswith(".m.wikipedia.org"):
+        host = host[:-len(".m.wikipedia.org")] + ".wikipedia.org"
+
+    path = parts.path or "/"
+    if host.endswith("wikipedia.org") and path.startswith("/wiki/"):
+        # Wikipedia treats spaces and underscores (and their encodings) the same
+        path = "/wiki/" + quote(unquote(path[len("/wiki/"):]).replace(" ", "_"), safe="/_():,'!*-.~")
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/") or "/"
+
+    params = [
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking_param(name)
+    ]
+    query = urlencode(sorted(params))
+
+    return urlunsplit((scheme, host, path, query, ""))
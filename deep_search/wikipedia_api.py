@@ -0,0 +1,201 @@
+"""
+This module implements a small MediaWiki API client for Wikipedia.
+
+Unlike the wikipedia package, which runs suggestion, search and page requests for
+every article, this client asks the API for plain-text extracts of many titles in
+one request (redirects and title normalization are resolved server-side), and can
+search and fetch extracts in a single generator=search query.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import quote, unquote, urlparse
+
+from pydantic import BaseModel, Field
+
+API_URL = "https://en.wikipedia.org/w/api.php"
+ARTICLE_URL = "https://en.wikipedia.org/wiki/"
+# The API accepts at most 50 titles per request
+MAX_TITLES_PER_REQUEST = 50
+# Safety net against a continuation loop that never ends
+MAX_CONTINUATIONS = 60
+
+
+class WikiPage(BaseModel):
+    """
+    A Wikipedia article returned by the API.
+    """
+    title: str = Field(description="Final title after normalization and redirects")
+    url: str = Field(description="URL of the article")
+    extract: str = Field(default="", description="Plain-text extract of the article")
+    missing: bool = Field(default=False, description="Whether the article does not exist")
+
+
+def article_url(title: str) -> str:
+    """
+    Build the article URL for a title.
+    """
+    return ARTICLE_URL + quote(title.replace(" ", "_"), safe="/_():,'!*-.~")
+
+
+def title_from_url(url: str) -> str:
+    """
+    Get the article title from an article URL.
+    """
+    return unquote(urlparse(url).path.split("/wiki/", 1)[-1]).replace("_", " ")
+
+
+class WikipediaAPI:
+    """
+    MediaWiki API client returning plain-text extracts.
+    """
+
+    def __init__(self, get: Callable[..., Any], api_url: str = API_URL, intro_only: bool = False):
+        """
+        Initialize the client.
+
+        Args:
+            get: Function used for HTTP GET requests (called as get(url, params=...)).
+            api_url: The api.php endpoint of the wiki.
+            intro_only: Only fetch the lead section. The API returns full-article extracts
+                for one page per response (the rest come through continuation), but up to
+                20 lead-section extracts per response.
+        """
+        self.get = get
+        self.api_url = api_url
+        self.intro_only = intro_only
+
+    def _base_params(self) -> Dict[str, Any]:
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": 2,
+            "prop": "extracts|info",
+            "inprop": "url",
+            "explaintext": 1,
+            "exlimit": "max",
+            "redirects": 1,
+        }
+        if self.intro_only:
+            params["exintro"] = 1
+        return params
+
+    def _query(self, params: Dict[str, Any], stop_on: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run a query, following prop continuations and merging the results.
+
+        Args:
+            params: Query parameters.
+            stop_on: Continuation key of the generator. Prop continuations (e.g. the
+                extracts of the remaining pages) come with it and are still followed;
+                the query stops once it is the only continuation left.
+
+        Returns:
+            Dict with "pages" (merged by page id), "normalized" and "redirects".
+        """
+        pages: Dict[Any, Dict[str, Any]] = {}
+        normalized: List[Dict[str, str]] = []
+        redirects: List[Dict[str, str]] = []
+        request_params = dict(params)
+
+        for _ in range(MAX_CONTINUATIONS):
+            response = self.get(self.api_url, params=request_params)
+            response.raise_for_status()
+            data = response.json()
+            if "error" in data:
+                raise RuntimeError(f"MediaWiki API error: {data['error'].get('info', data['error'])}")
+
+            query = data.get("query", {})
+            normalized.extend(query.get("normalized", []))
+            redirects.extend(query.get("redirects", []))
+            for page in query.get("pages", []):
+                key = page.get("pageid", page.get("title"))
+                merged = pages.setdefault(key, {})
+                merged.update({k: v for k, v in page.items() if v not in (None, "")})
+
+            cont = data.get("continue")
+            if not cont:
+                break
+            if stop_on and stop_on in cont and not set(cont) - {stop_on, "continue"}:
+                # Only the generator's next batch is left: this batch is complete
+                break
+            request_params = dict(params)
+            request_params.update(cont)
+
+        return {"pages": list(pages.values()), "normalized": normalized, "redirects": redirects}
+
+    @staticmethod
+    def _to_page(page: Dict[str, Any]) -> WikiPage:
+        title = page.get("title", "")
+        return WikiPage(
+            title=title,
+            url=page.get("fullurl") or article_url(title),
+            extract=page.get("extract", ""),
+            missing=bool(page.get("missing") or page.get("invalid"))
+        )
+
+    def fetch_extracts(self, titles: List[str]) -> Dict[str, WikiPage]:
+        """
+        Fetch the plain-text extracts of many articles in batched requests.
+
+        Args:
+            titles: Article titles (underscores or spaces, any redirect).
+
+        Returns:
+            A WikiPage for every requested title that could be resolved, keyed by the
+            title as it was requested.
+        """
+        results: Dict[str, WikiPage] = {}
+        unique = list(dict.fromkeys(t for t in titles if t))
+        for start in range(0, len(unique), MAX_TITLES_PER_REQUEST):
+            batch = unique[start:start + MAX_TITLES_PER_REQUEST]
+            params = self._base_params()
+            params["titles"] = "|".join(batch)
+            data = self._query(params)
+
+            by_title = {page["title"]: self._to_page(page) for page in data["pages"] if "title" in page}
+            # Map each requested title through normalization and redirects to its article
+            mapping = {entry["from"]: entry["to"] for entry in data["normalized"]}
+            redirects = {entry["from"]: entry["to"] for entry in data["redirects"]}
+            for title in batch:
+                resolved = mapping.get(title, title)
+                for _ in range(5):
+                    if resolved not in redirects:
+                        break
+                    resolved = redirects[resolved]
+                if resolved in by_title:
+                    results[title] = by_title[resolved]
+        return results
+
+    def search(self, query: str, limit: int = 3, with_extracts: bool = True) -> List[WikiPage]:
+        """
+        Search Wikipedia, optionally fetching the extracts of the hits in the same request.
+
+        Args:
+            query: The search query.
+            limit: Maximum number of results.
+            with_extracts: Whether to include plain-text extracts (generator=search).
+
+        Returns:
+            The matching articles in search rank order.
+        """
+        if not with_extracts:
+            response = self.get(self.api_url, params={
+                "action": "query",
+                "format": "json",
+                "formatversion": 2,
+                "list": "search",
+                "srsearch": query,
+                "srlimit": limit,
+                "srprop": "",
+            })
+            response.raise_for_status()
+            hits = response.json().get("query", {}).get("search", [])
+            return [WikiPage(title=hit["title"], url=article_url(hit["title"])) for hit in hits]
+
+        params = self._base_params()
+        params.update({"generator": "search", "gsrsearch": query, "gsrlimit": limit})
+        data = self._query(params, stop_on="gsroffset")
+        pages = [page for page in data["pages"] if "title" in page]
+        # Generator results are unordered; "index" carries the search rank
+        pages.sort(key=lambda page: page.get("index", 0))
+        return [self._to_page(page) for page in pages[:limit]]
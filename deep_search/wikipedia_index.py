@@ -0,0 +1,405 @@
+"""
+This module implements an offline Wikipedia backend built from a database dump.
+
+A pages-articles dump (.xml, .xml.bz2 or .xml.gz) is ingested once into an index
+directory holding:
+
+- articles.bin, the plain text of every article back to back, read through mmap,
+- index.sqlite3, a title index (including redirects) mapping each title to the
+  offset of its text, and an FTS5 full-text index over titles and bodies.
+
+WikipediaIndex answers the same fetch_extracts and search calls as WikipediaAPI,
+without network access or rate limits. Build an index from the deep_search directory:
+
+    python wikipedia_index.py build enwiki-latest-pages-articles.xml.bz2 --out .cache/wikipedia
+    python wikipedia_index.py search .cache/wikipedia "token bucket"
+"""
+
+import argparse
+import bz2
+import gzip
+import html
+import logging
+import mmap
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from wikipedia_api import WikiPage, article_url
+
+DEFAULT_INDEX_DIR = os.path.join(".cache", "wikipedia")
+ARTICLES_FILE = "articles.bin"
+INDEX_FILE = "index.sqlite3"
+# Rows written per transaction while building
+BUILD_BATCH_SIZE = 1000
+# Title matches rank this many times higher than body matches
+TITLE_WEIGHT = 10.0
+
+# Sections holding only links and citations, dropped from the article text
+TRAILING_SECTIONS = ("references", "external links", "see also", "further reading", "notes", "bibliography")
+# Link prefixes that are not part of the article text (files, categories, interlanguage links)
+SKIPPED_LINK_PREFIXES = ("file", "image", "media", "category")
+
+_COMMENT = re.compile(r"<!--.*?-->", re.S)
+_REF = re.compile(r"<ref[^>]*/>|<ref[^>]*>.*?</ref>", re.S | re.I)
+_TEMPLATE = re.compile(r"\{\{[^{}]*\}\}")
+_TABLE = re.compile(r"\{\|(?:(?!\{\|).)*?\|\}", re.S)
+_LINK = re.compile(r"\[\[([^\[\]]*)\]\]")
+_EXTERNAL_LINK = re.compile(r"\[(?:https?:)?//[^\s\]]+\s*([^\]]*)\]")
+_TAG = re.compile(r"<[^>]+>")
+_EMPHASIS = re.compile(r"'{2,}")
+_MAGIC_WORD = re.compile(r"__[A-Z]+__")
+_LIST_MARKER = re.compile(r"^[*#:;]+\s*", re.M)
+_HEADING = re.compile(r"^(=+)\s*(.*?)\s*\1\s*$", re.M)
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def normalize_title(title: str) -> str:
+    """
+    Normalize a title the way MediaWiki does: underscores become spaces, whitespace
+    is collapsed and the first letter is capitalized.
+    """
+    title = " ".join(title.replace("_", " ").split())
+    return title[:1].upper() + title[1:]
+
+
+def _replace_link(match: re.Match) -> str:
+    target, _, label = match.group(1).partition("|")
+    prefix, colon, _ = target.lstrip(":").partition(":")
+    prefix = prefix.strip().lower()
+    if colon and (prefix in SKIPPED_LINK_PREFIXES or re.fullmatch(r"[a-z]{2,3}(-[a-z]+)?", prefix)):
+        return ""
+    # [[File:...|thumb|caption]] style links keep their last part
+    return (label.rsplit("|", 1)[-1] if label else target).strip()
+
+
+def _remove_nested(pattern: re.Pattern, text: str) -> str:
+    # Remove innermost matches until nothing is left, which handles nesting
+    while True:
+        text, count = pattern.subn("", text)
+        if not count:
+            return text
+
+
+def wikitext_to_text(markup: str) -> str:
+    """
+    Convert wikitext to plain text close to what the API's explaintext extracts return.
+
+    Args:
+        markup: The wikitext of an article
+
+    Returns:
+        The plain text, with section headings kept as "== Heading ==" lines
+    """
+    text = _COMMENT.sub("", markup)
+    text = _REF.sub("", text)
+    text = _remove_nested(_TEMPLATE, text)
+    text = _remove_nested(_TABLE, text)
+    while True:
+        text, count = _LINK.subn(_replace_link, text)
+        if not count:
+            break
+    text = _EXTERNAL_LINK.sub(r"\1", text)
+    text = _TAG.sub("", text)
+    text = _EMPHASIS.sub("", text)
+    text = _MAGIC_WORD.sub("", text)
+    text = _LIST_MARKER.sub("", text)
+    text = html.unescape(text)
+
+    # Cut the article at the first trailing section
+    for heading in _HEADING.finditer(text):
+        if len(heading.group(1)) == 2 and heading.group(2).lower() in TRAILING_SECTIONS:
+            text = text[:heading.start()]
+            break
+
+    lines = [line.strip() for line in text.splitlines()]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def _open_dump(path: str):
+    if path.endswith(".bz2"):
+        # bz2 reads multistream dumps transparently
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def iter_dump(path: str) -> Iterator[Tuple[str, Optional[str], str]]:
+    """
+    Stream the main-namespace pages of a MediaWiki XML dump.
+
+    Args:
+        path: Path to the dump
+
+    Yields:
+        (title, redirect target or None, wikitext) for each page
+    """
+    with _open_dump(path) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end" or elem.tag.rsplit("}", 1)[-1] != "page":
+                continue
+            fields = {child.tag.rsplit("}", 1)[-1]: child for child in elem}
+            if fields.get("ns") is not None and fields["ns"].text == "0":
+                redirect = fields.get("redirect")
+                text = None
+                revision = fields.get("revision")
+                if revision is not None:
+                    for child in revision:
+                        if child.tag.rsplit("}", 1)[-1] == "text":
+                            text = child.text
+                yield (
+                    fields["title"].text or "",
+                    redirect.get("title") if redirect is not None else None,
+                    text or ""
+                )
+            # Drop parsed pages so memory stays flat over the whole dump
+            root.clear()
+
+
+def build_index(dump_path: str, index_dir: str = DEFAULT_INDEX_DIR, limit: Optional[int] = None,
+                fts_chars: Optional[int] = None) -> Dict[str, int]:
+    """
+    Ingest a dump into a local index. The index is built next to index_dir and
+    swapped in when complete, so a running deployment never sees a partial index.
+
+    Args:
+        dump_path: Path to a pages-articles dump (.xml, .xml.bz2 or .xml.gz)
+        index_dir: Directory for the finished index
+        limit: Stop after this many articles (useful for trying out a large dump)
+        fts_chars: Only index the first fts_chars characters of each article for
+            full-text search, which bounds the index size. None indexes everything.
+
+    Returns:
+        Counts of the articles and redirects ingested
+    """
+    build_dir = index_dir.rstrip(os.sep) + ".building"
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+
+    db = sqlite3.connect(os.path.join(build_dir, INDEX_FILE))
+    db.execute("PRAGMA journal_mode = OFF")
+    db.execute("PRAGMA synchronous = OFF")
+    db.executescript("""
+        CREATE TABLE articles (id INTEGER PRIMARY KEY, title TEXT NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL);
+        CREATE TABLE titles (key TEXT PRIMARY KEY, article_id INTEGER NOT NULL);
+        CREATE TABLE redirects (key TEXT NOT NULL, target_key TEXT NOT NULL);
+        CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE VIRTUAL TABLE articles_fts USING fts5(title, body, content='', tokenize='porter unicode61');
+    """)
+
+    counts = {"articles": 0, "redirects": 0}
+    articles, titles, fts_rows, redirects = [], [], [], []
+    offset = 0
+    start = time.time()
+
+    def flush():
+        db.executemany("INSERT INTO articles VALUES (?, ?, ?, ?)", articles)
+        db.executemany("INSERT OR IGNORE INTO titles VALUES (?, ?)", titles)
+        db.executemany("INSERT INTO articles_fts (rowid, title, body) VALUES (?, ?, ?)", fts_rows)
+        db.executemany("INSERT INTO redirects VALUES (?, ?)", redirects)
+        db.commit()
+        for rows in (articles, titles, fts_rows, redirects):
+            rows.clear()
+
+    with open(os.path.join(build_dir, ARTICLES_FILE), "wb") as store:
+        for title, redirect, wikitext in iter_dump(dump_path):
+            if redirect is not None:
+                redirects.append((normalize_title(title), normalize_title(redirect.split("#", 1)[0])))
+                counts["redirects"] += 1
+            else:
+                text = wikitext_to_text(wikitext)
+                if not text:
+                    continue
+                data = text.encode("utf-8")
+                store.write(data)
+                counts["articles"] += 1
+                article_id = counts["articles"]
+                articles.append((article_id, title, offset, len(data)))
+                titles.append((normalize_title(title), article_id))
+                fts_rows.append((article_id, title, text[:fts_chars] if fts_chars else text))
+                offset += len(data)
+
+            if len(articles) + len(redirects) >= BUILD_BATCH_SIZE:
+                flush()
+                logging.info(f"Ingested {counts['articles']} articles, {counts['redirects']} redirects "
+                             f"({time.time() - start:.0f}s)")
+            if limit and counts["articles"] >= limit:
+                break
+        flush()
+
+    # Point every redirect at its target article, then index titles case-insensitively
+    db.executescript("""
+        INSERT OR IGNORE INTO titles
+            SELECT r.key, t.article_id FROM redirects r JOIN titles t ON t.key = r.target_key;
+        DROP TABLE redirects;
+        CREATE INDEX titles_nocase ON titles (key COLLATE NOCASE);
+        INSERT INTO articles_fts (articles_fts) VALUES ('optimize');
+    """)
+    db.executemany("INSERT INTO meta VALUES (?, ?)", [
+        ("dump", os.path.basename(dump_path)),
+        ("built_at", str(time.time())),
+        ("articles", str(counts["articles"])),
+    ])
+    db.commit()
+    db.execute("VACUUM")
+    db.close()
+
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.replace(build_dir, index_dir)
+    logging.info(f"Built Wikipedia index in {index_dir}: {counts['articles']} articles, "
+                 f"{counts['redirects']} redirects ({time.time() - start:.0f}s)")
+    return counts
+
+
+class WikipediaIndex:
+    """
+    Read-only local Wikipedia with the same interface as WikipediaAPI.
+    """
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR):
+        """
+        Open an index built with build_index.
+
+        Args:
+            index_dir: Directory holding the index
+        """
+        index_path = os.path.join(index_dir, INDEX_FILE)
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(
+                f"No Wikipedia index in {index_dir}. Build one with: python wikipedia_index.py build <dump> --out {index_dir}"
+            )
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True, check_same_thread=False)
+
+        self._store = open(os.path.join(index_dir, ARTICLES_FILE), "rb")
+        size = os.fstat(self._store.fileno()).st_size
+        self._mmap = mmap.mmap(self._store.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def _read(self, offset: int, length: int) -> str:
+        return self._mmap[offset:offset + length].decode("utf-8")
+
+    def _lookup(self, title: str) -> Optional[Tuple[str, int, int]]:
+        key = normalize_title(title)
+        with self._lock:
+            for sql in ("SELECT article_id FROM titles WHERE key = ?",
+                        "SELECT article_id FROM titles WHERE key = ? COLLATE NOCASE LIMIT 1"):
+                row = self._db.execute(sql, (key,)).fetchone()
+                if row:
+                    return self._db.execute(
+                        "SELECT title, offset, length FROM articles WHERE id = ?", (row[0],)
+                    ).fetchone()
+        return None
+
+    def fetch_extracts(self, titles: List[str]) -> Dict[str, WikiPage]:
+        """
+        Get the plain text of articles by title.
+
+        Args:
+            titles: Article titles (underscores or spaces, any redirect)
+
+        Returns:
+            A WikiPage for every requested title, keyed by the title as it was requested
+        """
+        results: Dict[str, WikiPage] = {}
+        for title in dict.fromkeys(t for t in titles if t):
+            row = self._lookup(title)
+            if row is None:
+                results[title] = WikiPage(title=title, url=article_url(title), missing=True)
+            else:
+                results[title] = WikiPage(title=row[0], url=article_url(row[0]), extract=self._read(row[1], row[2]))
+        return results
+
+    def search(self, query: str, limit: int = 3, with_extracts: bool = True) -> List[WikiPage]:
+        """
+        Search the full-text index, ranking title matches above body matches.
+
+        Args:
+            query: The search query
+            limit: Maximum number of results
+            with_extracts: Whether to include the article texts
+
+        Returns:
+            The matching articles in rank order
+        """
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+        quoted = ['"' + term + '"' for term in terms]
+
+        rows = []
+        exact = self._lookup(query)
+        if exact:
+            rows.append(exact)
+        with self._lock:
+            # Require every term first, then fall back to any term
+            for match in (" AND ".join(quoted), " OR ".join(quoted)):
+                found = self._db.execute(
+                    "SELECT a.title, a.offset, a.length FROM articles_fts f JOIN articles a ON a.id = f.rowid "
+                    f"WHERE articles_fts MATCH ? ORDER BY bm25(articles_fts, {TITLE_WEIGHT}, 1.0) LIMIT ?",
+                    (match, limit)
+                ).fetchall()
+                rows.extend(row for row in found if row not in rows)
+                if len(rows) >= limit or len(terms) == 1:
+                    break
+
+        return [
+            WikiPage(title=title, url=article_url(title), extract=self._read(offset, length) if with_extracts else "")
+            for title, offset, length in rows[:limit]
+        ]
+
+    def stats(self) -> Dict[str, str]:
+        """
+        Metadata recorded when the index was built.
+        """
+        with self._lock:
+            return dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._store.close()
+        self._db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local Wikipedia index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Ingest a pages-articles dump")
+    build.add_argument("dump", help="Path to the dump (.xml, .xml.bz2 or .xml.gz)")
+    build.add_argument("--out", default=DEFAULT_INDEX_DIR, help="Index directory")
+    build.add_argument("--limit", type=int, help="Stop after this many articles")
+    build.add_argument("--fts-chars", type=int, help="Only full-text index the start of each article")
+
+    search = subparsers.add_parser("search", help="Search an index")
+    search.add_argument("index", help="Index directory")
+    search.add_argument("query", help="Search query")
+    search.add_argument("--limit", type=int, default=3, help="Maximum number of results")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+
+    if args.command == "build":
+        build_index(args.dump, args.out, limit=args.limit, fts_chars=args.fts_chars)
+        return
+
+    index = WikipediaIndex(args.index)
+    start = time.perf_counter()
+    pages = index.search(args.query, limit=args.limit)
+    elapsed = time.perf_counter() - start
+    for page in pages:
+        print(f"{page.title} <{page.url}>\n  {page.extract[:200]!r}")
+    print(f"{len(pages)} results in {elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()